@@ -0,0 +1,180 @@
+import os
+import json
+from pathlib import Path
+
+# ============================================================
+# Append-only progress journal shared by submitters and checkers
+# ============================================================
+#
+# A log lives in two files:
+#   <name>.json   snapshot in the original format (readable as before)
+#   <name>.jsonl  one event per line, appended after every change
+#
+# Every change is a single short append instead of a full rewrite.
+# Every COMPACT_EVERY events (and on close) the snapshot is rewritten
+# through a temp file + atomic rename and the journal is dropped.
+# Replaying events is idempotent, so a crash at any point leaves a log
+# that loads to the same state; a torn last line is simply ignored.
+#
+# Two snapshot layouts are supported:
+#   "log"       {"submitted": {file_path: info}, "completed": [...], "failed": [...], ...}
+#               (the reparse progress log)
+#   "tracking"  [{"file_path": ..., "batch_id": ..., ...}, ...]
+#               (the people pass / clean / nopes tracking files)
+
+COMPACT_EVERY = 200
+
+# Process-wide write counters, read by bench_pipeline
+IO_STATS = {"appends": 0, "append_bytes": 0, "compactions": 0, "snapshot_bytes": 0}
+
+
+class BatchJournal:
+    """
+    Batch records keyed by file path, indexed by batch_id, plus
+    free-form meta values (the 'completed'/'failed' lists and the
+    'last_run' snapshot of the reparse log).
+    """
+
+    def __init__(self, snapshot_path, layout="log", compact_every=COMPACT_EVERY):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_suffix(".jsonl")
+        self.layout = layout
+        self.compact_every = compact_every
+
+        self.records = {}
+        self.meta = {"completed": [], "failed": []} if layout == "log" else {}
+        self.by_batch_id = {}
+        self._meta_seen = {}
+        self._pending = 0
+
+        self._load()
+
+    # ---------- loading ----------
+
+    def _load(self):
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if self.layout == "log":
+                self.records = dict(data.get("submitted", {}))
+                self.meta.update({k: v for k, v in data.items() if k != "submitted"})
+            else:
+                self.records = {record["file_path"]: record for record in data}
+
+        for key, record in self.records.items():
+            self._index(key, record)
+
+        torn = False
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Interrupted append; everything before it is intact
+                        torn = True
+                        break
+                    self._apply(event)
+                    self._pending += 1
+
+        # Never append after a torn line: fold everything into the snapshot
+        if torn:
+            self.compact()
+
+    def _index(self, key, record):
+        batch_id = record.get("batch_id")
+        if batch_id:
+            self.by_batch_id[batch_id] = key
+
+    def _apply(self, event):
+        op = event["op"]
+        if op == "put":
+            self.records[event["key"]] = event["record"]
+            self._index(event["key"], event["record"])
+        elif op == "update":
+            record = self.records.setdefault(event["key"], {})
+            record.update(event["fields"])
+            self._index(event["key"], record)
+        elif op == "set_meta":
+            self.meta[event["name"]] = event["value"]
+        elif op == "append_meta":
+            name, value = event["name"], event["value"]
+            if not self._meta_contains(name, value):
+                self._meta_seen[name].add(json.dumps(value, sort_keys=True))
+                self.meta[name].append(value)
+
+    def _meta_contains(self, name, value):
+        seen = self._meta_seen.get(name)
+        if seen is None:
+            values = self.meta.setdefault(name, [])
+            seen = {json.dumps(v, sort_keys=True) for v in values}
+            self._meta_seen[name] = seen
+        return json.dumps(value, sort_keys=True) in seen
+
+    # ---------- writing ----------
+
+    def _append(self, event):
+        self._apply(event)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        IO_STATS["appends"] += 1
+        IO_STATS["append_bytes"] += len(line.encode("utf-8"))
+
+        self._pending += 1
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def put(self, key, record):
+        """Store (or replace) the record for a batch file."""
+        self._append({"op": "put", "key": str(key), "record": record})
+
+    def update(self, key, **fields):
+        """Merge fields into an existing record."""
+        self._append({"op": "update", "key": str(key), "fields": fields})
+
+    def set_meta(self, name, value):
+        self._append({"op": "set_meta", "name": name, "value": value})
+
+    def append_meta(self, name, value):
+        """Append to a meta list; values already present are skipped."""
+        if self._meta_contains(name, value):
+            return
+        self._append({"op": "append_meta", "name": name, "value": value})
+
+    # ---------- reading ----------
+
+    def find_batch(self, batch_id):
+        """Return (file_path, record) for a batch_id, or (None, None)."""
+        key = self.by_batch_id.get(batch_id)
+        if key is None:
+            return None, None
+        return key, self.records[key]
+
+    def snapshot(self):
+        """The log in its original on-disk shape."""
+        if self.layout == "log":
+            return {"submitted": self.records, **self.meta}
+        return list(self.records.values())
+
+    # ---------- compaction ----------
+
+    def compact(self):
+        """Rewrite the snapshot atomically and start a fresh journal."""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        IO_STATS["compactions"] += 1
+        IO_STATS["snapshot_bytes"] += self.snapshot_path.stat().st_size
+
+        self.journal_path.unlink(missing_ok=True)
+        self._pending = 0
+
+    def close(self):
+        if self._pending:
+            self.compact()
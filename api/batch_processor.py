@@ -1,8 +1,15 @@
-import json
+import asyncio
 import argparse
 from pathlib import Path
 from datetime import datetime
-from parse_single_batch import submit_batch
+from parse_single_batch import submit_batch, submit_batch_async, retry_attempt
+from batch_journal import BatchJournal
+from rak_preparser import PREPARSE_THRESHOLD
+from batch_telemetry import now_iso
+from pipeline_metrics import init_metrics, count_entries, count_api_errors, stage_timer
+
+# log_file = Path("data/logs/batch_progress.json")
+LOG_FILE = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
 
 def find_batch_files():
     """Find all batch files in the flat batched folder"""
@@ -14,32 +21,110 @@ def find_batch_files():
     return sorted(batch_dir.glob("*.json"))
 
 def load_log():
-    """Load existing progress log"""
-    # log_file = Path("data/logs/batch_progress.json")
-    log_file = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
-    if log_file.exists():
-        with open(log_file, 'r') as f:
-            return json.load(f)
-    return {"submitted": {}, "completed": [], "failed": []}
-
-def save_log(log_data):
-    """Save progress log"""
-    # log_file = Path("data/logs/batch_progress.json")
-    log_file = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
-    log_file.parent.mkdir(exist_ok=True)
-    with open(log_file, 'w') as f:
-        json.dump(log_data, f, indent=2)
+    """Open the progress log (snapshot + append-only journal)"""
+    return BatchJournal(LOG_FILE)
 
 def extract_topic_from_path(file_path):
     return file_path.parent.name
 
-def run_batch_processor(max_submit=15):
+def pack_size_for(file_path, pack_size):
+    """Retried entries go back unpacked, one request per entry."""
+    if retry_attempt(file_path):
+        return None
+    return pack_size
+
+def submission_record(result, file_path, timestamp, preparse_threshold=None):
+    record = {
+        "batch_id": result["batch_id"],
+        "topic": extract_topic_from_path(file_path),
+        "submitted_at": timestamp,
+        "entry_count": result["entry_count"],
+        "telemetry": {"submitted_at": now_iso()},
+    }
+    if result.get("pack_size"):
+        record["pack_size"] = result["pack_size"]
+    if result.get("packs"):
+        # Which entries each pack request carried, so a failed pack's reason reaches them
+        record["packs"] = result["packs"]
+    if result.get("cached_count"):
+        record["cached_count"] = result["cached_count"]
+    if result.get("preparsed_count"):
+        record["preparsed_count"] = result["preparsed_count"]
+    if preparse_threshold is not None:
+        record["preparse_threshold"] = preparse_threshold
+    if retry_attempt(file_path):
+        record["retry_attempt"] = retry_attempt(file_path)
+    return record
+
+def describe_submission(result):
+    if result["batch_id"] is None:
+        if result.get("preparsed_count"):
+            return (f"all {result['entry_count']} entries handled locally "
+                    f"({result['cached_count']} cached, {result['preparsed_count']} preparsed), nothing sent")
+        return f"all {result['entry_count']} entries cached, nothing sent"
+    return result["batch_id"]
+
+def count_submission(result):
+    """Feed one submission's entry counts to the metrics."""
+    cached = result.get("cached_count", 0)
+    preparsed = result.get("preparsed_count", 0)
+    count_entries("book_parse", "submitted", result["entry_count"] - cached - preparsed)
+    count_entries("book_parse", "cached", cached)
+    count_entries("book_parse", "preparsed", preparsed)
+
+async def submit_concurrently(file_paths, concurrency=5, pack_size=None, use_cache=True, preparse_threshold=None):
+    """
+    Submit batch files through the async client, at most `concurrency`
+    requests in flight. Yields (file_path, result, error) in completion
+    order so the caller can record each one as soon as it lands.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit_one(file_path):
+        async with semaphore:
+            try:
+                result = await submit_batch_async(
+                    file_path, pack_size_for(file_path, pack_size), use_cache, preparse_threshold
+                )
+                return file_path, result, None
+            except Exception as e:
+                return file_path, None, e
+
+    tasks = [asyncio.create_task(submit_one(f)) for f in file_paths]
+    for next_done in asyncio.as_completed(tasks):
+        yield await next_done
+
+async def submit_new_files_async(new_files, log, timestamp, concurrency, pack_size=None, use_cache=True,
+                                 preparse_threshold=None):
+    """Concurrent counterpart of the submission loop in run_batch_processor."""
+    submit_count = 0
+
+    async for file_path, result, error in submit_concurrently(
+        new_files, concurrency, pack_size, use_cache, preparse_threshold
+    ):
+        if error is None:
+            log.put(file_path, submission_record(result, file_path, timestamp, preparse_threshold))
+            count_submission(result)
+            submit_count += 1
+            print(f"✓ Submitted: {file_path.name} -> {describe_submission(result)}")
+        else:
+            print(f"✗ Failed to submit {file_path}: {error}")
+            count_api_errors("book_parse", "submit_failed")
+            log.append_meta("failed", {
+                "file_path": str(file_path),
+                "error": str(error),
+                "timestamp": timestamp
+            })
+
+    return submit_count
+
+def run_batch_processor(max_submit=15, concurrency=1, pack_size=None, use_cache=True, preparse_threshold=None):
     print("Starting batch processor...")
     timestamp = datetime.now().strftime("%Y%m%d-%H%M")
 
     # Find files and load progress
     batch_files = find_batch_files()
-    log_data = load_log()
+    log = load_log()
 
     if not batch_files:
         print("No batch files found in data_reload/reparse_missing/batched/")
@@ -49,7 +134,7 @@ def run_batch_processor(max_submit=15):
 
     # PHASE 1: Submit new batches (max 5 at a time)
     print("\n=== SUBMITTING NEW BATCHES ===")
-    submitted_files = set(log_data["submitted"].keys())
+    submitted_files = set(log.records)
     new_files = [f for f in batch_files if str(f) not in submitted_files]
 
     print(f"New files to submit: {len(new_files)}")
@@ -57,45 +142,53 @@ def run_batch_processor(max_submit=15):
     submit_count = 0
     # max_submit is now passed as parameter
 
-    for file_path in new_files:
-        if submit_count >= max_submit:
+    if concurrency > 1:
+        if len(new_files) > max_submit:
             print(f"Reached submission limit ({max_submit}). Will submit more in next run.")
-            break
+        print(f"Submitting concurrently ({concurrency} in flight)...")
+        new_files = new_files[:max_submit]
+        submit_count = asyncio.run(
+            submit_new_files_async(
+                new_files, log, timestamp, concurrency, pack_size, use_cache, preparse_threshold
+            )
+        )
+    else:
+        for file_path in new_files:
+            if submit_count >= max_submit:
+                print(f"Reached submission limit ({max_submit}). Will submit more in next run.")
+                break
 
-        try:
-            print(f"Submitting: {file_path}")
-            result = submit_batch(file_path)
+            try:
+                print(f"Submitting: {file_path}")
+                result = submit_batch(
+                    file_path, pack_size_for(file_path, pack_size), use_cache, preparse_threshold
+                )
 
-            # Store submission info
-            log_data["submitted"][str(file_path)] = {
-                "batch_id": result["batch_id"],
-                "topic": extract_topic_from_path(file_path),
-                "submitted_at": timestamp,
-                "entry_count": result["entry_count"]
-            }
+                # Store submission info (appended to the journal straight away)
+                log.put(file_path, submission_record(result, file_path, timestamp, preparse_threshold))
+                count_submission(result)
 
-            submit_count += 1
-            print(f"✓ Submitted: {result['batch_id']}")
+                submit_count += 1
+                print(f"✓ Submitted: {describe_submission(result)}")
 
-            # Save progress after each submission
-            save_log(log_data)
+            except Exception as e:
+                print(f"✗ Failed to submit {file_path}: {e}")
+                count_api_errors("book_parse", "submit_failed")
+                log.append_meta("failed", {
+                    "file_path": str(file_path),
+                    "error": str(e),
+                    "timestamp": timestamp
+                })
 
-        except Exception as e:
-            print(f"✗ Failed to submit {file_path}: {e}")
-            log_data["failed"].append({
-                "file_path": str(file_path),
-                "error": str(e),
-                "timestamp": timestamp
-            })
-            save_log(log_data)
+    log.close()
 
     # Status checking moved to separate check_status.py script
 
     # SUMMARY
     print(f"\n=== SUBMISSION SUMMARY ===")
     print(f"Files submitted this run: {submit_count}")
-    print(f"Total submitted: {len(log_data['submitted'])}")
-    print(f"Total failed submissions: {len(log_data['failed'])}")
+    print(f"Total submitted: {len(log.records)}")
+    print(f"Total failed submissions: {len(log.meta['failed'])}")
 
     if submit_count > 0:
         print(f"\n✓ Use 'python api/check_status.py' to monitor batch progress.")
@@ -110,6 +203,34 @@ def main():
         default=15,
         help='Maximum number of batches to submit in this run (default: 15)'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Number of submissions in flight at once; above 1 uses the async client (default: 1)'
+    )
+    parser.add_argument(
+        '--pack',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Pack N entries into each API request (default: one entry per request)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Send every entry to the API, ignoring the local parse cache'
+    )
+    parser.add_argument(
+        '--preparse',
+        type=float,
+        nargs='?',
+        const=PREPARSE_THRESHOLD,
+        default=None,
+        metavar='THRESHOLD',
+        help=f'Parse plain entries locally when the rule-based parser is at least this confident '
+             f'(default threshold: {PREPARSE_THRESHOLD}); the rest go to the API'
+    )
     parser.add_argument(
         '--list-files',
         action='store_true',
@@ -129,8 +250,20 @@ def main():
             print(f"  {f.name}")
         return
 
-    print(f"Batch Processor - Max submissions: {args.max_submit}")
-    run_batch_processor(max_submit=args.max_submit)
+    print(f"Batch Processor - Max submissions: {args.max_submit}, concurrency: {args.concurrency}")
+    if args.pack:
+        print(f"Packing {args.pack} entries per request")
+    if args.preparse is not None:
+        print(f"Pre-parsing locally at confidence >= {args.preparse}")
+    init_metrics()
+    with stage_timer("book_submit"):
+        run_batch_processor(
+            max_submit=args.max_submit,
+            concurrency=args.concurrency,
+            pack_size=args.pack,
+            use_cache=not args.no_cache,
+            preparse_threshold=args.preparse,
+        )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# ============================================================
+# Persistent per-file state for the reparse dashboard
+# ============================================================
+#
+# check_status used to glob the batched folder and stat every expected
+# output file on each run. The index instead scans each folder once
+# with os.scandir and keeps, per batch file:
+#   state         parsed | in_queue | not_submitted
+#   mtime_ns/size of the batch file when it was last read
+#   entry_count   number of entries in the batch file
+#   digest        short hash of its composite_ids
+# A batch file is only opened again when its mtime or size changes,
+# so a dashboard over thousands of files starts without reading them.
+
+STATE_INDEX_FILE = Path("data_reload/reparse_missing/logs/batch_state_index.json")
+
+
+def scan_json_files(directory):
+    """{stem: (mtime_ns, size)} for every .json file, in one directory pass."""
+    found = {}
+    try:
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.name.endswith(".json") and item.is_file():
+                    stat = item.stat()
+                    found[item.name[:-len(".json")]] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    return found
+
+
+def entry_digest(batch_data):
+    raw = "\n".join(str(entry.get("composite_id")) for entry in batch_data)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class BatchStateIndex:
+    """File states keyed by batch file path (as str, like the progress log)."""
+
+    def __init__(self, path=STATE_INDEX_FILE):
+        self.path = Path(path)
+        self.files = {}
+        self.dirty = False
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def _read_batch_file(self, file_path, mtime_ns, size):
+        with open(file_path, "r", encoding="utf-8") as f:
+            batch_data = json.load(f)
+        return {
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "entry_count": len(batch_data),
+            "digest": entry_digest(batch_data),
+        }
+
+    def refresh(self, batch_dir, parsed_dir, submitted):
+        """
+        Bring every entry up to date with the two folders and the set of
+        submitted file paths. Returns the batch file paths (str), sorted.
+        """
+        batch_dir = Path(batch_dir)
+        batch_stats = scan_json_files(batch_dir)
+        parsed_stems = scan_json_files(parsed_dir)
+
+        current = set()
+        for stem in sorted(batch_stats):
+            mtime_ns, size = batch_stats[stem]
+            file_str = str(batch_dir / f"{stem}.json")
+            current.add(file_str)
+
+            entry = self.files.get(file_str)
+            if entry is None or entry["mtime_ns"] != mtime_ns or entry["size"] != size:
+                entry = self._read_batch_file(file_str, mtime_ns, size)
+                self.files[file_str] = entry
+                self.dirty = True
+
+            if file_str not in submitted:
+                state = "not_submitted"
+            elif stem in parsed_stems:
+                state = "parsed"
+            else:
+                state = "in_queue"
+
+            if entry.get("state") != state:
+                entry["state"] = state
+                self.dirty = True
+
+        for file_str in set(self.files) - current:
+            del self.files[file_str]
+            self.dirty = True
+
+        return sorted(current)
+
+    def entry_count(self, file_str):
+        return self.files.get(str(file_str), {}).get("entry_count", 0)
+
+    def save(self):
+        """Atomically rewrite the index, only if anything changed."""
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
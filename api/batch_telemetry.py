@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+# ============================================================
+# Per-batch timing and token telemetry
+# ============================================================
+#
+# Each progress-log record gets a "telemetry" dict:
+#   submitted_at   ISO time the batch was created (the record's own
+#                  submitted_at is the run's minute stamp)
+#   ended_at       ISO time the API finished the batch
+#   retrieved_at   ISO time its results were saved
+#   request_counts succeeded / errored / expired / canceled
+#   usage          input, output, cache read and cache write tokens,
+#                  summed over the batch's results
+#
+# summarise() turns those into turnaround percentiles, throughput,
+# tokens per entry and an ETA for whatever is still not submitted.
+
+USAGE_FIELDS = ["input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"]
+
+# Throughput is measured over batches retrieved in this window, so old
+# sessions do not drag the rate down
+RATE_WINDOW = timedelta(hours=24)
+
+
+def now_iso():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def add_usage(totals, usage):
+    """Add one message's usage block to a running {field: tokens} total."""
+    for field in USAGE_FIELDS:
+        totals[field] = totals.get(field, 0) + (getattr(usage, field, None) or 0)
+
+
+def ended_telemetry(batch_status, usage):
+    """Telemetry known once an ended batch has been retrieved."""
+    counts = batch_status.request_counts
+    return {
+        "ended_at": batch_status.ended_at.astimezone().replace(tzinfo=None).isoformat(timespec="seconds")
+        if batch_status.ended_at else None,
+        "retrieved_at": now_iso(),
+        "request_counts": {
+            "succeeded": counts.succeeded,
+            "errored": counts.errored,
+            "expired": counts.expired,
+            "canceled": counts.canceled,
+        },
+        "usage": usage,
+    }
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def sent_entries(record):
+    """Entries that actually went to the API (cache hits and local parses did not)."""
+    return record.get("entry_count", 0) - record.get("cached_count", 0) - record.get("preparsed_count", 0)
+
+
+def summarise(records, remaining_entries=0, now=None):
+    """
+    Aggregate telemetry over progress-log records. Returns None until
+    at least one batch has been retrieved with telemetry.
+    """
+    now = now or datetime.now()
+    done = []
+    for record in records:
+        telemetry = record.get("telemetry") or {}
+        submitted = parse_time(telemetry.get("submitted_at"))
+        retrieved = parse_time(telemetry.get("retrieved_at"))
+        if submitted and retrieved:
+            done.append((record, telemetry, submitted, parse_time(telemetry.get("ended_at")), retrieved))
+    if not done:
+        return None
+
+    turnaround = [(ended - submitted).total_seconds() for _, _, submitted, ended, _ in done if ended]
+    lag = [(retrieved - ended).total_seconds() for _, _, _, ended, retrieved in done if ended]
+
+    recent = [item for item in done if now - item[4] <= RATE_WINDOW] or done
+    span_hours = (max(item[4] for item in recent) - min(item[2] for item in recent)).total_seconds() / 3600
+    recent_entries = sum(item[0].get("entry_count", 0) for item in recent)
+    entries_per_hour = recent_entries / span_hours if span_hours > 0 else None
+
+    usage = {}
+    sent = 0
+    for record, telemetry, *_ in done:
+        for field in USAGE_FIELDS:
+            usage[field] = usage.get(field, 0) + (telemetry.get("usage") or {}).get(field, 0)
+        sent += sent_entries(record)
+
+    counts = {}
+    for _, telemetry, *_ in done:
+        for name, n in (telemetry.get("request_counts") or {}).items():
+            counts[name] = counts.get(name, 0) + n
+
+    input_total = usage["input_tokens"] + usage["cache_read_input_tokens"] + usage["cache_creation_input_tokens"]
+    return {
+        "batches": len(done),
+        "turnaround_p50_s": percentile(turnaround, 50) if turnaround else None,
+        "turnaround_p95_s": percentile(turnaround, 95) if turnaround else None,
+        "retrieval_lag_p50_s": percentile(lag, 50) if lag else None,
+        "entries_per_hour": entries_per_hour,
+        "input_tokens_per_entry": input_total / sent if sent else None,
+        "output_tokens_per_entry": usage["output_tokens"] / sent if sent else None,
+        "cache_read_share": usage["cache_read_input_tokens"] / input_total if input_total else None,
+        "request_counts": counts,
+        "remaining_entries": remaining_entries,
+        "eta_hours": remaining_entries / entries_per_hour if entries_per_hour and remaining_entries else None,
+    }
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def print_telemetry(summary):
+    """Dashboard section; prints nothing without telemetry."""
+    if not summary:
+        return
+    print(f"  Throughput ({summary['batches']} batches with telemetry):")
+    print(f"    {'Turnaround p50/p95:':<24}{format_duration(summary['turnaround_p50_s'])}"
+          f" / {format_duration(summary['turnaround_p95_s'])}"
+          f"  (retrieved {format_duration(summary['retrieval_lag_p50_s'])} after end, p50)")
+    if summary["entries_per_hour"]:
+        print(f"    {'Entries per hour:':<24}{summary['entries_per_hour']:,.0f}")
+    if summary["input_tokens_per_entry"] is not None:
+        cache_share = summary["cache_read_share"] or 0
+        print(f"    {'Tokens per entry:':<24}{summary['input_tokens_per_entry']:,.0f} in"
+              f" ({cache_share * 100:.0f}% cache reads), {summary['output_tokens_per_entry']:,.0f} out")
+    failed = {k: v for k, v in summary["request_counts"].items() if k != "succeeded" and v}
+    if failed:
+        print(f"    {'Failed requests:':<24}" + ", ".join(f"{n} {name}" for name, n in failed.items()))
+    if summary["eta_hours"] is not None:
+        print(f"    {'ETA (not submitted):':<24}{format_duration(summary['eta_hours'] * 3600)}"
+              f" for {summary['remaining_entries']} entries")
+    print()
@@ -0,0 +1,152 @@
+import json
+import time
+import argparse
+from pathlib import Path
+from collections import Counter
+
+from json_extract import extract_json, ExtractError, METHODS
+
+# ============================================================
+# Old vs tolerant response parsing
+# ============================================================
+#
+# Two measurements over files already on disk:
+#   recovery  stored failures (book "raw_response", people
+#             "_raw_content") re-parsed with extract_json, by method
+#   speed     successful responses re-serialised and parsed with the
+#             old path (fence strip + json.loads) and with extract_json
+# With no stored data, --synthetic builds failure shapes from a sample.
+
+DEFAULT_SOURCES = [
+    Path("data_reload/reparse_missing/reparsed"),
+    Path("data/parsed"),
+    Path("database/in_progress/pass1_results"),
+    Path("database/in_progress/pass2_results"),
+    Path("database/in_progress/clean_results"),
+    Path("database/in_progress/nopes_results"),
+]
+
+SAMPLE_RESPONSE = {
+    "title": "Die Stadt ohne Juden",
+    "subtitle": "Ein Roman von übermorgen",
+    "authors": [{"display_name": "Bettauer, Hugo", "family_name": "Bettauer", "given_names": "Hugo"}],
+    "publisher": "Gloriette",
+    "place_of_publication": "Wien",
+    "publication_year": 1922,
+    "pages": "192",
+    "format_original": "OPp.",
+    "administrative": {"original_entry": "BETTAUER, Hugo || Die Stadt ohne Juden. Wien, Gloriette 1922."},
+}
+
+
+def old_parse(text):
+    """check_status before json_extract."""
+    if text.startswith("```json"):
+        text = text.replace("```json\n", "").replace("\n```", "")
+    return json.loads(text)
+
+
+def iter_files(sources):
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            yield from sorted(source.glob("*.json"))
+        elif source.exists():
+            yield source
+
+
+def load_responses(sources):
+    """(failed raw texts, successful response texts) from stored outputs."""
+    failed, succeeded = [], []
+    for path in iter_files(sources):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            continue
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            raw = item.get("raw_response") or item.get("_raw_content")
+            if raw:
+                failed.append(raw)
+            elif "parsed_entry" in item:
+                succeeded.append(json.dumps(item["parsed_entry"], ensure_ascii=False, indent=2))
+    return failed, succeeded
+
+
+def synthetic_failures(count):
+    text = json.dumps(SAMPLE_RESPONSE, ensure_ascii=False, indent=2)
+    quoted = text.replace("Ein Roman von übermorgen", "Ein „Roman\" von übermorgen")
+    packed = json.dumps([{"composite_id": f"X_{i}", "parsed_entry": SAMPLE_RESPONSE} for i in range(5)],
+                        ensure_ascii=False, indent=2)
+    shapes = [
+        f"```json\n{text}\n```\n",
+        f"{text}\n```",
+        f"Here is the parsed entry:\n\n{text}\n\nLet me know if anything needs changing.",
+        quoted,
+        packed[:len(packed) * 3 // 4],
+        text[:len(text) // 2],
+    ]
+    return [shapes[i % len(shapes)] for i in range(count)]
+
+
+def time_parser(parse, texts, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parse(text)
+    return (time.perf_counter() - started) / (repeat * len(texts))
+
+
+def report_recovery(failed):
+    methods = Counter()
+    for text in failed:
+        try:
+            _, method = extract_json(text, allow_partial=True)
+        except ExtractError:
+            method = "unrecovered"
+        methods[method] += 1
+
+    recovered = len(failed) - methods["unrecovered"]
+    print(f"Stored failures:  {len(failed)}")
+    print(f"Recovered:        {recovered} ({recovered / len(failed) * 100:.1f}%)")
+    for method in METHODS + ["unrecovered"]:
+        if methods[method]:
+            print(f"  {method:<14}{methods[method]:>7}")
+
+
+def report_speed(succeeded, repeat):
+    old_us = time_parser(old_parse, succeeded, repeat) * 1e6
+    new_us = time_parser(lambda t: extract_json(t), succeeded, repeat) * 1e6
+    print(f"\nSuccessful responses: {len(succeeded)} (x{repeat})")
+    print(f"  {'old (json.loads):':<22}{old_us:>8.1f} µs/response")
+    print(f"  {'extract_json:':<22}{new_us:>8.1f} µs/response")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure recovery and speed of json_extract on stored model responses"
+    )
+    parser.add_argument("sources", nargs="*", help="Result files or folders (default: known result locations)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Add N synthetic failures (fences, prose, quotes, truncation)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (default: 5)")
+    args = parser.parse_args()
+
+    failed, succeeded = load_responses(args.sources or DEFAULT_SOURCES)
+    failed += synthetic_failures(args.synthetic)
+    if not succeeded and args.synthetic:
+        succeeded = [json.dumps(SAMPLE_RESPONSE, ensure_ascii=False, indent=2)] * args.synthetic
+
+    if not failed and not succeeded:
+        print("No stored responses found (try --synthetic 1000).")
+        return
+
+    if failed:
+        report_recovery(failed)
+    if succeeded:
+        report_speed(succeeded, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+import os
+import io
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import urllib.request
+from pathlib import Path
+from contextlib import redirect_stdout
+
+import batch_journal
+from bench_preparser import load_references
+
+# ============================================================
+# End-to-end pipeline benchmark against the fake Batches API
+# ============================================================
+#
+# Runs each stage's own submit and check scripts (their main()s, with
+# sys.argv set as on the command line) inside a scratch copy of the
+# folder layout, against fake_batches_server started as a subprocess.
+# Submit + check repeat until everything is retrieved, so retry files
+# from injected failures are driven through as well.
+#
+# Per stage it reports entries/min, peak traced memory (Python
+# allocations of the stage itself; the server runs in its own process),
+# progress-log writes (batch_journal.IO_STATS) and API calls. Results
+# can be saved and compared with a previous run to catch regressions.
+
+STAGES = ["book_parse", "pass1", "pass2", "clean", "nopes"]
+
+SAMPLE_PEOPLE = [
+    ("Klaus", "Berger"), ("Christiane", "Nord"), ("Otto", "Abel"), ("Wilhelm", "Wattenbach"),
+    ("Theodor W.", "Adorno"), ("Ingeborg", "Bachmann"), ("Hermann", "Broch"), ("Ilse", "Aichinger"),
+]
+
+SAMPLE_TITLES = [
+    "Die Stadt ohne Juden. Ein Roman von übermorgen",
+    "Briefe an einen jungen Dichter",
+    "Der Mann ohne Eigenschaften",
+    "Geschichte der Wiener Moderne",
+]
+
+# seconds to wait between rounds while batches are still processing
+POLL_INTERVAL = 0.5
+
+
+# ============================================================
+# Scratch data
+# ============================================================
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def sample_person(i):
+    given, family = SAMPLE_PEOPLE[i % len(SAMPLE_PEOPLE)]
+    return given, f"{family}{i // len(SAMPLE_PEOPLE) or ''}"
+
+
+def book_texts(count, canned_sources):
+    """Entry texts: originals from canned parses if given, else synthetic."""
+    texts = [original for original, _ in load_references(canned_sources)] if canned_sources else []
+    if texts:
+        return [texts[i % len(texts)] for i in range(count)]
+
+    out = []
+    for i in range(count):
+        given, family = sample_person(i)
+        title = SAMPLE_TITLES[i % len(SAMPLE_TITLES)]
+        out.append(f"{family.upper()}, {given} || {title}. Wien, Böhlau {1950 + i % 70}. {100 + i % 400} S. OLn.")
+    return out
+
+
+def write_book_batches(root, files, per_file, canned_sources):
+    texts = book_texts(files * per_file, canned_sources)
+    for file_idx in range(files):
+        entries = [
+            {
+                "composite_id": f"BENCH_{file_idx:03d}_{entry_idx:04d}",
+                "text": texts[file_idx * per_file + entry_idx],
+                "topic": "BENCHMARK",
+                "price": 10,
+            }
+            for entry_idx in range(per_file)
+        ]
+        write_json(root / f"data_reload/reparse_missing/batched/bench_{file_idx:03d}.json", entries)
+
+
+def person_record(i, **fields):
+    given, family = sample_person(i)
+    return {
+        "book_id": f"book-{i:06d}",
+        "composite_id": f"BENCH_{i:06d}",
+        "source_filename": "bench.json",
+        "display_name": f"{family}, {given}",
+        "family_name": family,
+        "given_names": given,
+        "name_particles": None,
+        "single_name": None,
+        "is_author": True,
+        "is_editor": False,
+        "is_contributor": False,
+        "is_translator": False,
+        "sort_order": 1,
+        **fields,
+    }
+
+
+def write_people_batches(root, stage, files, per_file):
+    in_progress = root / "database/in_progress"
+    for file_idx in range(files):
+        ids = range(file_idx * per_file, (file_idx + 1) * per_file)
+        if stage == "pass1":
+            entries = []
+            for i in ids:
+                (g1, f1), (g2, f2) = sample_person(i), sample_person(i + 1)
+                name = f"{g1} {f1} und {g2} {f2}"
+                entries.append(person_record(
+                    i, display_name=name, single_name=name, family_name=None, given_names=None, sort_order=0
+                ))
+            write_json(in_progress / f"pass1_batches/batch_split_{file_idx + 1:02d}.json", entries)
+        elif stage == "pass2":
+            write_json(in_progress / f"pass2_batches/batch_dedup_{file_idx + 1:02d}.json",
+                       [person_record(i) for i in ids])
+        elif stage == "clean":
+            write_json(in_progress / f"clean_batches/batch_clean_{file_idx + 1:03d}.json",
+                       [person_record(i, person_id=i) for i in ids])
+        elif stage == "nopes":
+            write_json(in_progress / f"nopes_batches/batch_nopes_{file_idx + 1:03d}.json", {
+                "nopes_entries": [person_record(i) for i in ids],
+                "existing_people_context": [person_record(i + 100000, person_id=i) for i in ids],
+            })
+
+
+# ============================================================
+# Fake server
+# ============================================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_server(args):
+    port = free_port()
+    command = [
+        sys.executable, str(Path(__file__).parent / "fake_batches_server.py"),
+        "--port", str(port),
+        "--latency", str(args.latency),
+        "--processing-time", str(args.processing_time),
+        "--error-rate", str(args.error_rate),
+        "--expire-rate", str(args.expire_rate),
+        "--malformed-rate", str(args.malformed_rate),
+        "--seed", str(args.seed),
+    ]
+    if args.canned:
+        command += ["--canned", *args.canned]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            server_stats(base_url)
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Fake Batches API did not start")
+
+
+def server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+# ============================================================
+# Stages
+# ============================================================
+
+def run_script(module, argv):
+    """Run a script's main() as if from the command line, output discarded."""
+    saved_argv = sys.argv
+    sys.argv = [f"{module.__name__}.py", *argv]
+    try:
+        with redirect_stdout(io.StringIO()):
+            module.main()
+    finally:
+        sys.argv = saved_argv
+
+
+def stage_plan(stage, args):
+    """(submit module, submit argv, check module, check argv, done(), entries())"""
+    import batch_processor
+    import check_status
+    import people_batch_processor
+    import people_clean_processor
+    import check_people_status
+
+    if stage == "book_parse":
+        submit_argv = ["--max-submit", "100000", "--concurrency", str(args.concurrency)]
+        if args.pack:
+            submit_argv += ["--pack", str(args.pack)]
+
+        def done():
+            batched = {p.stem for p in check_status.BATCH_DIR.glob("*.json")}
+            parsed = {p.stem for p in check_status.PARSED_DIR.glob("*.json")}
+            return batched <= parsed
+
+        def records():
+            total = 0
+            for path in check_status.PARSED_DIR.glob("*.json"):
+                with open(path, "r", encoding="utf-8") as f:
+                    total += len(json.load(f))
+            return total
+
+        return batch_processor, submit_argv, check_status, ["--workers", str(args.workers)], done, records
+
+    submit_module = people_batch_processor if stage in ("pass1", "pass2") else people_clean_processor
+    tracking_file = Path(f"database/in_progress/{stage}_batch_tracking.json")
+    batch_dir = Path(f"database/in_progress/{stage}_batches")
+
+    def tracked():
+        return batch_journal.BatchJournal(tracking_file, layout="tracking").records.values()
+
+    def done():
+        records = list(tracked())
+        return len(records) == len(list(batch_dir.glob("*.json"))) and all(
+            r.get("results_retrieved") for r in records
+        )
+
+    def records():
+        return sum(r.get("result_count", 0) for r in tracked())
+
+    return submit_module, [stage], check_people_status, [stage], done, records
+
+
+def input_entries(stage):
+    if stage == "book_parse":
+        paths = Path("data_reload/reparse_missing/batched").glob("*.json")
+    else:
+        paths = Path(f"database/in_progress/{stage}_batches").glob("*.json")
+    total = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        total += len(data["nopes_entries"]) if isinstance(data, dict) else len(data)
+    return total
+
+
+def run_stage(stage, args, base_url):
+    submit_module, submit_argv, check_module, check_argv, done, records = stage_plan(stage, args)
+    entries = input_entries(stage)
+
+    io_before = dict(batch_journal.IO_STATS)
+    calls_before = server_stats(base_url)["calls"]
+
+    tracemalloc.start()
+    submit_s = check_s = 0.0
+    rounds = 0
+    while rounds < args.max_rounds:
+        rounds += 1
+        start = time.perf_counter()
+        run_script(submit_module, submit_argv)
+        submit_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_script(check_module, check_argv)
+        check_s += time.perf_counter() - start
+
+        if done():
+            break
+        time.sleep(POLL_INTERVAL)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls_after = server_stats(base_url)["calls"]
+    total_s = submit_s + check_s
+    return {
+        "entries": entries,
+        "output_records": records(),
+        "rounds": rounds,
+        "completed": done(),
+        "submit_s": round(submit_s, 3),
+        "check_s": round(check_s, 3),
+        "entries_per_min": round(entries / total_s * 60, 1) if total_s else None,
+        "peak_memory_mb": round(peak / 1e6, 2),
+        "log_appends": batch_journal.IO_STATS["appends"] - io_before["appends"],
+        "log_bytes": (
+            batch_journal.IO_STATS["append_bytes"] - io_before["append_bytes"]
+            + batch_journal.IO_STATS["snapshot_bytes"] - io_before["snapshot_bytes"]
+        ),
+        "log_compactions": batch_journal.IO_STATS["compactions"] - io_before["compactions"],
+        "api_calls": {name: calls_after[name] - calls_before.get(name, 0) for name in calls_after},
+    }
+
+
+# ============================================================
+# Reporting
+# ============================================================
+
+def print_results(results):
+    print(f"{'Stage':<12}{'Entries':>9}{'Out':>8}{'Rounds':>8}{'Entries/min':>13}"
+          f"{'Peak MB':>9}{'Log writes':>12}{'Log KB':>9}{'API calls':>11}")
+    for stage, r in results.items():
+        rate = f"{r['entries_per_min']:,.0f}" if r["entries_per_min"] else "-"
+        flag = "" if r["completed"] else "  (incomplete)"
+        print(f"{stage:<12}{r['entries']:>9}{r['output_records']:>8}{r['rounds']:>8}{rate:>13}"
+              f"{r['peak_memory_mb']:>9.1f}{r['log_appends']:>12}{r['log_bytes'] / 1024:>9.1f}"
+              f"{sum(r['api_calls'].values()):>11}{flag}")
+
+
+def compare_results(results, baseline, tolerance):
+    """Print changes against a saved run; returns the list of regressions."""
+    regressions = []
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%}):")
+    for stage, r in results.items():
+        before = baseline.get(stage)
+        if not before:
+            continue
+        checks = [
+            ("entries/min", r["entries_per_min"], before["entries_per_min"], -1),
+            ("peak MB", r["peak_memory_mb"], before["peak_memory_mb"], 1),
+            ("log bytes", r["log_bytes"], before["log_bytes"], 1),
+        ]
+        for label, now, then, worse in checks:
+            if not now or not then:
+                continue
+            change = (now - then) / then
+            marker = ""
+            if change * worse > tolerance:
+                marker = "  ✗ regression"
+                regressions.append((stage, label, change))
+            print(f"  {stage:<12}{label:<13}{then:>12,.1f} → {now:>12,.1f}  ({change:+.1%}){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the submit/check scripts end to end against a local fake API"
+    )
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"Stages to run: {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--files", type=int, default=10, help="Batch files per stage (default: 10)")
+    parser.add_argument("--entries", type=int, default=50, help="Entries per batch file (default: 50)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake API latency in seconds (default: 0.05)")
+    parser.add_argument("--processing-time", type=float, default=0.0,
+                        help="Seconds before a fake batch ends (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests errored")
+    parser.add_argument("--expire-rate", type=float, default=0.0, help="Share of requests expired")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of responses truncated")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for injected failures (default: 1)")
+    parser.add_argument("--canned", nargs="+", default=[], metavar="PATH",
+                        help="Parsed outputs to answer from; book entries are taken from them too")
+    parser.add_argument("--concurrency", type=int, default=5, help="Book submissions in flight (default: 5)")
+    parser.add_argument("--workers", type=int, default=8, help="Book retrieval workers (default: 8)")
+    parser.add_argument("--pack", type=int, default=None, metavar="N", help="Pack N book entries per request")
+    parser.add_argument("--max-rounds", type=int, default=10, help="Submit/check rounds per stage (default: 10)")
+    parser.add_argument("--save", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown / growth before a change counts as a regression (default: 0.2)")
+    args = parser.parse_args()
+    stages = args.stages or STAGES
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    args.canned = [str(Path(p).resolve()) for p in args.canned]
+
+    process, base_url = start_fake_server(args)
+
+    # The API modules build their clients at import time, so the
+    # environment has to point at the fake before they are imported
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ANTHROPIC_API_KEY"] = "fake"
+
+    results = {}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            write_book_batches(root, args.files, args.entries, args.canned)
+            for stage in STAGES[1:]:
+                write_people_batches(root, stage, args.files, args.entries)
+
+            # Scripts use paths relative to the repo root (and project_root
+            # in people_clean_processor), so run them inside the scratch copy
+            os.chdir(root)
+            import people_clean_processor
+            people_clean_processor.project_root = root
+
+            print(f"Fake API at {base_url} (latency {args.latency}s, "
+                  f"errors {args.error_rate:.0%}, expired {args.expire_rate:.0%}, "
+                  f"malformed {args.malformed_rate:.0%})")
+            print(f"{args.files} files x {args.entries} entries per stage\n")
+
+            for stage in stages:
+                results[stage] = run_stage(stage, args, base_url)
+    finally:
+        os.chdir(cwd)
+        process.terminate()
+        process.wait()
+
+    print_results(results)
+
+    if args.save:
+        write_json(args.save, results)
+        print(f"\nSaved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
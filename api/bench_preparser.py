@@ -0,0 +1,132 @@
+import json
+import time
+import argparse
+from pathlib import Path
+from collections import Counter
+
+from rak_preparser import preparse_entry, PREPARSE_THRESHOLD
+
+# ============================================================
+# Coverage and agreement of the local pre-parser
+# ============================================================
+#
+# Compares the rule-based parse against existing API parses. Accepts
+# both shapes found in the repo:
+#   - parsed outputs: [{"custom_id": ..., "parsed_entry": {...}}, ...]
+#   - flattened notebook results: {composite_id: {"title": ..., "original_entry": ...}}
+
+COMPARED_FIELDS = [
+    "title", "subtitle", "authors", "editors", "contributors", "translator",
+    "publisher", "place_of_publication", "publication_year", "edition", "pages",
+    "format_original", "format_expanded", "condition", "copies", "illustrations",
+]
+
+DEFAULT_SOURCES = [
+    Path("data_reload/reparse_missing/reparsed"),
+    Path("data/parsed"),
+    Path("scripts/notebooks/results/missing_with_people.json"),
+]
+
+
+def iter_reference_records(path):
+    """Yield (original_entry, reference_parse) pairs from one file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        records = data.values()
+    else:
+        records = (item.get("parsed_entry") for item in data if isinstance(item, dict))
+
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        original = record.get("original_entry") or (record.get("administrative") or {}).get("original_entry")
+        if original:
+            yield original, record
+
+
+def load_references(sources):
+    pairs = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            files = sorted(source.glob("*.json"))
+        elif source.exists():
+            files = [source]
+        else:
+            continue
+        for path in files:
+            pairs.extend(iter_reference_records(path))
+    return pairs
+
+
+def normalise_value(value):
+    """Compare values loosely: case, surrounding whitespace and final periods."""
+    if isinstance(value, list):
+        value = [normalise_value(v) for v in value]
+        return sorted(v for v in value if v)
+    if isinstance(value, dict):
+        return normalise_value(value.get("display_name"))
+    if isinstance(value, str):
+        return value.strip().rstrip(".").casefold() or None
+    return value
+
+
+def run_benchmark(pairs, threshold):
+    started = time.perf_counter()
+    parses = [preparse_entry(original) for original, _ in pairs]
+    elapsed = time.perf_counter() - started
+
+    accepted = 0
+    compared = Counter()
+    agreed = Counter()
+    for (original, reference), (record, confidence) in zip(pairs, parses):
+        if confidence < threshold or record["administrative"]["is_reference"]:
+            continue
+        accepted += 1
+        for field in COMPARED_FIELDS:
+            if field not in reference:
+                continue
+            compared[field] += 1
+            if normalise_value(record.get(field)) == normalise_value(reference[field]):
+                agreed[field] += 1
+
+    total = len(pairs)
+    print(f"Entries:     {total}")
+    print(f"Throughput:  {total / elapsed:,.0f} entries/s ({elapsed:.2f}s)")
+    print(f"Coverage:    {accepted} ({accepted / total * 100:.1f}%) at confidence >= {threshold}")
+    print()
+    print("Field agreement on accepted entries:")
+    for field in COMPARED_FIELDS:
+        if compared[field]:
+            print(f"  {field:<22} {agreed[field] / compared[field] * 100:5.1f}%  ({compared[field]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the local pre-parser against existing API parses"
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        help="Parsed files or folders to compare against (default: known result locations)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=PREPARSE_THRESHOLD,
+        help=f"Confidence needed to accept a local parse (default: {PREPARSE_THRESHOLD})",
+    )
+    args = parser.parse_args()
+
+    pairs = load_references(args.sources or DEFAULT_SOURCES)
+    if not pairs:
+        print("No reference parses found.")
+        return
+
+    run_benchmark(pairs, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
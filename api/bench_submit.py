@@ -0,0 +1,103 @@
+import os
+import io
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from contextlib import redirect_stdout
+
+from fake_batches_server import start_server
+
+# ============================================================
+# Serial vs concurrent submission against the fake endpoint
+# ============================================================
+
+
+def write_sample_batches(batch_dir, file_count, entries_per_file):
+    """Write synthetic batch files shaped like the real batched/ inputs."""
+    paths = []
+    for file_idx in range(1, file_count + 1):
+        entries = [
+            {
+                "composite_id": f"bench_{file_idx}_{entry_idx}",
+                "text": f"MUSTERMANN, Max || Beispielbuch {entry_idx}. Wien. Böhlau 1972. 120 S. OLn.",
+                "topic": "BENCHMARK",
+                "price": 10,
+            }
+            for entry_idx in range(entries_per_file)
+        ]
+        path = batch_dir / f"bench_{file_idx:03d}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def run_serial(paths):
+    from parse_single_batch import submit_batch
+
+    # submit_batch is chatty; keep the benchmark output readable
+    with redirect_stdout(io.StringIO()):
+        for path in paths:
+            submit_batch(path)
+
+
+def run_concurrent(paths, concurrency):
+    from batch_processor import submit_concurrently
+
+    async def drain():
+        errors = []
+        async for file_path, result, error in submit_concurrently(paths, concurrency):
+            if error is not None:
+                errors.append((file_path, error))
+        return errors
+
+    errors = asyncio.run(drain())
+    for file_path, error in errors:
+        print(f"  ✗ {file_path.name}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare serial and concurrent batch submission against a local fake API"
+    )
+    parser.add_argument("--files", type=int, default=20, help="Number of batch files (default: 20)")
+    parser.add_argument("--entries", type=int, default=50, help="Entries per batch file (default: 50)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake API latency in seconds (default: 0.5)")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrent submissions (default: 5)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+
+    # The API modules build their clients at import time, so the
+    # environment has to point at the fake before they are imported
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ANTHROPIC_API_KEY"] = "fake"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_sample_batches(Path(tmp), args.files, args.entries)
+
+            print(f"Fake API at {base_url} (latency {args.latency}s)")
+            print(f"{args.files} files x {args.entries} entries\n")
+
+            start = time.perf_counter()
+            run_serial(paths)
+            serial_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            run_concurrent(paths, args.concurrency)
+            concurrent_s = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    print(f"  {'Serial:':<26}{serial_s:>7.2f}s")
+    print(f"  {f'Concurrent ({args.concurrency} in flight):':<26}{concurrent_s:>7.2f}s")
+    if concurrent_s > 0:
+        print(f"  {'Speed-up:':<26}{serial_s / concurrent_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,10 @@ import json
 from pathlib import Path
 from datetime import datetime
 import sys
+import time
+from batch_journal import BatchJournal
+from json_extract import extract_json, ExtractError
+from pipeline_metrics import init_metrics, set_in_flight, count_entries, count_api_errors, record_duration
 
 # Load environment variables
 load_dotenv()
@@ -43,15 +47,29 @@ def retrieve_results(batch_id, output_path):
         results = client.messages.batches.results(batch_id)
 
         parsed_results = []
+        errors = {}
         for result in results:
             # Each result contains the custom_id and the response
             custom_id = result.custom_id
 
-            if result.result.type == "succeeded":
+            if result.result.type == "succeeded" and result.result.message.stop_reason == "max_tokens":
+                # A cut-off array cannot say which inputs it lost (pass 1
+                # returns any number of people per entry), so the whole
+                # request is marked; people_pass2_batches keeps the original
+                # entry and lists it for people_pass1_batches.py --retry
+                errors["truncated"] = errors.get("truncated", 0) + 1
+                parsed_results.append({
+                    "unified_id": "oops",
+                    "_source_custom_id": custom_id,
+                    "_error": "truncated",
+                    "_raw_content": result.result.message.content[0].text
+                })
+            elif result.result.type == "succeeded":
                 # Extract the JSON content from the response
                 content = result.result.message.content[0].text
                 try:
-                    parsed = json.loads(content)
+                    # Fences, stray prose and „…" quotes are tolerated
+                    parsed, method = extract_json(content)
 
                     # Handle both array responses (nopes) and single object responses (clean)
                     if isinstance(parsed, list):
@@ -66,7 +84,8 @@ def retrieve_results(batch_id, output_path):
                             "_source_custom_id": custom_id,
                             "_error": "Response was not an object or array"
                         })
-                except json.JSONDecodeError as e:
+                except ExtractError as e:
+                    errors["undecodable"] = errors.get("undecodable", 0) + 1
                     parsed_results.append({
                         "unified_id": "oops",
                         "_source_custom_id": custom_id,
@@ -75,6 +94,7 @@ def retrieve_results(batch_id, output_path):
                     })
             else:
                 # Handle error cases
+                errors[result.result.type] = errors.get(result.result.type, 0) + 1
                 parsed_results.append({
                     "unified_id": "oops",
                     "_source_custom_id": custom_id,
@@ -88,7 +108,8 @@ def retrieve_results(batch_id, output_path):
         return {
             "success": True,
             "entry_count": len(parsed_results),
-            "output_path": str(output_path)
+            "output_path": str(output_path),
+            "errors": errors,
         }
 
     except Exception as e:
@@ -147,21 +168,21 @@ def main():
 
     print(f"=== {pass_name} Status Check ===\n")
 
+    init_metrics()
+    started = time.perf_counter()
+
     results_dir.mkdir(parents=True, exist_ok=True)
 
     if not tracking_file.exists():
         print(f"No tracking file found at {tracking_file}")
         return
 
-    # Load tracking data
-    with open(tracking_file, "r") as f:
-        tracking_data = json.load(f)
-
-    print(f"Checking status of {len(tracking_data)} batches...\n")
+    # Load tracking data (snapshot + journal)
+    tracking = BatchJournal(tracking_file, layout="tracking")
 
-    updated = False
+    print(f"Checking status of {len(tracking.records)} batches...\n")
 
-    for batch_info in tracking_data:
+    for file_key, batch_info in list(tracking.records.items()):
         batch_id = batch_info["batch_id"]
         batch_file = Path(batch_info["file_path"]).name
 
@@ -179,9 +200,12 @@ def main():
         print(f"  Status: {current_status}")
 
         # Update tracking data
-        batch_info["last_checked"] = datetime.now().isoformat()
-        batch_info["processing_status"] = current_status
-        batch_info["request_counts"] = status["request_counts"]
+        tracking.update(
+            file_key,
+            last_checked=datetime.now().isoformat(),
+            processing_status=current_status,
+            request_counts=status["request_counts"],
+        )
 
         # If completed and results not yet retrieved
         if current_status == "ended" and "results_retrieved" not in batch_info:
@@ -193,31 +217,44 @@ def main():
             result = retrieve_results(batch_id, output_file)
 
             if result["success"]:
+                count_entries(pass_type, "retrieved", result["entry_count"])
+                for kind, n in result["errors"].items():
+                    count_api_errors(pass_type, kind, n)
                 print(f"  ✓ Retrieved {result['entry_count']} entries")
+                if result["errors"]:
+                    print(f"  Errors: {', '.join(f'{kind} {n}' for kind, n in result['errors'].items())}")
                 print(f"  Saved to: {result['output_path']}")
-                batch_info["results_retrieved"] = True
-                batch_info["results_path"] = result["output_path"]
-                batch_info["result_count"] = result["entry_count"]
-                updated = True
+                tracking.update(
+                    file_key,
+                    results_retrieved=True,
+                    results_path=result["output_path"],
+                    result_count=result["entry_count"],
+                    error_counts=result["errors"],
+                )
             else:
+                count_api_errors(pass_type, "retrieve_failed")
                 print(f"  Error retrieving results: {result['error']}")
 
         print()
 
-    # Save updated tracking data
-    if updated:
-        with open(tracking_file, "w") as f:
-            json.dump(tracking_data, f, ensure_ascii=False, indent=2)
-        print(f"Updated tracking file saved")
+    # Fold the journal back into the tracking file
+    tracking.close()
+    print(f"Updated tracking file saved")
 
     # Summary
+    tracking_data = tracking.records.values()
     completed = sum(1 for b in tracking_data if b.get("processing_status") == "ended")
     retrieved = sum(1 for b in tracking_data if b.get("results_retrieved"))
+    truncated = sum((b.get("error_counts") or {}).get("truncated", 0) for b in tracking_data)
+
+    set_in_flight(pass_type, len(tracking.records) - retrieved)
+    record_duration(f"{pass_type}_check", time.perf_counter() - started)
 
     print(f"\nSummary:")
-    print(f"  Total batches: {len(tracking_data)}")
+    print(f"  Total batches: {len(tracking.records)}")
     print(f"  Completed: {completed}")
     print(f"  Results retrieved: {retrieved}")
+    print(f"  Truncated requests: {truncated}")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,22 @@
+import os
 import json
 import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timedelta
 import anthropic
 from dotenv import load_dotenv
+from parse_single_batch import (
+    PACK_ID_PREFIX, PROMPT_VERSION, MODEL, MAX_RETRY_ATTEMPTS, entry_cache_key, retry_attempt, retry_path_for
+)
+from parse_cache import open_cache, get_many, put_many, with_original_entry
+from batch_journal import BatchJournal
+from rak_preparser import preparse_batch
+from batch_state_index import BatchStateIndex
+from json_extract import extract_json, ExtractError
+from batch_telemetry import add_usage, ended_telemetry, summarise, print_telemetry
+from pipeline_metrics import init_metrics, set_in_flight, count_entries, count_api_errors, stage_timer
 
 # Load environment variables and create API client
 load_dotenv()
@@ -14,66 +27,76 @@ client = anthropic.Anthropic()
 # File and log helpers
 # ============================================================
 
-def load_log():
-    """Load existing progress log."""
-    log_file = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
-    if log_file.exists():
-        with open(log_file, "r") as f:
-            return json.load(f)
-    return {"submitted": {}, "completed": [], "failed": []}
-
-
-def save_log(log_data):
-    """Save progress log."""
-    log_file = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
-    log_file.parent.mkdir(exist_ok=True)
-    with open(log_file, "w") as f:
-        json.dump(log_data, f, indent=2)
-
-
-def find_batch_files():
-    """Find all batch files in the flat batched folder."""
-    batch_dir = Path("data_reload/reparse_missing/batched")
-    if not batch_dir.exists():
-        return []
+LOG_FILE = Path("data_reload/reparse_missing/logs/reparse_missing_log.json")
+BATCH_DIR = Path("data_reload/reparse_missing/batched")
+PARSED_DIR = Path("data_reload/reparse_missing/reparsed")
+
+# Batches retrieved at once; each worker streams one batch to disk
+RETRIEVE_WORKERS = 8
 
-    return sorted(batch_dir.glob("*.json"))
+# Fresh parses are written to the parse cache in chunks while streaming
+CACHE_WRITE_CHUNK = 500
+
+
+def load_log():
+    """Open the progress log (snapshot + append-only journal)."""
+    return BatchJournal(LOG_FILE)
 
 
 def parsed_file_for(batch_file_path):
     """Return the expected parsed-output path for a given batch file."""
     stem = Path(batch_file_path).stem
-    return Path(f"data_reload/reparse_missing/reparsed/{stem}.json")
+    return PARSED_DIR / f"{stem}.json"
+
+
+@lru_cache(maxsize=256)
+def _load_batch(file_str, mtime_ns):
+    with open(file_str, "r", encoding="utf-8") as f:
+        batch_data = json.load(f)
+    lookup = {entry["composite_id"]: entry for entry in batch_data}
+    keys = {entry["composite_id"]: entry_cache_key(entry) for entry in batch_data}
+    return batch_data, lookup, keys
+
+
+def load_batch(batch_file_path):
+    """
+    (batch_data, composite_id lookup, cache keys) for a batch file,
+    built once per file version and shared between retrievals. Treat
+    the returned objects as read-only.
+    """
+    file_str = str(batch_file_path)
+    return _load_batch(file_str, os.stat(file_str).st_mtime_ns)
 
 
 # ============================================================
 # Categorisation
 # ============================================================
 
-def categorise_batches(batch_files, log_data):
+def categorise_batches(log, index):
     """
     Bucket every batch file into one of three states:
-      - parsed:        submitted AND output file exists in data/parsed/
+      - parsed:        submitted AND output file exists in the reparsed folder
       - in_queue:      submitted but no output file yet
       - not_submitted: file exists locally but no submission record
 
     Trusts the filesystem over the log: a batch is 'parsed & saved'
     only if its output file actually exists, regardless of what the
-    'completed' array says.
+    'completed' array says. Both folders are scanned once; per-file
+    state lives in the persistent index (see batch_state_index).
     """
-    submitted = log_data["submitted"]
+    submitted = log.records
+    batch_files = index.refresh(BATCH_DIR, PARSED_DIR, submitted)
 
     parsed = []         # list of (file_str, submission_info)
     in_queue = []       # list of (file_str, submission_info)
     not_submitted = []  # list of file_str
 
-    for file_path in batch_files:
-        file_str = str(file_path)
-        if file_str in submitted:
-            if parsed_file_for(file_path).exists():
-                parsed.append((file_str, submitted[file_str]))
-            else:
-                in_queue.append((file_str, submitted[file_str]))
+    for file_str in batch_files:
+        state = index.files[file_str]["state"]
+        if state == "parsed":
+            parsed.append((file_str, submitted[file_str]))
+        elif state == "in_queue":
+            in_queue.append((file_str, submitted[file_str]))
         else:
             not_submitted.append(file_str)
 
@@ -82,6 +105,9 @@ def categorise_batches(batch_files, log_data):
         "in_queue": in_queue,
         "not_submitted": not_submitted,
         "total": len(batch_files),
+        "total_entries": sum(index.entry_count(f) for f in batch_files),
+        "parsed_entries": sum(index.entry_count(f) for f, _ in parsed),
+        "not_submitted_entries": sum(index.entry_count(f) for f in not_submitted),
     }
 
 
@@ -89,78 +115,341 @@ def categorise_batches(batch_files, log_data):
 # API retrieval
 # ============================================================
 
-def retrieve_batch(batch_id, original_file):
+def split_packed_response(parsed_json, lookup):
     """
-    Check a batch's status; if ended, retrieve and save its results.
-    Returns one of: 'completed', 'processing'.
-    Saves results to data/parsed/batch_<filename>.json on success.
+    Turn a packed response (JSON array keyed by composite_id) back into
+    one result per entry. Items that are not objects, name a composite_id
+    that is not in this batch, repeat one, or carry no parsed_entry
+    object are dropped here and retried by retry_lost_entries.
+    """
+    if not isinstance(parsed_json, list):
+        return []
 
-    Stays silent during normal operation — the caller decides what
-    to print.
+    results = []
+    seen = set()
+    for item in parsed_json:
+        if not isinstance(item, dict):
+            continue
+        composite_id = item.get("composite_id")
+        parsed_entry = item.get("parsed_entry")
+        if composite_id not in lookup or composite_id in seen or not isinstance(parsed_entry, dict):
+            continue
+        seen.add(composite_id)
+        results.append({
+            "custom_id": composite_id,
+            "price": lookup[composite_id].get("price"),
+            "parsed_entry": parsed_entry,
+        })
+
+    return results
+
+
+def retry_lost_entries(original_file, batch_data, parsed_ids, failures, max_retries=MAX_RETRY_ATTEMPTS):
     """
-    with open(original_file, "r", encoding="utf-8") as f:
-        batch_data = json.load(f)
+    Collect every entry that did not come back as a parsed_entry —
+    errored, expired, canceled, undecodable, or dropped from a packed
+    response — and write them to the next retry file next to the
+    original (x.json -> x_retry1.json -> x_retry2.json). The batch
+    processor submits retry files unpacked, one request per entry.
 
-    lookup = {entry["composite_id"]: entry for entry in batch_data}
+    Once a batch has used up max_retries, nothing more is written and
+    the entries are reported as unrecoverable instead.
+
+    Returns None when nothing was lost, otherwise
+      {"file_path", "attempt", "entries", "reasons", "unrecoverable"}
+    """
+    lost = [entry for entry in batch_data if entry["composite_id"] not in parsed_ids]
+    if not lost:
+        return None
+
+    reasons = {}
+    for entry in lost:
+        reason = failures.get(entry["composite_id"], "missing")
+        reasons[reason] = reasons.get(reason, 0) + 1
+
+    attempt = retry_attempt(original_file) + 1
+    summary = {
+        "file_path": None,
+        "attempt": attempt,
+        "entries": len(lost),
+        "reasons": reasons,
+        "unrecoverable": [],
+    }
+
+    if attempt > max_retries:
+        summary["unrecoverable"] = [
+            {"composite_id": entry["composite_id"], "reason": failures.get(entry["composite_id"], "missing")}
+            for entry in lost
+        ]
+        return summary
 
-    batch_status = client.messages.batches.retrieve(batch_id)
-    if batch_status.processing_status != "ended":
-        return "processing"
+    retry_file = retry_path_for(original_file)
+    with open(retry_file, "w", encoding="utf-8") as f:
+        json.dump(lost, f, ensure_ascii=False, indent=2)
+    summary["file_path"] = str(retry_file)
 
+    return summary
+
+
+def note_failure(failures, custom_id, reason, packs):
+    """Record a failed request under every composite_id it carried (a pack's members)."""
+    for composite_id in (packs or {}).get(custom_id, [custom_id]):
+        failures[composite_id] = reason
+
+
+def iter_batch_results(batch_id, lookup, failures=None, usage=None, packs=None):
+    """
+    Stream an ended batch's results as one record per entry.
+    Entries whose request failed are noted in `failures` (composite_id ->
+    reason: errored / expired / canceled / undecodable) for the retry
+    step; a failed pack is expanded to its members through `packs`
+    (pack custom_id -> composite_ids, from the submission record).
+    Token usage is summed into `usage` for the telemetry.
+    """
     batch_results = client.messages.batches.results(batch_id)
-    results_data = []
+    if failures is None:
+        failures = {}
+    if usage is None:
+        usage = {}
 
     for result in batch_results:
+        if result.result and result.result.type != "succeeded":
+            note_failure(failures, result.custom_id, result.result.type, packs)
         if result.result and result.result.type == "succeeded":
+            add_usage(usage, result.result.message.usage)
             response_text = result.result.message.content[0].text
-
-            if response_text.startswith("```json"):
-                response_text = response_text.replace("```json\n", "").replace("\n```", "")
+            packed = result.custom_id.startswith(PACK_ID_PREFIX)
 
             try:
-                parsed_json = json.loads(response_text)
-                results_data.append({
-                    "custom_id": result.custom_id,
-                    "price": lookup.get(result.custom_id, {}).get("price"),
-                    "parsed_entry": parsed_json,
-                })
-            except json.JSONDecodeError as e:
-                results_data.append({
+                # A truncated packed reply keeps its complete items; the rest are retried
+                parsed_json, _ = extract_json(response_text, allow_partial=packed)
+            except ExtractError as e:
+                note_failure(failures, result.custom_id, "undecodable", packs)
+                yield {
                     "custom_id": result.custom_id,
                     "error": f"JSON parsing failed: {e}",
                     "raw_response": response_text,
-                })
-        # Note: per-entry errors inside a successful batch are silently
-        # skipped here. They can be found later by comparing input
-        # composite_ids against custom_ids in the saved output file.
+                }
+                continue
 
-    output_path = parsed_file_for(original_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(results_data, f, ensure_ascii=False, indent=2)
+            if packed:
+                yield from split_packed_response(parsed_json, lookup)
+            else:
+                yield {
+                    "custom_id": result.custom_id,
+                    "price": lookup.get(result.custom_id, {}).get("price"),
+                    "parsed_entry": parsed_json,
+                }
+        # Errored/expired/canceled results write nothing to the output
+        # file; retry_lost_entries picks them up from `failures`.
 
-    return "completed"
 
+class JsonArrayWriter:
+    """
+    Write records to a JSON array one line at a time, through a temp
+    file that replaces the target only once everything is written.
+    The output stays a plain JSON array (one object per line), so
+    every existing reader of data/parsed files keeps working, while
+    memory use no longer grows with the batch size. A failed
+    retrieval leaves no partial output behind.
+    """
 
-def process_queue(in_queue_batches, log_data):
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.count = 0
+        self.file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.file.write("[")
+        return self
+
+    def write(self, record):
+        self.file.write(",\n" if self.count else "\n")
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.file.close()
+            self.tmp_path.unlink(missing_ok=True)
+            return False
+
+        self.file.write("\n]\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        return False
+
+
+def cached_records(conn, missing, keys):
+    """
+    Records for entries with no result that have a cached parse (the
+    hits submit_batch skipped).
     """
-    Try to retrieve every in-queue batch. Returns:
+    cached = get_many(conn, [keys[entry["composite_id"]] for entry in missing])
+    for entry in missing:
+        parsed_entry = cached.get(keys[entry["composite_id"]])
+        if parsed_entry is not None:
+            yield {
+                "custom_id": entry["composite_id"],
+                "price": entry.get("price"),
+                "parsed_entry": with_original_entry(parsed_entry, entry["text"]),
+                "from_cache": True,
+            }
+
+
+def retrieve_batch(batch_id, original_file, pack_size=None, preparse_threshold=None,
+                   max_retries=MAX_RETRY_ATTEMPTS, packs=None):
+    """
+    Check a batch's status; if ended, retrieve and save its results.
+    Returns {"status": 'completed' | 'processing', "retry": summary or None,
+    "telemetry": timings, counts and token usage or None} (see
+    retry_lost_entries and batch_telemetry).
+    Saves results to data_reload/reparse_missing/reparsed/<stem>.json on success.
+
+    Results are streamed to the output file as they arrive; fresh
+    parses go into the parse cache in chunks on the way through.
+    Packed batches (pack_size set) are split back into one result per
+    entry; `packs` (from the submission record) names each pack's
+    entries, so a failed pack's reason is kept for all of them. Entries with no parsed result — in any batch — go to a
+    retry file, within the retry budget. Entries skipped
+    as cache hits at submission are filled in from the parse cache, and
+    entries the pre-parser took (preparse_threshold set) are parsed
+    locally again (never cached); a batch_id of None means nothing
+    was sent.
+
+    Stays silent during normal operation — the caller decides what
+    to print.
+    """
+    if batch_id is not None:
+        batch_status = client.messages.batches.retrieve(batch_id)
+        if batch_status.processing_status != "ended":
+            return {"status": "processing", "retry": None, "telemetry": None}
+
+    batch_data, lookup, keys = load_batch(original_file)
+    parsed_ids = set()
+    failures = {}
+    usage = {}
+
+    def missing_entries():
+        return [entry for entry in batch_data if entry["composite_id"] not in parsed_ids]
+
+    conn = open_cache()
+    try:
+        with JsonArrayWriter(parsed_file_for(original_file)) as out:
+            if batch_id is not None:
+                fresh = []
+                for record in iter_batch_results(batch_id, lookup, failures, usage, packs):
+                    out.write(record)
+                    if "parsed_entry" in record:
+                        parsed_ids.add(record["custom_id"])
+                        if record["custom_id"] in keys:
+                            fresh.append((keys[record["custom_id"]], record["parsed_entry"]))
+                    if len(fresh) >= CACHE_WRITE_CHUNK:
+                        put_many(conn, fresh, PROMPT_VERSION, MODEL)
+                        fresh = []
+                if fresh:
+                    put_many(conn, fresh, PROMPT_VERSION, MODEL)
+
+            for record in cached_records(conn, missing_entries(), keys):
+                out.write(record)
+                parsed_ids.add(record["custom_id"])
+
+            if preparse_threshold is not None:
+                preparsed, _ = preparse_batch(missing_entries(), preparse_threshold)
+                for record in preparsed:
+                    out.write(record)
+                    parsed_ids.add(record["custom_id"])
+    finally:
+        conn.close()
+
+    retry = retry_lost_entries(original_file, batch_data, parsed_ids, failures, max_retries)
+    telemetry = ended_telemetry(batch_status, usage) if batch_id is not None else None
+    return {"status": "completed", "retry": retry, "telemetry": telemetry}
+
+
+def record_telemetry(log, original_file, info, telemetry):
+    """Merge retrieval telemetry into the batch's log record."""
+    if telemetry is None:
+        return
+    log.update(original_file, telemetry={**info.get("telemetry", {}), **telemetry})
+
+
+def record_retry(log, original_file, retry):
+    """Note a retry file (or unrecoverable entries) in the progress log."""
+    if retry is None:
+        return
+    if retry["file_path"]:
+        log.append_meta("retries", {
+            "source": str(original_file),
+            "file_path": retry["file_path"],
+            "attempt": retry["attempt"],
+            "entries": retry["entries"],
+            "reasons": retry["reasons"],
+        })
+    for item in retry["unrecoverable"]:
+        log.append_meta("unrecoverable", {"source": str(original_file), **item})
+
+
+def count_retrieval(info, retry):
+    """Feed one completed retrieval to the metrics."""
+    lost = retry["entries"] if retry else 0
+    count_entries("book_parse", "retrieved", info.get("entry_count", 0) - lost)
+    for reason, n in (retry["reasons"] if retry else {}).items():
+        count_api_errors("book_parse", reason, n)
+
+
+def describe_retry(retry):
+    if retry is None:
+        return None
+    reasons = ", ".join(f"{n} {reason}" for reason, n in sorted(retry["reasons"].items()))
+    if retry["file_path"]:
+        return f"{retry['entries']} entries to retry ({reasons}) -> {Path(retry['file_path']).name}"
+    return f"{retry['entries']} entries unrecoverable after {retry['attempt'] - 1} retries ({reasons})"
+
+
+def process_queue(in_queue_batches, log, workers=RETRIEVE_WORKERS):
+    """
+    Try to retrieve every in-queue batch, up to `workers` at a time.
+    Returns:
       newly_completed: list of (file_str, info) successfully retrieved
       errors:          list of (file_str, info, error_message)
-    Mutates log_data in place to record completions.
+    Records completions in the log as they happen (from this thread
+    only; the workers never touch the log).
     """
     newly_completed = []
     errors = []
 
-    for file_str, info in in_queue_batches:
-        try:
-            status = retrieve_batch(info["batch_id"], file_str)
-            if status == "completed":
-                newly_completed.append((file_str, info))
-                if info["batch_id"] not in log_data["completed"]:
-                    log_data["completed"].append(info["batch_id"])
-        except Exception as e:
-            errors.append((file_str, info, str(e)))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(
+                retrieve_batch,
+                info["batch_id"], file_str, info.get("pack_size"), info.get("preparse_threshold"),
+                packs=info.get("packs"),
+            ): (file_str, info)
+            for file_str, info in in_queue_batches
+        }
+        for future in as_completed(futures):
+            file_str, info = futures[future]
+            try:
+                outcome = future.result()
+                if outcome["status"] == "completed":
+                    newly_completed.append((file_str, info))
+                    if info["batch_id"]:
+                        log.append_meta("completed", info["batch_id"])
+                    record_retry(log, file_str, outcome["retry"])
+                    record_telemetry(log, file_str, info, outcome["telemetry"])
+                    count_retrieval(info, outcome["retry"])
+                    note = describe_retry(outcome["retry"])
+                    if note:
+                        print(f"  ↻ {Path(file_str).name}: {note}")
+            except Exception as e:
+                errors.append((file_str, info, str(e)))
+                count_api_errors("book_parse", "retrieve_failed")
 
     return newly_completed, errors
 
@@ -226,7 +515,7 @@ def percentage(part, total):
     return f"{pct:>3}%"
 
 
-def print_dashboard(buckets, last_run, newly_completed, attention):
+def print_dashboard(buckets, last_run, newly_completed, attention, telemetry=None):
     """Print the main status dashboard."""
     total = buckets["total"]
     parsed_n = len(buckets["parsed"])
@@ -242,8 +531,13 @@ def print_dashboard(buckets, last_run, newly_completed, attention):
     print(f"  {'Parsed & saved:':<23}{parsed_n:>4}  |  {percentage(parsed_n, total)}")
     print(f"  {'Submitted/processing:':<23}{queue_n:>4}  |  {percentage(queue_n, total)}")
     print(f"  {'Not yet submitted:':<23}{todo_n:>4}  |  {percentage(todo_n, total)}")
+    entries_n = buckets["total_entries"]
+    parsed_entries_n = buckets["parsed_entries"]
+    print(f"  {'Entries parsed:':<23}{parsed_entries_n:>4} of {entries_n}  |  {percentage(parsed_entries_n, entries_n)}")
     print()
 
+    print_telemetry(telemetry)
+
     # Since-last-check section
     if last_run:
         age = format_age(last_run.get("timestamp", ""))
@@ -279,15 +573,9 @@ def print_dashboard(buckets, last_run, newly_completed, attention):
 # Specific-batch mode
 # ============================================================
 
-def check_specific_batch(batch_id, log_data):
+def check_specific_batch(batch_id, log):
     """Check a single batch by ID (used with --batch-id flag)."""
-    batch_info = None
-    file_path = None
-    for path, info in log_data["submitted"].items():
-        if info["batch_id"] == batch_id:
-            batch_info = info
-            file_path = path
-            break
+    file_path, batch_info = log.find_batch(batch_id)
 
     if not batch_info:
         print(f"❌ Batch ID {batch_id} not found in submitted batches")
@@ -300,14 +588,21 @@ def check_specific_batch(batch_id, log_data):
     print()
 
     try:
-        status = retrieve_batch(batch_id, file_path)
-        if status == "completed":
+        outcome = retrieve_batch(
+            batch_id, file_path, batch_info.get("pack_size"), batch_info.get("preparse_threshold"),
+            packs=batch_info.get("packs"),
+        )
+        if outcome["status"] == "completed":
             output = parsed_file_for(file_path)
             print(f"✅ Completed — saved to {output}")
-            if batch_id not in log_data["completed"]:
-                log_data["completed"].append(batch_id)
-                save_log(log_data)
-        elif status == "processing":
+            log.append_meta("completed", batch_id)
+            record_retry(log, file_path, outcome["retry"])
+            record_telemetry(log, file_path, batch_info, outcome["telemetry"])
+            count_retrieval(batch_info, outcome["retry"])
+            note = describe_retry(outcome["retry"])
+            if note:
+                print(f"↻ {note}")
+        elif outcome["status"] == "processing":
             print("⏳ Still processing")
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -326,42 +621,54 @@ def main():
         type=str,
         help="Check status of a specific batch ID",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=RETRIEVE_WORKERS,
+        help=f"Batches to retrieve in parallel (default: {RETRIEVE_WORKERS})",
+    )
     args = parser.parse_args()
 
-    log_data = load_log()
+    init_metrics()
+    log = load_log()
 
     # Specific-batch mode bypasses the dashboard entirely
     if args.batch_id:
-        check_specific_batch(args.batch_id, log_data)
+        check_specific_batch(args.batch_id, log)
+        log.close()
         return
 
     # Categorise everything based on filesystem truth
-    batch_files = find_batch_files()
-    buckets = categorise_batches(batch_files, log_data)
+    index = BatchStateIndex()
+    buckets = categorise_batches(log, index)
 
     # Try to retrieve everything currently in queue
-    newly_completed, errors = process_queue(buckets["in_queue"], log_data)
-    save_log(log_data)
+    with stage_timer("book_check"):
+        newly_completed, errors = process_queue(buckets["in_queue"], log, args.workers)
 
     # Re-categorise after retrievals so the dashboard reflects the new state
-    buckets = categorise_batches(batch_files, log_data)
+    buckets = categorise_batches(log, index)
+    index.save()
+    set_in_flight("book_parse", len(buckets["in_queue"]))
 
     # Read the previous snapshot before overwriting it
-    last_run = log_data.get("last_run")
+    last_run = log.meta.get("last_run")
 
     # Build the attention list (uses post-retrieval queue + this run's errors)
     attention = check_attention(buckets["in_queue"], errors)
 
-    print_dashboard(buckets, last_run, newly_completed, attention)
+    telemetry = summarise(log.records.values(), buckets["not_submitted_entries"])
+
+    print_dashboard(buckets, last_run, newly_completed, attention, telemetry)
 
     # Save the new snapshot for next run's deltas
-    log_data["last_run"] = {
+    log.set_meta("last_run", {
         "timestamp": datetime.now().isoformat(timespec="minutes"),
         "parsed_count": len(buckets["parsed"]),
         "in_queue_count": len(buckets["in_queue"]),
         "not_submitted_count": len(buckets["not_submitted"]),
-    }
-    save_log(log_data)
+    })
+    log.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,427 @@
+import json
+import re
+import time
+import uuid
+import random
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ============================================================
+# Local stand-in for the Message Batches endpoints
+# ============================================================
+#
+# Serves just enough of /v1/messages/batches for the anthropic client
+# to create, retrieve and stream results. Point a client at it with
+#   ANTHROPIC_BASE_URL=http://127.0.0.1:<port> ANTHROPIC_API_KEY=fake
+# Nothing leaves the machine and nothing is billed.
+#
+# Responses are, in order of preference:
+#   canned  taken from existing parsed outputs (--canned), matched by
+#           custom_id / composite_id, or by original entry text
+#   echo    a minimal parse built from the request itself; people
+#           requests get their input people back with a unified_id
+# Per-request failures can be injected with --error-rate, --expire-rate
+# and --malformed-rate; outcomes are fixed when the batch is created so
+# request_counts and results always agree. GET /stats returns call
+# counts for the benchmarks.
+
+ENTRY_PATTERN = re.compile(r"ENTRY:\s*(.*)")
+PACKED_PATTERN = re.compile(r"COMPOSITE_ID:\s*(.*)\nTOPIC:.*\nENTRY:\s*(.*)")
+SPLIT_PATTERN = re.compile(r"\s+(?:und|u\.)\s+", re.IGNORECASE)
+
+# Rough token estimate for the fake usage block
+CHARS_PER_TOKEN = 3
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def request_text(request):
+    """The user message of a request as plain text."""
+    content = request["params"]["messages"][0]["content"]
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") for block in content)
+    return content
+
+
+def cached_system_tokens(request):
+    """Pretend every cache_control system block is a cache hit."""
+    system = request["params"].get("system")
+    if not isinstance(system, list):
+        return 0
+    return sum(len(block.get("text", "")) for block in system if block.get("cache_control")) // CHARS_PER_TOKEN
+
+
+def first_json_value(text):
+    """Decode the first JSON object or array embedded in a prompt."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        return value
+    return None
+
+
+def fake_unified_id(person):
+    family = person.get("family_name") or person.get("display_name") or person.get("single_name") or ""
+    given = person.get("given_names") or ""
+    parts = [re.sub(r"\W+", "_", part.strip().lower()).strip("_") for part in (family, given)]
+    return "_".join(part for part in parts if part) or "oops"
+
+
+def echo_people(content):
+    """
+    People passes send their input as JSON. Pass 1 ("ENTRY TO SPLIT")
+    gets one record per name; everything else gets its people back,
+    each with a unified_id (and variants for lists).
+    """
+    payload = first_json_value(content)
+
+    if isinstance(payload, dict) and "ENTRY TO SPLIT" in content:
+        names = SPLIT_PATTERN.split(payload.get("display_name") or payload.get("single_name") or "")
+        people = []
+        for sort_order, name in enumerate(names, start=1):
+            given, _, family = name.strip().rpartition(" ")
+            people.append({
+                **payload,
+                "display_name": f"{family}, {given}" if given else family,
+                "family_name": family,
+                "given_names": given or None,
+                "single_name": None,
+                "sort_order": sort_order,
+            })
+        return people
+
+    if isinstance(payload, dict):
+        return {**payload, "unified_id": fake_unified_id(payload)}
+
+    if isinstance(payload, list):
+        return [
+            {**person, "unified_id": fake_unified_id(person), "variants": []}
+            for person in payload if isinstance(person, dict)
+        ]
+
+    return None
+
+
+def fake_response_text(request, canned=None):
+    """
+    Response text for a request: canned if available, else a minimal
+    parse that echoes the entry as original_entry. Packed requests get
+    the JSON array shape, one item per entry.
+    """
+    canned = canned or {}
+    content = request_text(request)
+
+    if request["custom_id"] in canned:
+        return canned[request["custom_id"]]
+
+    packed = PACKED_PATTERN.findall(content)
+    if packed:
+        items = []
+        for composite_id, text in packed:
+            composite_id, text = composite_id.strip(), text.strip()
+            parsed = canned.get(composite_id) or canned.get(text)
+            parsed_entry = json.loads(parsed) if parsed else {"administrative": {"original_entry": text}}
+            items.append({"composite_id": composite_id, "parsed_entry": parsed_entry})
+        return json.dumps(items, ensure_ascii=False)
+
+    match = ENTRY_PATTERN.search(content)
+    if match:
+        original_entry = match.group(1).strip()
+        if original_entry in canned:
+            return canned[original_entry]
+        return json.dumps({"administrative": {"original_entry": original_entry}}, ensure_ascii=False)
+
+    people = echo_people(content)
+    if people is not None:
+        return json.dumps(people, ensure_ascii=False)
+    return json.dumps({"administrative": {"original_entry": content.strip()}}, ensure_ascii=False)
+
+
+def load_canned_responses(paths):
+    """
+    Build {custom_id or original entry text: response text} from parsed
+    outputs already on disk:
+      - book parses  [{"custom_id": ..., "parsed_entry": {...}}, ...]
+      - people results  [{..., "_source_custom_id": ...}, ...]
+        (records sharing a custom_id are one response)
+    """
+    canned = {}
+    people = {}
+
+    files = []
+    for path in paths:
+        path = Path(path)
+        files.extend(sorted(path.glob("*.json")) if path.is_dir() else [path])
+
+    for path in files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not isinstance(data, list):
+            continue
+
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            if "parsed_entry" in item and item.get("custom_id"):
+                parsed_entry = item["parsed_entry"]
+                text = json.dumps(parsed_entry, ensure_ascii=False)
+                canned[item["custom_id"]] = text
+                original = ((parsed_entry or {}).get("administrative") or {}).get("original_entry")
+                if original:
+                    canned[original.strip()] = text
+            elif item.get("_source_custom_id") and not item.get("_error"):
+                record = {k: v for k, v in item.items() if not k.startswith("_")}
+                people.setdefault(item["_source_custom_id"], []).append(record)
+
+    for custom_id, records in people.items():
+        response = records[0] if len(records) == 1 else records
+        canned[custom_id] = json.dumps(response, ensure_ascii=False)
+
+    return canned
+
+
+class FakeBatchStore:
+    """In-memory batches plus the timing and failure knobs the handler reads."""
+
+    def __init__(self, latency=0.2, processing_time=0.0, error_rate=0.0, expire_rate=0.0,
+                 malformed_rate=0.0, canned=None, seed=None):
+        self.latency = latency
+        self.processing_time = processing_time
+        self.error_rate = error_rate
+        self.expire_rate = expire_rate
+        self.malformed_rate = malformed_rate
+        self.canned = canned or {}
+        self.random = random.Random(seed)
+        self.batches = {}
+        self.calls = {"create": 0, "retrieve": 0, "results": 0}
+        self.lock = threading.Lock()
+
+    def count_call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def pick_outcome(self):
+        roll = self.random.random()
+        if roll < self.error_rate:
+            return "errored"
+        if roll < self.error_rate + self.expire_rate:
+            return "expired"
+        if roll < self.error_rate + self.expire_rate + self.malformed_rate:
+            return "malformed"
+        return "succeeded"
+
+    def create(self, requests):
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:20]}"
+        with self.lock:
+            self.batches[batch_id] = {
+                "requests": requests,
+                "outcomes": [self.pick_outcome() for _ in requests],
+                "created": time.monotonic(),
+                "created_at": now_iso(),
+            }
+        return batch_id
+
+    def batch_object(self, batch_id, base_url):
+        batch = self.batches[batch_id]
+        ended = time.monotonic() - batch["created"] >= self.processing_time
+        count = len(batch["requests"])
+        outcomes = batch["outcomes"]
+        failed = {kind: outcomes.count(kind) for kind in ("errored", "expired")}
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count - sum(failed.values()) if ended else 0,
+                "errored": failed["errored"] if ended else 0,
+                "canceled": 0,
+                "expired": failed["expired"] if ended else 0,
+            },
+            "created_at": batch["created_at"],
+            "ended_at": now_iso() if ended else None,
+            "expires_at": batch["created_at"],
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def result_lines(self, batch_id):
+        batch = self.batches[batch_id]
+        for request, outcome in zip(batch["requests"], batch["outcomes"]):
+            if outcome == "errored":
+                result = {
+                    "type": "errored",
+                    "error": {"type": "error", "error": {"type": "api_error", "message": "Injected failure"}},
+                }
+            elif outcome == "expired":
+                result = {"type": "expired"}
+            else:
+                text = fake_response_text(request, self.canned)
+                if outcome == "malformed":
+                    # Cut off mid-object, as a response hitting max_tokens would be
+                    text = text[:max(1, len(text) // 2)]
+                message = {
+                    "id": f"msg_fake_{uuid.uuid4().hex[:20]}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request["params"].get("model", "fake"),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "max_tokens" if outcome == "malformed" else "end_turn",
+                    "stop_sequence": None,
+                    "usage": {
+                        "input_tokens": len(request_text(request)) // CHARS_PER_TOKEN,
+                        "output_tokens": len(text) // CHARS_PER_TOKEN,
+                        "cache_read_input_tokens": cached_system_tokens(request),
+                        "cache_creation_input_tokens": 0,
+                    },
+                }
+                result = {"type": "succeeded", "message": message}
+            yield json.dumps({"custom_id": request["custom_id"], "result": result}, ensure_ascii=False)
+
+
+def make_handler(store):
+    class FakeBatchesHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        @property
+        def base_url(self):
+            host, port = self.server.server_address[:2]
+            return f"http://{host}:{port}"
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if path != "/v1/messages/batches":
+                self.send_json({"type": "error", "error": {"type": "not_found_error"}}, 404)
+                return
+
+            time.sleep(store.latency)
+            store.count_call("create")
+            batch_id = store.create(payload["requests"])
+            self.send_json(store.batch_object(batch_id, self.base_url))
+
+        def do_GET(self):
+            if self.path.split("?")[0] == "/stats":
+                with store.lock:
+                    self.send_json({"calls": dict(store.calls), "batches": len(store.batches)})
+                return
+
+            parts = self.path.split("?")[0].strip("/").split("/")
+            # v1 / messages / batches / <id> [/ results]
+            if len(parts) < 4 or parts[:3] != ["v1", "messages", "batches"] or parts[3] not in store.batches:
+                self.send_json({"type": "error", "error": {"type": "not_found_error"}}, 404)
+                return
+
+            batch_id = parts[3]
+            time.sleep(store.latency)
+
+            if len(parts) == 5 and parts[4] == "results":
+                store.count_call("results")
+                body = "\n".join(store.result_lines(batch_id)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/binary")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                store.count_call("retrieve")
+                self.send_json(store.batch_object(batch_id, self.base_url))
+
+    return FakeBatchesHandler
+
+
+def start_server(port=0, latency=0.2, processing_time=0.0, **store_options):
+    """
+    Start the fake endpoint on a daemon thread. store_options go to
+    FakeBatchStore (error_rate, expire_rate, malformed_rate, canned, seed).
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    store = FakeBatchStore(latency=latency, processing_time=processing_time, **store_options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(store))
+    server.daemon_threads = True
+    server.store = store
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, bound_port = server.server_address[:2]
+    return server, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a local fake of the Message Batches API"
+    )
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds added to every call (default: 0.2)")
+    parser.add_argument(
+        "--processing-time",
+        type=float,
+        default=0.0,
+        help="Seconds before a created batch reports 'ended' (default: 0)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that come back errored")
+    parser.add_argument("--expire-rate", type=float, default=0.0, help="Share of requests that come back expired")
+    parser.add_argument(
+        "--malformed-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests that succeed with truncated, undecodable JSON"
+    )
+    parser.add_argument(
+        "--canned",
+        nargs="+",
+        default=[],
+        metavar="PATH",
+        help="Parsed output files or folders to answer from (e.g. data_reload/reparse_missing/reparsed)"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for injected failures")
+    args = parser.parse_args()
+
+    canned = load_canned_responses(args.canned)
+    server, base_url = start_server(
+        args.port, args.latency, args.processing_time,
+        error_rate=args.error_rate,
+        expire_rate=args.expire_rate,
+        malformed_rate=args.malformed_rate,
+        canned=canned,
+        seed=args.seed,
+    )
+    print(f"Fake Batches API listening on {base_url}")
+    if canned:
+        print(f"  {len(canned)} canned responses loaded")
+    print(f"  export ANTHROPIC_BASE_URL={base_url} ANTHROPIC_API_KEY=fake")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
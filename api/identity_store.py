@@ -0,0 +1,404 @@
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import unified_id
+from people_blocking import id_fields
+from people_nopes_matcher import match_nopes, person_key
+
+# ============================================================
+# Persistent person identity store
+# ============================================================
+#
+# SQLite file holding union-find clusters over two kinds of node:
+#   name:<folded display_name>   every spelling seen in the books
+#   id:<unified_id>              every person in the people table
+# A cluster is one person; its canonical unified_id / person_id sit in
+# `canonical` under the cluster's root. Merging two people is one
+# union, and the absorbed unified_id still resolves afterwards.
+#
+# A spelling seen for two different people ("MÜLLER, H." for Hans and
+# for Heinrich) is never unioned: it goes to `ambiguous` with every
+# unified_id it was seen with, and stays out of automatic linking.
+#
+# resolve_names() links new spellings incrementally, touching only the
+# clusters involved:
+#   0. ambiguous spelling                -> unresolved
+#   1. known spelling                    -> its cluster
+#   2. generated unified_id is a person  -> linked to that person, unless
+#      numbered siblings exist (muller_hans_2): then on to 3
+#   3. clear local match (same surname block, people_nopes_matcher, with
+#      its runner-up margin)             -> linked to that person
+#   4. anything else stays unresolved (for the API or a new person)
+#
+#   python identity_store.py seed --people "data/from db/people.json" \
+#       --variants database/in_progress/pass2_results
+#   python identity_store.py resolve new_names.json
+#   python identity_store.py stats
+
+STORE_FILE = Path("data/people/identity_store.sqlite")
+
+# SQLite's default limit on host parameters is 999; stay well below it
+LOOKUP_CHUNK = 500
+
+PERSON_FIELDS = ["family_name", "given_names", "name_particles", "single_name", "is_organisation"]
+
+
+def name_node(display_name):
+    return "name:" + re.sub(r"\s+", " ", unified_id.fold(display_name)).strip(" .,;")
+
+
+def id_node(uid):
+    return "id:" + uid
+
+
+def open_store(path=STORE_FILE):
+    """Open (and create if needed) the identity store."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS nodes (
+            node TEXT PRIMARY KEY,
+            parent TEXT NOT NULL,
+            size INTEGER NOT NULL DEFAULT 1,
+            display_name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS people (
+            unified_id TEXT PRIMARY KEY,
+            person_id INTEGER,
+            family_name TEXT,
+            given_names TEXT,
+            name_particles TEXT,
+            single_name TEXT,
+            is_organisation INTEGER NOT NULL DEFAULT 0,
+            block TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS people_block ON people (block);
+        CREATE TABLE IF NOT EXISTS canonical (
+            root TEXT PRIMARY KEY,
+            unified_id TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ambiguous (
+            node TEXT NOT NULL,
+            unified_id TEXT NOT NULL,
+            PRIMARY KEY (node, unified_id)
+        );
+    """)
+    return conn
+
+
+# ---------- union-find ----------
+
+def add_node(conn, node, display_name=None):
+    conn.execute(
+        "INSERT OR IGNORE INTO nodes (node, parent, display_name) VALUES (?, ?, ?)",
+        (node, node, display_name),
+    )
+
+
+def find(conn, node):
+    """Root of node's cluster (None for an unknown node), compressing the path."""
+    path = []
+    while True:
+        row = conn.execute("SELECT parent FROM nodes WHERE node = ?", (node,)).fetchone()
+        if row is None:
+            return None
+        if row[0] == node:
+            break
+        path.append(node)
+        node = row[0]
+    if len(path) > 1:
+        conn.executemany("UPDATE nodes SET parent = ? WHERE node = ?", [(node, p) for p in path[:-1]])
+    return node
+
+
+def person_id_of(conn, uid):
+    row = conn.execute("SELECT person_id FROM people WHERE unified_id = ?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def union(conn, a, b):
+    """Merge the clusters of two known nodes; returns the new root."""
+    root_a, root_b = find(conn, a), find(conn, b)
+    if root_a == root_b:
+        return root_a
+    size_a = conn.execute("SELECT size FROM nodes WHERE node = ?", (root_a,)).fetchone()[0]
+    size_b = conn.execute("SELECT size FROM nodes WHERE node = ?", (root_b,)).fetchone()[0]
+    if size_a < size_b:
+        root_a, root_b = root_b, root_a
+    conn.execute("UPDATE nodes SET parent = ? WHERE node = ?", (root_a, root_b))
+    conn.execute("UPDATE nodes SET size = ? WHERE node = ?", (size_a + size_b, root_a))
+
+    # Two people merged: the one already in the database (lowest person_id) stays canonical
+    kept = [
+        row[0] for row in conn.execute(
+            "SELECT unified_id FROM canonical WHERE root IN (?, ?)", (root_a, root_b)
+        )
+    ]
+    if kept:
+        best = min(kept, key=lambda uid: (person_id_of(conn, uid) is None, person_id_of(conn, uid) or 0, uid))
+        conn.execute("DELETE FROM canonical WHERE root IN (?, ?)", (root_a, root_b))
+        conn.execute("INSERT INTO canonical VALUES (?, ?)", (root_a, best))
+    return root_a
+
+
+def canonical_of(conn, node):
+    """(unified_id, person_id) of node's cluster, or None."""
+    root = find(conn, node)
+    if root is None:
+        return None
+    row = conn.execute("SELECT unified_id FROM canonical WHERE root = ?", (root,)).fetchone()
+    if row is None:
+        return None
+    return row[0], person_id_of(conn, row[0])
+
+
+# ---------- people and variants ----------
+
+def add_person(conn, person, variants=()):
+    """
+    Store one person (people table row or newly created) and link its
+    display_name variants to it.
+    """
+    uid = person["unified_id"]
+    conn.execute(
+        "INSERT OR REPLACE INTO people VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            uid, person.get("person_id"),
+            *(person.get(field) for field in PERSON_FIELDS[:-1]),
+            int(bool(person.get("is_organisation"))),
+            person_key(person),
+            datetime.now().isoformat(timespec="seconds"),
+        ),
+    )
+    add_node(conn, id_node(uid))
+    ensure_canonical(conn, uid)
+    for display_name in variants:
+        link_variant(conn, display_name, uid)
+
+
+def ensure_canonical(conn, uid):
+    """A cluster known only from results (not yet in the people table) is named by uid."""
+    root = find(conn, id_node(uid))
+    conn.execute("INSERT OR IGNORE INTO canonical VALUES (?, ?)", (root, uid))
+
+
+def ambiguous_ids(conn, node):
+    """unified_ids a spelling was seen with, if it is ambiguous (else [])."""
+    return [row[0] for row in conn.execute("SELECT unified_id FROM ambiguous WHERE node = ? ORDER BY unified_id", (node,))]
+
+
+def link_variant(conn, display_name, uid):
+    """
+    Record that display_name is a spelling of the person with unified_id
+    uid. A spelling already belonging to another identity is marked
+    ambiguous instead of merging the two; returns False then.
+    """
+    if not display_name:
+        return False
+    node = name_node(display_name)
+    add_node(conn, id_node(uid))
+    ensure_canonical(conn, uid)
+    target = canonical_of(conn, id_node(uid))
+
+    if ambiguous_ids(conn, node):
+        conn.execute("INSERT OR IGNORE INTO ambiguous VALUES (?, ?)", (node, target[0]))
+        return False
+    current = canonical_of(conn, node)
+    if current and current[0] != target[0]:
+        conn.executemany(
+            "INSERT OR IGNORE INTO ambiguous VALUES (?, ?)", [(node, current[0]), (node, target[0])]
+        )
+        return False
+
+    add_node(conn, node, display_name)
+    union(conn, node, id_node(uid))
+    return True
+
+
+def merge_people(conn, uid_a, uid_b):
+    """Two unified_ids turned out to be one person."""
+    for uid in (uid_a, uid_b):
+        add_node(conn, id_node(uid))
+        ensure_canonical(conn, uid)
+    union(conn, id_node(uid_a), id_node(uid_b))
+
+
+def has_numbered_siblings(conn, uid):
+    """Whether uid_2, uid_3, ... exist: the plain ID then names one of several people."""
+    row = conn.execute("SELECT 1 FROM nodes WHERE node GLOB ? LIMIT 1", (f"{id_node(uid)}_[0-9]*",)).fetchone()
+    return row is not None
+
+
+def candidates_in_blocks(conn, blocks):
+    """People rows (as dicts) in the given surname blocks."""
+    blocks = list(dict.fromkeys(blocks))
+    people = []
+    for i in range(0, len(blocks), LOOKUP_CHUNK):
+        chunk = blocks[i:i + LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT unified_id, person_id, {', '.join(PERSON_FIELDS)} FROM people WHERE block IN ({placeholders})",
+            chunk,
+        )
+        for row in rows:
+            person = dict(zip(["unified_id", "person_id", *PERSON_FIELDS], row))
+            person["is_organisation"] = bool(person["is_organisation"])
+            people.append(person)
+    return people
+
+
+def resolve_names(conn, entries):
+    """
+    Link new person entries (display_name, plus name fields where known)
+    to existing people.
+
+    Returns one dict per entry, in order:
+        {"display_name", "unified_id", "person_id", "resolved_by", "ambiguous_with"}
+    with resolved_by "variant", "unified_id", "match" or None (unresolved);
+    ambiguous_with lists the unified_ids of an ambiguous spelling.
+    """
+    results = []
+    pending = []
+    with conn:
+        for entry in entries:
+            display_name = entry.get("display_name") or entry.get("single_name") or ""
+            result = {
+                "display_name": display_name, "unified_id": None, "person_id": None,
+                "resolved_by": None, "ambiguous_with": [],
+            }
+            results.append(result)
+
+            result["ambiguous_with"] = ambiguous_ids(conn, name_node(display_name))
+            if result["ambiguous_with"]:
+                continue
+
+            known = canonical_of(conn, name_node(display_name))
+            if known:
+                result.update(unified_id=known[0], person_id=known[1], resolved_by="variant")
+                continue
+
+            fields = {**id_fields(entry), **{k: entry[k] for k in PERSON_FIELDS if entry.get(k)}}
+            generated = unified_id.generate(fields)
+            identity = None
+            if generated != unified_id.OOPS and not has_numbered_siblings(conn, generated):
+                identity = canonical_of(conn, id_node(generated))
+            if identity:
+                link_variant(conn, display_name, generated)
+                result.update(unified_id=identity[0], person_id=identity[1], resolved_by="unified_id")
+                continue
+
+            pending.append((result, {**fields, "display_norm": display_name, "composite_id": None}))
+
+        if pending:
+            candidates = candidates_in_blocks(conn, [person_key(fields) for _, fields in pending])
+            accepted, _, _ = match_nopes([fields for _, fields in pending], candidates)
+            by_name = {fields["display_norm"]: person for fields, person, _ in accepted}
+            for result, fields in pending:
+                person = by_name.get(fields["display_norm"])
+                if person is None:
+                    continue
+                if not link_variant(conn, result["display_name"], person["unified_id"]):
+                    result["ambiguous_with"] = ambiguous_ids(conn, name_node(result["display_name"]))
+                    continue
+                uid, pid = canonical_of(conn, id_node(person["unified_id"]))
+                result.update(unified_id=uid, person_id=pid, resolved_by="match")
+
+    return results
+
+
+# ---------- seeding ----------
+
+def load_variant_records(sources):
+    """(display_name, unified_id, variants) from pass 2 / local result files."""
+    records = []
+    for source in sources:
+        source = Path(source)
+        paths = sorted(source.glob("*.json")) if source.is_dir() else [source]
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for item in data if isinstance(data, list) else []:
+                uid = item.get("unified_id")
+                if uid and uid != unified_id.OOPS:
+                    records.append((item.get("display_name"), uid, item.get("variants") or []))
+    return records
+
+
+def seed(conn, people, variant_records=()):
+    """Load the people table and known spellings; safe to re-run."""
+    with conn:
+        for person in people:
+            if person.get("unified_id"):
+                add_person(conn, person)
+        for display_name, uid, variants in variant_records:
+            add_node(conn, id_node(uid))
+            for name in [display_name, *variants]:
+                link_variant(conn, name, uid)
+
+
+def stats(conn):
+    nodes = conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    names = conn.execute("SELECT COUNT(*) FROM nodes WHERE node LIKE 'name:%'").fetchone()[0]
+    clusters = conn.execute("SELECT COUNT(*) FROM nodes WHERE node = parent").fetchone()[0]
+    people = conn.execute("SELECT COUNT(*) FROM people").fetchone()[0]
+    ambiguous = conn.execute("SELECT COUNT(DISTINCT node) FROM ambiguous").fetchone()[0]
+    return {"nodes": nodes, "spellings": names, "people": people, "clusters": clusters, "ambiguous": ambiguous}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent person identity store")
+    parser.add_argument("--store", type=Path, default=STORE_FILE, help=f"SQLite file (default: {STORE_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Load the people table and known spellings")
+    seed_parser.add_argument("--people", type=Path, required=True, help="People table export (JSON list)")
+    seed_parser.add_argument("--variants", nargs="*", default=[],
+                             help="Result files or folders with display_name/unified_id/variants (pass 2)")
+
+    resolve_parser = commands.add_parser("resolve", help="Link new names to existing people")
+    resolve_parser.add_argument("names_file", type=Path, help="JSON list of person entries")
+    resolve_parser.add_argument("--output", type=Path, help="Write the resolutions here (default: print)")
+
+    commands.add_parser("stats", help="Show store size")
+    args = parser.parse_args()
+
+    conn = open_store(args.store)
+
+    if args.command == "seed":
+        with open(args.people, "r", encoding="utf-8") as f:
+            people = json.load(f)
+        started = time.perf_counter()
+        seed(conn, people, load_variant_records(args.variants))
+        print(f"Seeded in {time.perf_counter() - started:.1f}s: {stats(conn)}")
+
+    elif args.command == "resolve":
+        with open(args.names_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        started = time.perf_counter()
+        results = resolve_names(conn, entries)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        resolved = sum(1 for r in results if r["resolved_by"])
+        ambiguous = sum(1 for r in results if r["ambiguous_with"])
+        print(f"Resolved {resolved}/{len(results)} names in {elapsed_ms:.0f} ms ({ambiguous} ambiguous)", file=sys.stderr)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        else:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    else:
+        for name, value in stats(conn).items():
+            print(f"{name + ':':<12}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import re
+import json
+
+try:
+    import jiter
+except ImportError:  # jiter ships with the anthropic SDK, but stay usable without it
+    jiter = None
+
+# ============================================================
+# Tolerant JSON extraction from model responses
+# ============================================================
+#
+# The prompts ask for bare JSON, but responses still arrive with
+# ```json fences (leading and/or trailing), a sentence before or after
+# the JSON, German quotation marks breaking a string („Titel"), or cut
+# off at max_tokens. Each of those used to become a failed entry.
+#
+# extract_json tries, in order, and reports which step worked:
+#   direct    the whole text
+#   fenced    the body of the first ``` fence
+#   trimmed   from the first { / [ to its matching end, prose dropped
+#   quotes    „…" / „…“ rewritten to the <<…>> convention of the prompt
+#   partial   truncated output closed by jiter's partial mode; only
+#             accepted for arrays, and the last (possibly cut) item is
+#             dropped so the entries it held are retried
+#
+# The fast path is jiter (falls back to json when it is missing).
+
+FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:\n?```|$)", re.DOTALL)
+GERMAN_QUOTE_PATTERN = re.compile(r"„([^\"„“”\n]*)[\"“”]")
+
+METHODS = ["direct", "fenced", "trimmed", "quotes", "partial"]
+
+
+class ExtractError(ValueError):
+    """No JSON value could be recovered from a response."""
+
+
+def loads(text):
+    if jiter is not None:
+        return jiter.from_json(text.encode("utf-8"))
+    return json.loads(text)
+
+
+def strip_fences(text):
+    match = FENCE_PATTERN.search(text)
+    if match and match.group(1).strip():
+        return match.group(1).strip()
+    # A lone trailing (or leading) fence: just drop the markers
+    return text.replace("```", "").strip()
+
+
+def trim_to_json(text):
+    """From the first { or [ to the value's end, ignoring surrounding prose."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None, None
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return start, end
+
+
+def fix_german_quotes(text):
+    return GERMAN_QUOTE_PATTERN.sub(r"<<\1>>", text)
+
+
+def try_trimmed(text):
+    start, end = trim_to_json(text)
+    if start is None:
+        return None
+    if end > start:
+        try:
+            return (loads(text[start:end + 1]),)
+        except ValueError:
+            pass
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        return (value,)
+    except ValueError:
+        return None
+
+
+def try_partial(text):
+    if jiter is None:
+        return None
+    start, _ = trim_to_json(text)
+    if start is None or text[start] != "[":
+        return None
+    try:
+        value = jiter.from_json(text[start:].encode("utf-8"), partial_mode="trailing-strings")
+    except ValueError:
+        return None
+    if not isinstance(value, list) or len(value) < 2:
+        return None
+    return (value[:-1],)
+
+
+def extract_json(text, allow_partial=False):
+    """
+    Parse a model response. Returns (value, method) with method one of
+    METHODS; raises ExtractError if nothing usable is found.
+    """
+    text = text.strip()
+    try:
+        return loads(text), "direct"
+    except ValueError:
+        pass
+
+    body = strip_fences(text)
+    if body != text:
+        try:
+            return loads(body), "fenced"
+        except ValueError:
+            pass
+
+    found = try_trimmed(body)
+    if found:
+        return found[0], "trimmed"
+
+    quoted = fix_german_quotes(body)
+    if quoted != body:
+        found = try_trimmed(quoted)
+        if found:
+            return found[0], "quotes"
+
+    if allow_partial:
+        found = try_partial(quoted)
+        if found:
+            return found[0], "partial"
+
+    raise ExtractError(f"no JSON value found in {len(text)} characters of response")
@@ -0,0 +1,101 @@
+import json
+import re
+import sqlite3
+import hashlib
+import unicodedata
+from pathlib import Path
+from datetime import datetime
+
+# ============================================================
+# Content-addressed cache of parsed entries
+# ============================================================
+#
+# Keyed by sha256 of (normalised entry text, prompt version, model), so
+# the same entry parsed with the same prompt and model is only ever paid
+# for once. Changing the prompt text or the model changes every key.
+
+CACHE_FILE = Path("data_reload/parse_cache.sqlite")
+
+# SQLite's default limit on host parameters is 999; stay well below it
+LOOKUP_CHUNK = 500
+
+
+def normalise_entry_text(text):
+    """
+    NFC-normalise and collapse whitespace; case and punctuation are kept.
+    Entries differing only in spacing share a key (see with_original_entry).
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def prompt_version(prompt_text):
+    """Short, stable fingerprint of a prompt's exact text."""
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(text, version, model):
+    raw = "\x1f".join([normalise_entry_text(text), version, model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def open_cache(path=CACHE_FILE):
+    """Open (and create if needed) the cache database."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS parse_cache (
+            key TEXT PRIMARY KEY,
+            prompt_version TEXT NOT NULL,
+            model TEXT NOT NULL,
+            parsed_entry TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+def get_many(conn, keys):
+    """Return {key: parsed_entry} for every key that is cached."""
+    keys = list(dict.fromkeys(keys))
+    found = {}
+    for i in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[i:i + LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT key, parsed_entry FROM parse_cache WHERE key IN ({placeholders})",
+            chunk,
+        )
+        for key, parsed_entry in rows:
+            found[key] = json.loads(parsed_entry)
+    return found
+
+
+def with_original_entry(parsed_entry, text):
+    """
+    A cached parse served for `text`. The key ignores whitespace, so
+    the cached original_entry may be another entry's spacing; the
+    current input text replaces it.
+    """
+    administrative = parsed_entry.get("administrative")
+    if isinstance(administrative, dict):
+        parsed_entry["administrative"] = {**administrative, "original_entry": text}
+    return parsed_entry
+
+
+def put_many(conn, rows, version, model):
+    """
+    Store (key, parsed_entry) pairs. Later parses of the same key
+    replace earlier ones.
+    """
+    created_at = datetime.now().isoformat(timespec="seconds")
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, version, model, json.dumps(parsed_entry, ensure_ascii=False), created_at)
+                for key, parsed_entry in rows
+            ],
+        )
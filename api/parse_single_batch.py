@@ -1,27 +1,37 @@
 import anthropic
+import asyncio
 from dotenv import load_dotenv
+import re
 import json
 from pathlib import Path
 from pprint import pp
+from parse_cache import open_cache, get_many, cache_key, prompt_version
+from rak_preparser import preparse_batch
 
 # load function to get environment variables
 load_dotenv()
 
 # create connection to connect to API
 client = anthropic.Anthropic()
+async_client = anthropic.AsyncAnthropic()
 
-def submit_batch(batch_path):
+MODEL = "claude-sonnet-4-6"
 
-    # Read the sample entries file
-    with open(batch_path, "r", encoding="utf-8") as f:
-        batch_data = json.load(f)
+# Packed mode: several entries share one request (and one copy of the
+# system prompt). Output budget scales with the number of entries.
+PACKED_MAX_TOKENS_PER_ENTRY = 1500
+PACKED_MAX_TOKENS_LIMIT = 64000
+PACK_ID_PREFIX = "pack_"
 
-    print(f"Loaded {len(batch_data)} entries")
-    print("First entry text:", batch_data[0]["text"])
-    print("First entry composite_id:", batch_data[0]["composite_id"])
+# Entries that come back errored, expired, canceled, undecodable or not
+# at all are written to <stem>_retry<N>.json and submitted again, one
+# request per entry, at most MAX_RETRY_ATTEMPTS times.
+RETRY_SUFFIX = "_retry"
+MAX_RETRY_ATTEMPTS = 2
+RETRY_STEM_PATTERN = re.compile(rf"^(?P<base>.+?){RETRY_SUFFIX}(?P<attempt>\d+)$")
 
-    # Create prompt message
-    system_prompt = """
+# Create prompt message
+SYSTEM_PROMPT = """
         You are a specialized bibliography parsing assistant. Your task is to convert German bibliographic entries into a single structured JSON object.
 
         CRITICAL OUTPUT REQUIREMENTS:
@@ -254,19 +264,35 @@ def submit_batch(batch_path):
     """
 
 
-    # Build requests array for batch API
+PROMPT_VERSION = prompt_version(SYSTEM_PROMPT)
+
+
+PACKED_PROMPT = """
+        PACKED MODE — this overrides the single-object output requirement above:
+        - The user message contains several entries, each introduced by COMPOSITE_ID, TOPIC and ENTRY lines
+        - Parse every entry independently, following all rules above
+        - Return ONLY a JSON array with exactly one object per entry, in input order:
+          [{"composite_id": "string (copied exactly from the input)", "parsed_entry": {schema above}}]
+        - Never merge, skip or reorder entries, and never let one entry's data leak into another
+
+        CRITICAL: Return ONLY the JSON array. No explanations, no markdown blocks, no additional text.
+    """
+
+
+def build_requests(batch_data):
+    """Build one Batches API request per entry of a loaded batch file."""
     requests = []
     for entry in batch_data:
         request = {
             "custom_id": entry["composite_id"],
             "params": {
-                "model": "claude-sonnet-4-6",
+                "model": MODEL,
                 "max_tokens": 8000,
                 "temperature": 0,
                 "system": [
                     {
                         "type": "text",
-                        "text": system_prompt,
+                        "text": SYSTEM_PROMPT,
                         "cache_control": {"type": "ephemeral"}
                     }
                         ],
@@ -286,6 +312,174 @@ def submit_batch(batch_path):
         }
         requests.append(request)
 
+    return requests
+
+
+def pack_custom_id(pack_index):
+    return f"{PACK_ID_PREFIX}{pack_index:04d}"
+
+
+def pack_members(batch_data, pack_size):
+    """{pack custom_id: [composite_id, ...]}, the packs build_packed_requests makes."""
+    return {
+        pack_custom_id(pack_index): [entry["composite_id"] for entry in batch_data[start:start + pack_size]]
+        for pack_index, start in enumerate(range(0, len(batch_data), pack_size), start=1)
+    }
+
+
+def requests_packs(batch_data, pack_size=None):
+    """Pack membership for the submission record (None when unpacked)."""
+    if pack_size and pack_size > 1:
+        return pack_members(batch_data, pack_size)
+    return None
+
+
+def build_packed_requests(batch_data, pack_size):
+    """
+    Build requests holding up to pack_size entries each. The model answers
+    with a JSON array keyed by composite_id, which check_status splits
+    back into one result per entry.
+    """
+    requests = []
+    for pack_index, start in enumerate(range(0, len(batch_data), pack_size), start=1):
+        pack = batch_data[start:start + pack_size]
+        entries_text = "\n\n".join(
+            f"COMPOSITE_ID: {entry['composite_id']}\nTOPIC: {entry['topic']}\nENTRY: {entry['text']}"
+            for entry in pack
+        )
+        request = {
+            "custom_id": pack_custom_id(pack_index),
+            "params": {
+                "model": MODEL,
+                "max_tokens": min(PACKED_MAX_TOKENS_PER_ENTRY * len(pack), PACKED_MAX_TOKENS_LIMIT),
+                "temperature": 0,
+                "system": [
+                    {"type": "text", "text": SYSTEM_PROMPT},
+                    {
+                        "type": "text",
+                        "text": PACKED_PROMPT,
+                        "cache_control": {"type": "ephemeral"}
+                    }
+                ],
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": f"CRITICAL: PARSE TO JSON ARRAY ONLY. No explanations, no markdown blocks.\n\n{entries_text}"
+                    }
+                ]
+            }
+        }
+        requests.append(request)
+
+    return requests
+
+
+def retry_attempt(batch_path):
+    """0 for an original batch file, N for <stem>_retry<N>.json."""
+    match = RETRY_STEM_PATTERN.match(Path(batch_path).stem)
+    return int(match.group("attempt")) if match else 0
+
+
+def retry_path_for(batch_path):
+    """Next retry file for a batch: x.json -> x_retry1.json -> x_retry2.json."""
+    batch_path = Path(batch_path)
+    match = RETRY_STEM_PATTERN.match(batch_path.stem)
+    base = match.group("base") if match else batch_path.stem
+    return batch_path.with_name(f"{base}{RETRY_SUFFIX}{retry_attempt(batch_path) + 1}.json")
+
+
+def entry_cache_key(entry):
+    return cache_key(entry["text"], PROMPT_VERSION, MODEL)
+
+
+def drop_cached_entries(batch_data):
+    """
+    Split off entries that already have a cached parse for this prompt
+    and model. Returns (entries still to submit, number of cache hits);
+    check_status fills the hits back in when the batch is retrieved.
+    """
+    keys = [entry_cache_key(entry) for entry in batch_data]
+    conn = open_cache()
+    try:
+        cached = get_many(conn, keys)
+    finally:
+        conn.close()
+
+    to_submit = [entry for entry, key in zip(batch_data, keys) if key not in cached]
+    return to_submit, len(batch_data) - len(to_submit)
+
+
+def drop_preparsed_entries(batch_data, threshold):
+    """
+    Split off entries the local RAK pre-parser handles at or above
+    `threshold`. Returns (entries still to submit, number preparsed);
+    check_status re-runs the pre-parser when the batch is retrieved.
+    """
+    preparsed, remaining = preparse_batch(batch_data, threshold)
+    return remaining, len(preparsed)
+
+
+def drop_local_entries(batch_data, use_cache=True, preparse_threshold=None):
+    """
+    Cache hits first (they are real API parses), then the pre-parser.
+    Returns (entries still to submit, cached_count, preparsed_count).
+    """
+    cached_count = 0
+    preparsed_count = 0
+    if use_cache:
+        batch_data, cached_count = drop_cached_entries(batch_data)
+    if preparse_threshold is not None and batch_data:
+        batch_data, preparsed_count = drop_preparsed_entries(batch_data, preparse_threshold)
+    return batch_data, cached_count, preparsed_count
+
+
+def local_only_result(batch_path, entry_count, cached_count, preparsed_count):
+    """Submission record for a file whose entries are all handled locally."""
+    return {
+        "batch_id": None,
+        "status": "local" if preparsed_count else "cached",
+        "file_path": str(batch_path),
+        "entry_count": entry_count,
+        "cached_count": cached_count,
+        "preparsed_count": preparsed_count,
+        "pack_size": None
+    }
+
+
+def requests_for(batch_data, pack_size=None):
+    if pack_size and pack_size > 1:
+        return build_packed_requests(batch_data, pack_size)
+    return build_requests(batch_data)
+
+
+def submit_batch(batch_path, pack_size=None, use_cache=True, preparse_threshold=None):
+
+    # Read the sample entries file
+    with open(batch_path, "r", encoding="utf-8") as f:
+        batch_data = json.load(f)
+
+    print(f"Loaded {len(batch_data)} entries")
+
+    # Skip entries that were already parsed with this prompt and model,
+    # and (optionally) plain entries the local pre-parser can handle
+    entry_count = len(batch_data)
+    batch_data, cached_count, preparsed_count = drop_local_entries(
+        batch_data, use_cache, preparse_threshold
+    )
+    if use_cache:
+        print(f"Cache hits: {cached_count}")
+    if preparse_threshold is not None:
+        print(f"Preparsed locally: {preparsed_count}")
+    if not batch_data:
+        print("All entries handled locally — nothing to submit")
+        return local_only_result(batch_path, entry_count, cached_count, preparsed_count)
+
+    print("First entry text:", batch_data[0]["text"])
+    print("First entry composite_id:", batch_data[0]["composite_id"])
+
+    # Build requests array for batch API
+    requests = requests_for(batch_data, pack_size)
+
     print(f"Built {len(requests)} requests")
     print("First request custom_id:", requests[0]["custom_id"])
     # print("First request content preview:", requests[0]["params"]["messages"][0]["content"][:200])
@@ -299,5 +493,40 @@ def submit_batch(batch_path):
         "batch_id": message_batch.id,
         "status": "submitted",
         "file_path": str(batch_path),
-        "entry_count": len(batch_data)
+        "entry_count": entry_count,
+        "cached_count": cached_count,
+        "preparsed_count": preparsed_count,
+        "pack_size": pack_size,
+        "packs": requests_packs(batch_data, pack_size),
+    }
+
+
+async def submit_batch_async(batch_path, pack_size=None, use_cache=True, preparse_threshold=None):
+    """
+    Async version of submit_batch for the concurrent submission mode.
+    Builds the same requests; only the network call is awaited.
+    """
+    with open(batch_path, "r", encoding="utf-8") as f:
+        batch_data = json.load(f)
+
+    entry_count = len(batch_data)
+    # Cache lookups and the pre-parser are local work; keep them off the event loop
+    batch_data, cached_count, preparsed_count = await asyncio.to_thread(
+        drop_local_entries, batch_data, use_cache, preparse_threshold
+    )
+    if not batch_data:
+        return local_only_result(batch_path, entry_count, cached_count, preparsed_count)
+
+    requests = requests_for(batch_data, pack_size)
+    message_batch = await async_client.messages.batches.create(requests=requests)
+
+    return {
+        "batch_id": message_batch.id,
+        "status": "submitted",
+        "file_path": str(batch_path),
+        "entry_count": entry_count,
+        "cached_count": cached_count,
+        "preparsed_count": preparsed_count,
+        "pack_size": pack_size,
+        "packs": requests_packs(batch_data, pack_size),
     }
@@ -4,6 +4,9 @@ import json
 from pathlib import Path
 from datetime import datetime
 import sys
+import time
+from batch_journal import BatchJournal
+from pipeline_metrics import init_metrics, count_entries, record_duration
 
 # Load environment variables
 load_dotenv()
@@ -398,16 +401,16 @@ def main():
 
     print(f"Found {len(batch_files)} batch files to process")
 
-    # Load existing tracking data if it exists
-    if tracking_file.exists():
-        with open(tracking_file, "r") as f:
-            tracking_data = json.load(f)
-        print(f"Loaded existing tracking data with {len(tracking_data)} batches")
-    else:
-        tracking_data = []
+    init_metrics()
+    started = time.perf_counter()
+
+    # Load existing tracking data (snapshot + journal) if it exists
+    tracking = BatchJournal(tracking_file, layout="tracking")
+    if tracking.records:
+        print(f"Loaded existing tracking data with {len(tracking.records)} batches")
 
-    # Get already submitted batch IDs
-    submitted_files = {batch["file_path"] for batch in tracking_data}
+    # Get already submitted batch files
+    submitted_files = set(tracking.records)
 
     # Process each batch
     for batch_file in batch_files:
@@ -417,21 +420,21 @@ def main():
 
         print(f"\nProcessing {batch_file.name}...")
         result = submit_func(batch_file)
+        count_entries(pass_type, "submitted", result["entry_count"])
 
         # Add timestamp
         result["submitted_at"] = datetime.now().isoformat()
 
-        # Add to tracking
-        tracking_data.append(result)
-
-        # Save tracking file after each submission
-        with open(tracking_file, "w") as f:
-            json.dump(tracking_data, f, ensure_ascii=False, indent=2)
+        # Add to tracking (appended to the journal after each submission)
+        tracking.put(result["file_path"], result)
 
         print(f"Added {batch_file.name} to tracking file")
 
+    tracking.close()
+    record_duration(f"{pass_type}_submit", time.perf_counter() - started)
+
     print(f"\n✓ All batches submitted! Tracking saved to {tracking_file}")
-    print(f"Total batches tracked: {len(tracking_data)}")
+    print(f"Total batches tracked: {len(tracking.records)}")
 
 
 if __name__ == "__main__":
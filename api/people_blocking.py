@@ -0,0 +1,322 @@
+import re
+from collections import defaultdict
+from itertools import combinations
+
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+
+import unified_id
+from unified_id import fold
+
+# ============================================================
+# Candidate blocking and local resolution for pass 2 dedup
+# ============================================================
+#
+# Pass 2 used to send every exact-surname group to the model, so
+# "Dostojewski" and "Dostojewsky" never met while large groups of
+# unrelated "Müller"s produced thousands of pointless comparisons.
+#
+# Here people are put in blocks by three keys:
+#   p:  Kölner Phonetik code of the surname + first given initial
+#   f:  diacritic-folded surname
+#   i:  first three folded surname letters + all given initials
+# Only pairs that share a block are compared. Surnames are scored in
+# bulk with rapidfuzz (cpdist, all cores); given names are compared
+# token by token, initials against full names.
+#
+# Each pair is a match, a non-match or ambiguous. Matches are merged
+# with union-find. Clusters touched by an ambiguous pair (or holding a
+# conflicting pair) go to the Batches API; everything else is resolved
+# here and written in the pass 2 result format.
+
+# Blocks larger than this are skipped for that key (the other keys
+# still apply); a huge block is a key that carries no information
+MAX_BLOCK_SIZE = 200
+
+# Surname similarity (rapidfuzz ratio, 0-100)
+SURNAME_MATCH = 85      # with the same phonetic code
+SURNAME_AMBIGUOUS = 80  # below this, never the same person
+
+# Given-name tokens that are not initials must be this similar
+GIVEN_TOKEN_MATCH = 85
+
+# ---------- Kölner Phonetik ----------
+
+def koelner_phonetik(word):
+    """Kölner Phonetik code of a single word (letters only, folded)."""
+    letters = [c for c in fold(word).upper() if "A" <= c <= "Z"]
+    codes = []
+    for i, c in enumerate(letters):
+        prev = letters[i - 1] if i else ""
+        nxt = letters[i + 1] if i + 1 < len(letters) else ""
+        if c in "AEIJOUY":
+            code = "0"
+        elif c == "H":
+            code = ""
+        elif c == "B":
+            code = "1"
+        elif c == "P":
+            code = "3" if nxt == "H" else "1"
+        elif c in "DT":
+            code = "8" if nxt in ("C", "S", "Z") else "2"
+        elif c in "FVW":
+            code = "3"
+        elif c in "GKQ":
+            code = "4"
+        elif c == "C":
+            if i == 0:
+                code = "4" if nxt in "AHKLOQRUX" and nxt else "8"
+            else:
+                code = "4" if nxt in "AHKOQUX" and nxt and prev not in ("S", "Z") else "8"
+        elif c == "X":
+            code = "8" if prev in ("C", "K", "Q") and prev else "48"
+        elif c == "L":
+            code = "5"
+        elif c in "MN":
+            code = "6"
+        elif c == "R":
+            code = "7"
+        else:  # S, Z
+            code = "8"
+        codes.append(code)
+
+    collapsed = []
+    for code in "".join(codes):
+        if not collapsed or collapsed[-1] != code:
+            collapsed.append(code)
+    if not collapsed:
+        return ""
+    return collapsed[0] + "".join(c for c in collapsed[1:] if c != "0")
+
+
+# ---------- name parts ----------
+
+def surname_of(entry):
+    """family_name, else the part before the comma, else the last word."""
+    family_name = entry.get("family_name")
+    if family_name and family_name != "null":
+        return family_name
+    display_name = entry.get("display_name") or entry.get("single_name") or ""
+    if "," in display_name:
+        return display_name.split(",")[0].strip()
+    words = display_name.split()
+    return words[-1] if words else ""
+
+
+def given_tokens(entry):
+    """Folded given-name tokens; a token ending in '.' or one letter long is an initial."""
+    given = entry.get("given_names")
+    if not given or given == "null":
+        display_name = entry.get("display_name") or ""
+        given = display_name.split(",", 1)[1] if "," in display_name else ""
+    tokens = []
+    for raw in re.split(r"[\s\-]+", given.strip()):
+        word = fold(raw).strip(".")
+        if word:
+            tokens.append((word, raw.endswith(".") or len(word) == 1))
+    return tokens
+
+
+def person_keys(surname, tokens):
+    folded = re.sub(r"[^a-z]", "", fold(surname))
+    if not folded:
+        return []
+    initials = "".join(word[0] for word, _ in tokens)
+    keys = [f"f:{folded}", f"p:{koelner_phonetik(folded)}:{initials[:1]}"]
+    if initials:
+        keys.append(f"i:{folded[:3]}:{initials}")
+    return keys
+
+
+def given_compatibility(a, b):
+    """
+    'compatible', 'conflict' or 'unknown' for two given-name token lists.
+    Initials only need to agree on the first letter; written-out
+    names must be close. Extra tokens on one side are allowed.
+    """
+    if not a or not b:
+        return "unknown"
+    for (word_a, initial_a), (word_b, initial_b) in zip(a, b):
+        if initial_a or initial_b:
+            if not (word_a.startswith(word_b) or word_b.startswith(word_a)):
+                return "conflict"
+        elif fuzz.ratio(word_a, word_b) < GIVEN_TOKEN_MATCH:
+            return "conflict"
+    return "compatible"
+
+
+# ---------- union-find ----------
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def groups(self):
+        groups = defaultdict(list)
+        for x in range(len(self.parent)):
+            groups[self.find(x)].append(x)
+        return list(groups.values())
+
+
+# ---------- blocking + scoring ----------
+
+def candidate_pairs(keys_per_entry):
+    """All index pairs sharing at least one block (oversized blocks skipped)."""
+    blocks = defaultdict(list)
+    for idx, keys in enumerate(keys_per_entry):
+        for key in keys:
+            blocks[key].append(idx)
+
+    pairs = set()
+    skipped = 0
+    for members in blocks.values():
+        if len(members) > MAX_BLOCK_SIZE:
+            skipped += 1
+            continue
+        pairs.update(combinations(members, 2))
+    return sorted(pairs), skipped
+
+
+def classify_pairs(pairs, folded_surnames, phonetic, tokens):
+    """Return {pair: 'match' | 'ambiguous' | 'conflict'}; clear non-matches are left out."""
+    if not pairs:
+        return {}
+    left = [folded_surnames[a] for a, _ in pairs]
+    right = [folded_surnames[b] for _, b in pairs]
+    scores = cpdist(left, right, scorer=fuzz.ratio, workers=-1)
+
+    decisions = {}
+    for (a, b), score in zip(pairs, scores):
+        if score < SURNAME_AMBIGUOUS:
+            continue
+        given = given_compatibility(tokens[a], tokens[b])
+        if given == "conflict":
+            decisions[(a, b)] = "conflict"
+        elif given == "compatible" and (
+            folded_surnames[a] == folded_surnames[b]
+            or (phonetic[a] == phonetic[b] and score >= SURNAME_MATCH)
+        ):
+            decisions[(a, b)] = "match"
+        else:
+            decisions[(a, b)] = "ambiguous"
+    return decisions
+
+
+def resolve(entries):
+    """
+    Block, score and cluster people entries.
+
+    Returns:
+        local: list of clusters (lists of entries) resolved here
+        ambiguous: list of clusters (lists of entries) for the API
+        stats: counts for the console and the prep log
+    """
+    surnames = [surname_of(entry) for entry in entries]
+    tokens = [given_tokens(entry) for entry in entries]
+    folded_surnames = [re.sub(r"[^a-z]", "", fold(s)) for s in surnames]
+    phonetic = [koelner_phonetik(s) for s in folded_surnames]
+    keys_per_entry = [person_keys(s, t) for s, t in zip(surnames, tokens)]
+
+    pairs, skipped_blocks = candidate_pairs(keys_per_entry)
+    decisions = classify_pairs(pairs, folded_surnames, phonetic, tokens)
+
+    clusters = UnionFind(len(entries))
+    for (a, b), decision in decisions.items():
+        if decision == "match":
+            clusters.union(a, b)
+
+    # Clusters joined by an ambiguous pair are decided together by the API;
+    # a cluster holding a conflicting pair (Th. ~ Theodor, Th. ~ Thomas) too
+    review = UnionFind(len(entries))
+    flagged = set()
+    for (a, b), decision in decisions.items():
+        root_a, root_b = clusters.find(a), clusters.find(b)
+        if decision == "ambiguous":
+            review.union(root_a, root_b)
+            flagged.update((root_a, root_b))
+        elif decision == "conflict" and root_a == root_b:
+            flagged.add(root_a)
+    for a in range(len(entries)):
+        review.union(a, clusters.find(a))
+
+    local, ambiguous = [], []
+    for members in review.groups():
+        if any(clusters.find(m) in flagged for m in members):
+            ambiguous.append([entries[m] for m in members])
+        else:
+            by_cluster = defaultdict(list)
+            for m in members:
+                by_cluster[clusters.find(m)].append(entries[m])
+            local.extend(by_cluster.values())
+
+    surname_groups = defaultdict(int)
+    for s in folded_surnames:
+        surname_groups[s] += 1
+    counts = defaultdict(int)
+    for decision in decisions.values():
+        counts[decision] += 1
+
+    stats = {
+        "entries": len(entries),
+        "candidate_pairs": len(pairs),
+        "surname_group_pairs": sum(n * (n - 1) // 2 for n in surname_groups.values()),
+        "skipped_blocks": skipped_blocks,
+        "matches": counts["match"],
+        "ambiguous_pairs": counts["ambiguous"],
+        "conflicts": counts["conflict"],
+        "local_clusters": len(local),
+        "local_entries": sum(len(c) for c in local),
+        "ambiguous_clusters": len(ambiguous),
+        "ambiguous_entries": sum(len(c) for c in ambiguous),
+    }
+    return local, ambiguous, stats
+
+
+# ---------- local results ----------
+
+def id_fields(entry):
+    """Name fields for unified_id.generate, filled from display_name where missing."""
+    given = entry.get("given_names")
+    if not given or given == "null":
+        display_name = entry.get("display_name") or ""
+        given = display_name.split(",", 1)[1].strip() if "," in display_name else None
+    return {
+        "family_name": surname_of(entry) if not entry.get("is_organisation") else None,
+        "given_names": given,
+        "single_name": entry.get("single_name") or entry.get("display_name"),
+        "is_organisation": entry.get("is_organisation", False),
+    }
+
+
+def representative(cluster):
+    """The most complete spelling in a cluster names it."""
+    return max(cluster, key=lambda e: (len(given_tokens(e)), sum(not i for _, i in given_tokens(e)),
+                                       len(e.get("display_name") or "")))
+
+
+def local_results(clusters):
+    """Pass 2 output records (unified_id + variants) for locally resolved clusters."""
+    # A different person with the same id gets a numbered suffix
+    ids = unified_id.assign_unique([id_fields(representative(cluster)) for cluster in clusters])
+    results = []
+    for cluster, cluster_id in zip(clusters, ids):
+        names = list(dict.fromkeys(e.get("display_name") for e in cluster if e.get("display_name")))
+        for entry in cluster:
+            results.append({
+                **entry,
+                "unified_id": cluster_id,
+                "variants": [n for n in names if n != entry.get("display_name")],
+                "_source_custom_id": "local_blocking",
+            })
+    return results
@@ -0,0 +1,187 @@
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+from parse_cache import open_cache, get_many, put_many, cache_key
+from people_clean_processor import CLEAN_MODEL, CLEAN_PROMPT_VERSION
+
+# ============================================================
+# Operation A: one request per distinct name
+# ============================================================
+#
+# Many people rows carry the same name (family_name, given_names,
+# name_particles, single_name, is_organisation) once whitespace and
+# Unicode form are normalised, and every run used to clean each of them
+# again. people_clean_prep now:
+#   - groups people by that normalised name
+#   - answers groups whose name is in the cache locally
+#     (clean_results/results_clean_local.json)
+#   - submits one representative per remaining group and records the
+#     rest of the group in clean_fanout.json
+# After check_people_status.py clean, run this script: it copies each
+# representative's cleaned name to the rest of its group
+# (clean_results/results_clean_fanout.json) and stores it in the cache
+# for later runs.
+#
+# The cache reuses parse_cache's table in its own file, keyed by the
+# normalised name, the clean prompt's fingerprint and the model, so a
+# prompt change starts it afresh.
+
+project_root = Path(__file__).parent.parent
+
+CACHE_FILE = project_root / "data/people/clean_cache.sqlite"
+fanout_file = project_root / "database/in_progress/clean_fanout.json"
+clean_results_dir = project_root / "database/in_progress/clean_results"
+local_results_file = clean_results_dir / "results_clean_local.json"
+fanout_results_file = clean_results_dir / "results_clean_fanout.json"
+people_file = project_root / "data/from db/people.json"
+
+# What the model sees of a name; everything else in the row is ignored
+NAME_FIELDS = ["family_name", "given_names", "name_particles", "single_name", "is_organisation"]
+
+# What a clean result says about a name (person_id and unified_id are per row)
+CLEANED_FIELDS = [
+    "family_name", "given_names", "name_prefix", "name_particles",
+    "name_suffix", "single_name", "is_organisation",
+]
+
+LOCAL_SOURCE = "local_cache"
+FANOUT_SOURCE = "fanout"
+
+
+def normalise(value):
+    """NFC, whitespace collapsed; empty strings and "null" count as missing."""
+    if not isinstance(value, str):
+        return value
+    value = re.sub(r"\s+", " ", unicodedata.normalize("NFC", value)).strip()
+    return value if value and value != "null" else None
+
+
+def name_key(person):
+    return tuple(
+        bool(person.get(field)) if field == "is_organisation" else normalise(person.get(field))
+        for field in NAME_FIELDS
+    )
+
+
+def name_cache_key(key):
+    return cache_key(json.dumps(key, ensure_ascii=False), CLEAN_PROMPT_VERSION, CLEAN_MODEL)
+
+
+def group_by_name(people):
+    """{name_key: [people]}, groups and members in input order."""
+    groups = {}
+    for person in people:
+        groups.setdefault(name_key(person), []).append(person)
+    return groups
+
+
+def cleaned_fields(result):
+    """The name part of one clean result, or None for an error or incomplete result."""
+    if result.get("_error") or any(field not in result for field in CLEANED_FIELDS):
+        return None
+    return {field: result[field] for field in CLEANED_FIELDS + ["change_notes"] if field in result}
+
+
+def fan_out(person, cleaned, source):
+    """
+    A clean result for `person` built from another row's cleaned name.
+    changes_made is worked out against this row's own input, whose
+    spacing may differ from the row that was sent.
+    """
+    changes_made = any(person.get(field) != cleaned.get(field) for field in CLEANED_FIELDS)
+    change_notes = cleaned.get("change_notes") if changes_made else None
+    if changes_made and not change_notes:
+        change_notes = "Whitespace normalised"
+    return {
+        "person_id": person["person_id"],
+        "unified_id": person.get("unified_id"),
+        **{field: cleaned.get(field) for field in CLEANED_FIELDS},
+        "changes_made": changes_made,
+        "change_notes": change_notes,
+        "_source_custom_id": source,
+    }
+
+
+def cached_cleanings(keys, cache_file=CACHE_FILE):
+    """{name_key: cleaned fields} for every name already in the cache."""
+    by_cache_key = {name_cache_key(key): key for key in keys}
+    conn = open_cache(cache_file)
+    try:
+        found = get_many(conn, list(by_cache_key))
+    finally:
+        conn.close()
+    return {by_cache_key[k]: cleaned for k, cleaned in found.items()}
+
+
+def store_cleanings(cleanings, cache_file=CACHE_FILE):
+    """Save {name_key: cleaned fields}; a later answer for a name replaces an earlier one."""
+    conn = open_cache(cache_file)
+    try:
+        put_many(
+            conn,
+            [(name_cache_key(key), cleaned) for key, cleaned in cleanings.items()],
+            CLEAN_PROMPT_VERSION,
+            CLEAN_MODEL,
+        )
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Fan-out after retrieval
+# ============================================================
+
+def main():
+    if not fanout_file.exists():
+        print(f"No fan-out map at {fanout_file}; run people_clean_prep.py first")
+        return
+
+    with open(fanout_file, "r", encoding="utf-8") as f:
+        fanout = json.load(f)
+    with open(people_file, "r", encoding="utf-8") as f:
+        people_by_id = {str(person["person_id"]): person for person in json.load(f)}
+
+    skip = {local_results_file.name, fanout_results_file.name}
+    result_files = [rf for rf in sorted(clean_results_dir.glob("results_clean_*.json")) if rf.name not in skip]
+    print(f"Found {len(result_files)} result files, {len(fanout)} representatives in the fan-out map")
+
+    cleanings = {}
+    fanned = []
+    answered = set()
+    failed = 0
+    for rf in result_files:
+        with open(rf, "r", encoding="utf-8") as f:
+            results = json.load(f)
+        for result in results:
+            rep_id = str(result.get("_source_custom_id"))
+            rep = people_by_id.get(rep_id)
+            cleaned = cleaned_fields(result)
+            if rep is None:
+                continue
+            if cleaned is None:
+                failed += 1
+                continue
+            cleanings[name_key(rep)] = cleaned
+            answered.add(rep_id)
+            for person_id in fanout.get(rep_id, []):
+                fanned.append(fan_out(people_by_id[str(person_id)], cleaned, f"{FANOUT_SOURCE}:{rep_id}"))
+
+    store_cleanings(cleanings)
+
+    waiting = sum(len(ids) for rep_id, ids in fanout.items() if rep_id not in answered)
+
+    clean_results_dir.mkdir(parents=True, exist_ok=True)
+    with open(fanout_results_file, "w", encoding="utf-8") as f:
+        json.dump(fanned, f, ensure_ascii=False, indent=2)
+
+    print(f"\n=== DONE ===")
+    print(f"Cached:      {len(cleanings)} cleaned names ({failed} failed results skipped)")
+    print(f"Fanned out:  {len(fanned)} people")
+    print(f"Waiting:     {waiting} people whose representative has no usable result yet")
+    print(f"Saved to:    {fanout_results_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import sys
 import json
 from pathlib import Path
+import people_clean_dedup
 
 project_root = Path(__file__).parent.parent
 
@@ -10,6 +12,45 @@ log_file = project_root / "database/in_progress/clean_prep.log"
 BATCH_SIZE = 500
 
 
+def dedup_people(people):
+    """
+    One representative per distinct name; names already cleaned in an
+    earlier run are answered from the cache and saved as a clean result
+    file, the rest of each group goes to the fan-out map.
+
+    Returns:
+        tuple: (representatives left for the API, distinct names, cached names)
+    """
+    groups = people_clean_dedup.group_by_name(people)
+    cached = people_clean_dedup.cached_cleanings(groups)
+
+    local_results = []
+    representatives = []
+    fanout = {}
+    for key, group in groups.items():
+        if key in cached:
+            local_results.extend(
+                people_clean_dedup.fan_out(person, cached[key], people_clean_dedup.LOCAL_SOURCE)
+                for person in group
+            )
+            continue
+        representatives.append(group[0])
+        if len(group) > 1:
+            fanout[str(group[0]["person_id"])] = [person["person_id"] for person in group[1:]]
+
+    people_clean_dedup.clean_results_dir.mkdir(parents=True, exist_ok=True)
+    with open(people_clean_dedup.local_results_file, "w", encoding="utf-8") as f:
+        json.dump(local_results, f, ensure_ascii=False, indent=2)
+    with open(people_clean_dedup.fanout_file, "w", encoding="utf-8") as f:
+        json.dump(fanout, f, ensure_ascii=False, indent=2)
+
+    print(f"Distinct names: {len(groups)} ({len(cached)} cached -> {len(local_results)} people answered locally)")
+    print(f"Saved to {people_clean_dedup.local_results_file}")
+    print(f"Fan-out map: {len(fanout)} representatives for {sum(map(len, fanout.values()))} more people")
+    print(f"Saved to {people_clean_dedup.fanout_file}")
+    return representatives, len(groups), len(cached)
+
+
 def main():
     print(f"Loading people from {people_file}...")
     with open(people_file, "r", encoding="utf-8") as f:
@@ -17,9 +58,22 @@ def main():
 
     print(f"Loaded {len(people)} people")
 
+    to_submit = people
+    distinct_names = cached_names = None
+    if "--no-dedup" not in sys.argv:
+        to_submit, distinct_names, cached_names = dedup_people(people)
+    else:
+        # A fan-out map from an earlier run would copy results onto people sent anyway
+        people_clean_dedup.fanout_file.unlink(missing_ok=True)
+        people_clean_dedup.local_results_file.unlink(missing_ok=True)
+
+    if not to_submit:
+        print("No people left for the API. Exiting.")
+        return
+
     batch_output_dir.mkdir(parents=True, exist_ok=True)
 
-    batches = [people[i:i + BATCH_SIZE] for i in range(0, len(people), BATCH_SIZE)]
+    batches = [to_submit[i:i + BATCH_SIZE] for i in range(0, len(to_submit), BATCH_SIZE)]
 
     print(f"Created {len(batches)} batches of up to {BATCH_SIZE} entries")
 
@@ -31,6 +85,9 @@ def main():
 
     summary = {
         "total_people": len(people),
+        "distinct_names": distinct_names,
+        "cached_names": cached_names,
+        "requests": len(to_submit),
         "batches_created": len(batches),
         "batch_size": BATCH_SIZE,
         "output_directory": str(batch_output_dir)
@@ -42,7 +99,9 @@ def main():
     print(f"\nSummary saved to {log_file}")
     print(f"Batches ready for Operation A (clean existing people)!")
     print(f"  Total batches: {len(batches)}")
-    print(f"  Total requests: {len(people)}")
+    print(f"  Total requests: {len(to_submit)} (for {len(people)} people)")
+    if distinct_names is not None:
+        print(f"  Afterwards: python people_clean_dedup.py (fan results out to repeated names)")
 
 
 if __name__ == "__main__":
@@ -4,6 +4,10 @@ import json
 from pathlib import Path
 from datetime import datetime
 import sys
+import time
+from batch_journal import BatchJournal
+from parse_cache import prompt_version
+from pipeline_metrics import init_metrics, count_entries, record_duration
 
 load_dotenv()
 
@@ -11,6 +15,8 @@ client = anthropic.Anthropic()
 
 project_root = Path(__file__).parent.parent
 
+CLEAN_MODEL = "claude-sonnet-4-6"
+
 # ============================================================
 # SYSTEM PROMPT — Operation A: Clean existing people
 # ============================================================
@@ -71,6 +77,9 @@ OUTPUT SCHEMA (return exactly this structure):
 CRITICAL: Return ONLY the JSON object. No markdown blocks, no explanations.
 """
 
+# Cleaned names are cached per prompt text (people_clean_dedup)
+CLEAN_PROMPT_VERSION = prompt_version(CLEAN_SYSTEM_PROMPT)
+
 # ============================================================
 # SYSTEM PROMPT — Operation B: Nopes dedup + clean
 # ============================================================
@@ -164,7 +173,7 @@ def submit_clean_batch(batch_path):
         request = {
             "custom_id": str(person["person_id"]),
             "params": {
-                "model": "claude-sonnet-4-6",
+                "model": CLEAN_MODEL,
                 "max_tokens": 1000,
                 "temperature": 0,
                 "system": [
@@ -298,14 +307,14 @@ def main():
 
     print(f"Found {len(batch_files)} batch files")
 
-    if tracking_file.exists():
-        with open(tracking_file, "r") as f:
-            tracking_data = json.load(f)
-        print(f"Loaded existing tracking data ({len(tracking_data)} batches already submitted)")
-    else:
-        tracking_data = []
+    init_metrics()
+    started = time.perf_counter()
 
-    submitted_files = {batch["file_path"] for batch in tracking_data}
+    tracking = BatchJournal(tracking_file, layout="tracking")
+    if tracking.records:
+        print(f"Loaded existing tracking data ({len(tracking.records)} batches already submitted)")
+
+    submitted_files = set(tracking.records)
 
     for batch_file in batch_files:
         if str(batch_file) in submitted_files:
@@ -314,16 +323,17 @@ def main():
 
         print(f"\nProcessing {batch_file.name}...")
         result = submit_func(batch_file)
+        count_entries(pass_type, "submitted", result["entry_count"])
         result["submitted_at"] = datetime.now().isoformat()
 
-        tracking_data.append(result)
-
-        with open(tracking_file, "w") as f:
-            json.dump(tracking_data, f, ensure_ascii=False, indent=2)
+        tracking.put(result["file_path"], result)
 
         print(f"Added to tracking file")
 
-    print(f"\nDone! Total batches tracked: {len(tracking_data)}")
+    tracking.close()
+    record_duration(f"{pass_type}_submit", time.perf_counter() - started)
+
+    print(f"\nDone! Total batches tracked: {len(tracking.records)}")
 
 
 if __name__ == "__main__":
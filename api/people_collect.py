@@ -0,0 +1,81 @@
+import sys
+import json
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.constants import VALIDATED_DIR
+
+# ============================================================
+# Validated book parses -> people entries for pass 1
+# ============================================================
+#
+# One entry per (composite_id, display_name), in the shape
+# people_pass1_batches reads from collect_people.json. A person named in
+# several roles of one book (author and translator) is one entry with
+# both flags set; sort_order follows first appearance.
+# "Surname, Given" is split at the first comma; anything else goes to
+# single_name with family_name/given_names null, which is what pass 1
+# looks for in multi-person entries ("Klaus Berger und Christiane Nord").
+# book_id is assigned when the books are loaded, so it is null here.
+
+people_file = Path("database/in_progress/collect_people.json")
+
+ROLES = [("authors", "is_author"), ("editors", "is_editor"), ("contributors", "is_contributor"), ("translator", "is_translator")]
+ROLE_FLAGS = [flag for _, flag in ROLES]
+
+
+def name_fields(display_name):
+    if "," in display_name:
+        family, given = (part.strip() for part in display_name.split(",", 1))
+        if family and given:
+            return {"family_name": family, "given_names": given, "single_name": None}
+    return {"family_name": None, "given_names": None, "single_name": display_name}
+
+
+def people_of(record, source_filename):
+    """People entries for one parsed record (custom_id + parsed_entry)."""
+    parsed_entry = record.get("parsed_entry") or {}
+    entries = {}
+    for field, flag in ROLES:
+        people = parsed_entry.get(field) or []
+        for person in people if isinstance(people, list) else [people]:
+            display_name = ((person or {}).get("display_name") or "").strip()
+            if not display_name:
+                continue
+            entry = entries.get(display_name)
+            if entry is None:
+                entry = entries[display_name] = {
+                    "book_id": None,
+                    "composite_id": record.get("custom_id"),
+                    "source_filename": source_filename,
+                    "display_name": display_name,
+                    **name_fields(display_name),
+                    "name_particles": None,
+                    **{f: False for f in ROLE_FLAGS},
+                    "sort_order": len(entries) + 1,
+                }
+            entry[flag] = True
+    return list(entries.values())
+
+
+def collect(validated_dir=VALIDATED_DIR):
+    entries = []
+    for path in sorted(Path(validated_dir).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for record in json.load(f):
+                entries.extend(people_of(record, path.name))
+    return entries
+
+
+def main():
+    entries = collect()
+    people_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(people_file, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    print(f"Collected {len(entries)} people entries from {VALIDATED_DIR}")
+    print(f"Saved to {people_file}")
+
+
+if __name__ == "__main__":
+    main()
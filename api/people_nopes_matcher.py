@@ -0,0 +1,174 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+
+from people_blocking import given_tokens, given_compatibility
+from unified_id import fold
+
+# ============================================================
+# Local nopes -> existing people matching
+# ============================================================
+#
+# Nopes and existing people are blocked by folded surname (ä, ae and a
+# all fold to a; organisations and single names by their single_name).
+# Within each block one rapidfuzz cdist call (all cores) scores every
+# nopes entry against every existing person on the full folded name.
+#
+# Per nopes entry:
+#   accepted    best score >= AUTO_ACCEPT, given names and particles
+#               compatible, and no other person close behind -> matched
+#               here, never sent to the API
+#   borderline  someone scored >= BORDERLINE -> sent to the API with
+#               only those people as context
+#   new         nobody in reach -> sent to the API with no context, it
+#               still needs cleaning and a unified_id
+#
+# top_k_context trims whatever context a request would carry down to the
+# k people nearest to each of its nopes entries.
+
+AUTO_ACCEPT = 95
+BORDERLINE = 75
+
+# An accepted match must beat the runner-up (another unified_id) by this much
+RUNNER_UP_MARGIN = 10
+
+# Existing people kept in a request's context per nopes entry
+CONTEXT_TOP_K = 8
+
+
+def block_key(surname):
+    """Folded surname with umlaut spellings merged (Müller, Mueller, Muller -> mullr)."""
+    folded = re.sub(r"[^a-z]", "", fold(surname))
+    return re.sub(r"([aou])e", r"\1", folded)
+
+
+def person_key(person):
+    if person.get("is_organisation") or not person.get("family_name"):
+        return block_key(person.get("single_name") or person.get("single_norm") or "")
+    return block_key(person["family_name"])
+
+
+def full_name(person):
+    """Folded "given particles family" (or the single name) for scoring."""
+    if person.get("is_organisation") or not person.get("family_name"):
+        return fold(person.get("single_name") or person.get("single_norm") or "")
+    parts = [person.get("given_names"), person.get("name_particles"), person.get("family_name")]
+    return fold(" ".join(p for p in parts if p))
+
+
+def particles_match(a, b):
+    return fold(a.get("name_particles") or "").strip(". ") == fold(b.get("name_particles") or "").strip(". ")
+
+
+def decide(entry, scored):
+    """
+    'accepted', 'borderline' or 'new' for one nopes entry, given
+    [(score, person)] sorted best first.
+    """
+    candidates = [(score, person) for score, person in scored if score >= BORDERLINE]
+    if not candidates:
+        return "new"
+
+    best_score, best = candidates[0]
+    runner_up = next(
+        (score for score, person in candidates[1:] if person["unified_id"] != best["unified_id"]), 0
+    )
+    if (
+        best_score >= AUTO_ACCEPT
+        and best_score - runner_up >= RUNNER_UP_MARGIN
+        and particles_match(entry, best)
+        and (entry.get("is_organisation") or given_compatibility(given_tokens(entry), given_tokens(best)) == "compatible")
+    ):
+        return "accepted"
+    return "borderline"
+
+
+def match_nopes(nopes_entries, people):
+    """
+    Score nopes entries against existing people, block by block.
+
+    Returns:
+        accepted: [(entry, person, score)]
+        borderline: [(entry, [candidate people])]
+        new: [entry]
+    """
+    people_blocks = defaultdict(list)
+    for person in people:
+        people_blocks[person_key(person)].append(person)
+
+    nopes_blocks = defaultdict(list)
+    for entry in nopes_entries:
+        nopes_blocks[person_key(entry)].append(entry)
+
+    accepted, borderline, new = [], [], []
+    for key, block_entries in nopes_blocks.items():
+        block_people = people_blocks.get(key) if key else None
+        if not block_people:
+            new.extend(block_entries)
+            continue
+
+        scores = cdist(
+            [full_name(e) for e in block_entries],
+            [full_name(p) for p in block_people],
+            scorer=fuzz.token_sort_ratio,
+            workers=-1,
+        )
+        for entry, row in zip(block_entries, scores):
+            scored = sorted(zip(row.tolist(), block_people), key=lambda item: -item[0])
+            decision = decide(entry, scored)
+            if decision == "accepted":
+                accepted.append((entry, scored[0][1], scored[0][0]))
+            elif decision == "borderline":
+                borderline.append((entry, [person for score, person in scored if score >= BORDERLINE]))
+            else:
+                new.append(entry)
+
+    return accepted, borderline, new
+
+
+def top_k_context(entries, people, k=CONTEXT_TOP_K):
+    """
+    The k people nearest to each entry (ties included, union over
+    entries), in their original order. token_set_ratio scores "Hans
+    Müller" as close to "Hans Maria Müller" as to itself, so a fuller
+    name is never pruned in favour of a different person.
+    """
+    if len(people) <= k:
+        return list(people)
+    scores = cdist(
+        [full_name(e) for e in entries],
+        [full_name(p) for p in people],
+        scorer=fuzz.token_set_ratio,
+        workers=-1,
+    )
+    keep = set()
+    for row in scores:
+        # The k best, plus anyone in reach tied with the k-th: dropping one
+        # of several equally close people would be a coin toss
+        keep.update((-row).argsort(kind="stable")[:k].tolist())
+        cutoff = max(np.partition(row, -k)[-k], BORDERLINE)
+        keep.update(np.flatnonzero(row >= cutoff).tolist())
+    return [person for idx, person in enumerate(people) if idx in keep]
+
+
+def accepted_result(entry, person):
+    """A nopes result record for a local match, as the API would return it."""
+    return {
+        "display_norm": entry["display_norm"],
+        "composite_id": entry["composite_id"],
+        "family_name": entry.get("family_name"),
+        "given_names": entry.get("given_names"),
+        "name_prefix": None,
+        "name_particles": entry.get("name_particles"),
+        "name_suffix": None,
+        "single_name": entry.get("single_name"),
+        "is_organisation": entry.get("is_organisation", False),
+        "unified_id": None,
+        "match_found": True,
+        "matched_unified_id": person["unified_id"],
+        "matched_person_id": person["person_id"],
+        "_source_custom_id": "local_match",
+    }
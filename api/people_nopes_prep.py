@@ -1,16 +1,26 @@
+import sys
 import json
 import re
 from pathlib import Path
 from collections import defaultdict
+from token_sharder import json_tokens, output_budget, pack_shards, pack_shards_ffd, write_manifest, describe_shards
+import people_nopes_matcher
 
 project_root = Path(__file__).parent.parent
 
 nopes_file = project_root / "scripts/notebooks/nopes_fixed.json"
 people_file = project_root / "data/from db/people.json"
 batch_output_dir = project_root / "database/in_progress/nopes_batches"
+nopes_results_dir = project_root / "database/in_progress/nopes_results"
+local_results_file = nopes_results_dir / "results_nopes_local.json"
 log_file = project_root / "database/in_progress/nopes_prep.log"
 
-BATCH_SIZE = 30
+# Each nopes file is one request (max_tokens=12000 in submit_nopes_batch).
+# Output is one object per nopes entry: the pass-through fields plus the
+# cleaned name and match fields. Context people only cost input tokens.
+NOPES_MAX_TOKENS = 12000
+NOPES_ADDED_OUTPUT_TOKENS = 90
+NOPES_INPUT_BUDGET = 60000
 
 
 def normalize_surname(name):
@@ -21,23 +31,65 @@ def normalize_surname(name):
     return name.strip()
 
 
+def context_person(person):
+    return {
+        "person_id": person["person_id"],
+        "unified_id": person["unified_id"],
+        "family_name": person.get("family_name"),
+        "given_names": person.get("given_names"),
+        "name_particles": person.get("name_particles"),
+        "single_name": person.get("single_name"),
+        "is_organisation": person.get("is_organisation", False)
+    }
+
+
 def build_existing_lookup(people):
     lookup = defaultdict(list)
     for person in people:
         family_name = person.get("family_name") or person.get("single_name") or ""
         key = normalize_surname(family_name)
-        lookup[key].append({
-            "person_id": person["person_id"],
-            "unified_id": person["unified_id"],
-            "family_name": person.get("family_name"),
-            "given_names": person.get("given_names"),
-            "name_particles": person.get("name_particles"),
-            "single_name": person.get("single_name"),
-            "is_organisation": person.get("is_organisation", False)
-        })
+        lookup[key].append(context_person(person))
     return lookup
 
 
+def match_locally(nopes_list, people):
+    """
+    Auto-accept clear matches and narrow each remaining entry's context
+    to its candidates.
+
+    Returns:
+        api_entries: nopes entries still to send
+        context_lookup: {group key: [context people]} for those entries
+        stats: counts for the console and the prep log
+    """
+    accepted, borderline, new = people_nopes_matcher.match_nopes(nopes_list, people)
+
+    nopes_results_dir.mkdir(parents=True, exist_ok=True)
+    with open(local_results_file, "w", encoding="utf-8") as f:
+        json.dump(
+            [people_nopes_matcher.accepted_result(entry, person) for entry, person, _ in accepted],
+            f, ensure_ascii=False, indent=2,
+        )
+
+    context_lookup = defaultdict(dict)
+    for entry, candidates in borderline:
+        key = entry.get("last_norm") or normalize_surname(entry.get("single_norm") or "")
+        for person in candidates:
+            context_lookup[key][person["person_id"]] = context_person(person)
+
+    stats = {
+        "auto_accepted": len(accepted),
+        "borderline": len(borderline),
+        "no_candidates": len(new),
+    }
+    api_entries = [entry for entry, _ in borderline] + new
+    return api_entries, {key: list(people.values()) for key, people in context_lookup.items()}, stats
+
+
+def predicted_output_tokens(entry):
+    return json_tokens(entry) + NOPES_ADDED_OUTPUT_TOKENS
+
+
 def main():
     print(f"Loading nopes from {nopes_file}...")
     with open(nopes_file, "r", encoding="utf-8") as f:
@@ -68,38 +120,74 @@ def main():
             "is_organisation": entry.get("is_organisation", False)
         })
 
+    matching = None
+    if "--no-local-match" not in sys.argv:
+        # Clear matches never reach the API; the rest only carry their candidates
+        print("\nMatching nopes against existing people...")
+        api_entries, existing_lookup, matching = match_locally(nopes_list, people)
+        print(f"  Auto-accepted: {matching['auto_accepted']} (saved to {local_results_file})")
+        print(f"  Borderline:    {matching['borderline']}")
+        print(f"  No candidates: {matching['no_candidates']}")
+    else:
+        api_entries = nopes_list
+
     # Group by last_norm so similar surnames go into the same batch
     groups = defaultdict(list)
-    for entry in nopes_list:
+    for entry in api_entries:
         key = entry.get("last_norm") or normalize_surname(entry.get("single_norm") or "")
         groups[key].append(entry)
 
     print(f"Surname groups in nopes: {len(groups)}")
 
-    # Create batches, keeping surname groups together
-    batches = []
-    current_nopes = []
-    current_keys = set()
-
-    for surname_key, entries in sorted(groups.items()):
-        if len(current_nopes) + len(entries) > BATCH_SIZE and current_nopes:
-            batches.append((current_nopes, list(current_keys)))
-            current_nopes = []
-            current_keys = set()
-        current_nopes.extend(entries)
-        current_keys.add(surname_key)
-
-    if current_nopes:
-        batches.append((current_nopes, list(current_keys)))
+    # Each group keeps only the people nearest to its entries as context
+    full_context_tokens = {
+        key: sum(json_tokens(person) for person in existing_lookup.get(key, []))
+        for key in groups
+    }
+    context_lookup = {
+        key: people_nopes_matcher.top_k_context(entries, existing_lookup.get(key, []))
+        for key, entries in groups.items()
+    }
 
-    print(f"Created {len(batches)} batches")
+    # Create batches, keeping surname groups together; each surname's
+    # context people are counted once per batch that holds the surname
+    context_tokens = {
+        key: sum(json_tokens(person) for person in context_lookup[key])
+        for key in groups
+    }
+    packing = dict(
+        input_tokens=json_tokens,
+        output_tokens=predicted_output_tokens,
+        input_budget=NOPES_INPUT_BUDGET,
+        out_budget=output_budget(NOPES_MAX_TOKENS),
+        shared_tokens=context_tokens.get,
+    )
+    # First-fit-decreasing fills batches far better than cutting the
+    # sorted groups in order; the in-order packing is only kept for the report
+    in_order = pack_shards(sorted(groups.items()), **packing)
+    shards = pack_shards_ffd(sorted(groups.items()), **packing)
+    batches = [(shard["entries"], shard["keys"]) for shard in shards]
+
+    def packed_context(packed):
+        return sum(context_tokens[key] for shard in packed for key in shard["keys"])
+
+    print(f"Packing: {len(in_order)} batches in order ({packed_context(in_order)} context tokens) -> "
+          f"{len(shards)} first-fit-decreasing ({packed_context(shards)} context tokens)")
+    print(f"Created {len(batches)} batches ({describe_shards(shards)})")
 
     batch_output_dir.mkdir(parents=True, exist_ok=True)
 
+    file_names = []
+    tokens_before = 0
+    tokens_after = 0
     for idx, (nopes_entries, context_keys) in enumerate(batches, start=1):
         context_people = []
         for key in context_keys:
-            context_people.extend(existing_lookup.get(key, []))
+            context_people.extend(context_lookup[key])
+        before = sum(full_context_tokens[key] for key in context_keys)
+        after = sum(context_tokens[key] for key in context_keys)
+        tokens_before += before
+        tokens_after += after
 
         batch_data = {
             "nopes_entries": nopes_entries,
@@ -109,14 +197,35 @@ def main():
         batch_file = batch_output_dir / f"batch_nopes_{idx:03d}.json"
         with open(batch_file, "w", encoding="utf-8") as f:
             json.dump(batch_data, f, ensure_ascii=False, indent=2)
-        print(f"  Saved {batch_file.name} ({len(nopes_entries)} nopes, {len(context_people)} context)")
+        file_names.append(batch_file.name)
+        print(f"  Saved {batch_file.name} ({len(nopes_entries)} nopes, {len(context_people)} context, "
+              f"context tokens {before} -> {after})")
+
+    saved_share = (1 - tokens_after / tokens_before) * 100 if tokens_before else 0
+    print(f"Context tokens: {tokens_before} -> {tokens_after} ({saved_share:.0f}% saved, "
+          f"top {people_nopes_matcher.CONTEXT_TOP_K} per entry)")
+
+    manifest_path = write_manifest(
+        batch_output_dir, file_names, shards,
+        budgets={
+            "input_tokens": NOPES_INPUT_BUDGET,
+            "output_tokens": output_budget(NOPES_MAX_TOKENS),
+        },
+        max_tokens=NOPES_MAX_TOKENS,
+    )
+    print(f"Shard manifest saved to {manifest_path}")
 
     summary = {
         "total_nopes": len(nopes_list),
         "total_existing": len(people),
         "batches_created": len(batches),
+        "batches_in_order_packing": len(in_order),
+        "context_tokens_before_pruning": tokens_before,
+        "context_tokens_after_pruning": tokens_after,
         "output_directory": str(batch_output_dir)
     }
+    if matching:
+        summary["local_matching"] = matching
 
     with open(log_file, "w", encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
@@ -1,35 +1,34 @@
+import os
 import json
 from pathlib import Path
 from collections import defaultdict
 
+import unified_id
+
 project_root = Path(__file__).parent.parent
 
 nopes_results_dir = project_root / "database/in_progress/nopes_results"
 unmatched_file = project_root / "data/people/unmatched_flat.json"
+people_file = project_root / "data/from db/people.json"
 output_file = project_root / "database/in_progress/nopes_final.json"
 
+ROLE_FIELDS = ["display_name", "sort_order", "is_author", "is_editor", "is_contributor", "is_translator"]
+
 
-def build_unmatched_lookup(unmatched):
+def build_unmatched_index(unmatched):
     """
-    Build lookup: composite_id -> list of unmatched entries.
-    Mirrors the structure used in the notebook.
+    Build index: (composite_id, display_norm) -> list of unmatched rows.
+    A person listed twice in one book (e.g. as author and as translator)
+    has two rows under the same key; both are kept.
     """
-    lookup = defaultdict(list)
+    index = defaultdict(list)
     for entry in unmatched:
-        lookup[entry["composite_id"]].append(entry)
-    return lookup
-
-
-def load_nopes_results():
-    result_files = sorted(nopes_results_dir.glob("results_nopes_*.json"))
-
-    if not result_files:
-        print(f"No result files found in {nopes_results_dir}")
-        return []
+        index[(entry["composite_id"], entry.get("display_norm"))].append(entry)
+    return index
 
-    print(f"Found {len(result_files)} result files")
 
-    all_results = []
+def iter_nopes_results(result_files):
+    """Results one file at a time, internal tracking fields removed."""
     for rf in result_files:
         with open(rf, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -37,30 +36,72 @@ def load_nopes_results():
             entry.pop("_source_custom_id", None)
             entry.pop("_error", None)
             entry.pop("_raw_content", None)
-        all_results.extend(data)
+            yield entry
+
+
+def role_rows(result, index, report):
+    """
+    Every unmatched row of this result's person, over all its books.
+    Identical rows are attached once; a missing row is recorded.
+    """
+    display_norm = result.get("display_norm")
+    entries = []
+    for composite_id in result.get("composite_id", []):
+        key = (composite_id, display_norm)
+        records = index.get(key)
+        if not records:
+            report["missing_rows"].append({"composite_id": composite_id, "display_norm": display_norm})
+            continue
+        report["used_keys"].add(key)
 
-    print(f"Loaded {len(all_results)} total results")
-    return all_results
+        seen = set()
+        for u in records:
+            row = {field: u.get(field) for field in ROLE_FIELDS}
+            fingerprint = tuple(row.values())
+            if fingerprint in seen:
+                report["duplicate_rows"] += 1
+                continue
+            seen.add(fingerprint)
+            entries.append({"display_name": row.pop("display_name"), "composite_id": composite_id, **row})
+        if len(seen) > 1:
+            report["multi_role_keys"] += 1
+    return entries
+
+
+def write_item(f, item, first):
+    """One element of a top-level list, laid out as json.dump(indent=2) would."""
+    text = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+    f.write(("" if first else ",\n") + "    " + text)
 
 
 def main():
+    result_files = sorted(nopes_results_dir.glob("results_nopes_*.json"))
+    if not result_files:
+        print(f"No result files found in {nopes_results_dir}")
+        return
+    print(f"Found {len(result_files)} result files")
+
     print(f"Loading unmatched from {unmatched_file}...")
     with open(unmatched_file, "r", encoding="utf-8") as f:
         unmatched = json.load(f)
 
-    unmatched_lookup = build_unmatched_lookup(unmatched)
-    print(f"Built unmatched lookup: {len(unmatched_lookup)} composite_ids")
-
-    all_results = load_nopes_results()
+    index = build_unmatched_index(unmatched)
+    print(f"Built unmatched index: {len(index)} (composite_id, display_norm) keys")
 
-    if not all_results:
-        return
+    print(f"Loading existing people from {people_file}...")
+    with open(people_file, "r", encoding="utf-8") as f:
+        existing_ids = {person["unified_id"] for person in json.load(f) if person.get("unified_id")}
 
-    new_people = []
     matches = []
     oops = []
+    new_people = []
+    base_ids = []
+    regenerated = 0
+    total_results = 0
+    report = {"missing_rows": [], "duplicate_rows": 0, "multi_role_keys": 0, "used_keys": set()}
 
-    for result in all_results:
+    for result in iter_nopes_results(result_files):
+        total_results += 1
         display_norm = result.get("display_norm")
 
         if result.get("unified_id") == "oops":
@@ -68,6 +109,8 @@ def main():
             continue
 
         if result.get("match_found"):
+            for composite_id in result.get("composite_id", []):
+                report["used_keys"].add((composite_id, display_norm))
             matches.append({
                 "display_norm": display_norm,
                 "composite_id": result.get("composite_id"),
@@ -77,24 +120,19 @@ def main():
             continue
 
         # New person — re-attach entries and roles from unmatched
-        entries = []
-        for composite_id in result.get("composite_id", []):
-            records = unmatched_lookup.get(composite_id, [])
-            for u in records:
-                if u.get("display_norm") == display_norm:
-                    entries.append({
-                        "display_name": u.get("display_name"),
-                        "composite_id": composite_id,
-                        "sort_order": u.get("sort_order"),
-                        "is_author": u.get("is_author"),
-                        "is_editor": u.get("is_editor"),
-                        "is_contributor": u.get("is_contributor"),
-                        "is_translator": u.get("is_translator")
-                    })
-                    break
+        entries = role_rows(result, index, report)
+
+        # The ID follows from the cleaned name fields; the model's own is only a fallback
+        generated_id = unified_id.generate(result)
+        if generated_id == unified_id.OOPS:
+            generated_id = result.get("unified_id")
+        elif generated_id != result.get("unified_id"):
+            regenerated += 1
+        base_ids.append(generated_id)
 
         new_people.append({
-            "unified_id": result.get("unified_id"),
+            "unified_id": generated_id,
+            "display_norm": display_norm,
             "family_name": result.get("family_name"),
             "given_names": result.get("given_names"),
             "name_prefix": result.get("name_prefix"),
@@ -105,25 +143,85 @@ def main():
             "entries": entries
         })
 
-    output = {
-        "new_people": new_people,
+    # One ID for several new people, or for a new person and an existing
+    # row: either one person under two spellings or two people who need
+    # telling apart; listed (by display_norm) for review
+    id_collisions = unified_id.find_collisions(new_people, base_ids, key="display_norm")
+    db_collisions = [
+        {"unified_id": uid, "display_norm": person["display_norm"]}
+        for uid, person in zip(base_ids, new_people) if uid in existing_ids
+    ]
+
+    # Every new person gets an ID no existing or other new person has ("_2", "_3", ...)
+    final_ids = unified_id.assign_unique(new_people, taken=existing_ids, ids=base_ids)
+    suffixed = 0
+    for person, uid in zip(new_people, final_ids):
+        suffixed += uid != person["unified_id"]
+        person["unified_id"] = uid
+        del person["display_norm"]
+
+    # Rows in unmatched that no result (new person or match) accounted for
+    unclaimed = sorted(
+        ({"composite_id": cid, "display_norm": norm} for cid, norm in index.keys() - report["used_keys"]),
+        key=lambda row: (str(row["composite_id"]), str(row["display_norm"])),
+    )
+
+    rest = {
         "matches": matches,
         "oops": oops,
+        "id_collisions": id_collisions,
+        "db_collisions": db_collisions,
+        "reattach_report": {
+            "missing_rows": report["missing_rows"],
+            "unclaimed_rows": unclaimed,
+        },
         "summary": {
-            "total_results": len(all_results),
+            "total_results": total_results,
             "new_people": len(new_people),
             "matches": len(matches),
-            "oops": len(oops)
+            "oops": len(oops),
+            "regenerated_ids": regenerated,
+            "id_collisions": len(id_collisions),
+            "db_collisions": len(db_collisions),
+            "suffixed_ids": suffixed,
+            "missing_rows": len(report["missing_rows"]),
+            "unclaimed_rows": len(unclaimed),
+            "duplicate_rows_skipped": report["duplicate_rows"],
+            "people_with_several_roles": report["multi_role_keys"]
         }
     }
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    # new_people is streamed to disk item by item; the rest is small.
+    # Written to a temp file that replaces nopes_final.json only once
+    # complete, so an interrupted run keeps the previous output.
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write('{\n  "new_people": [\n')
+            for idx, person in enumerate(new_people):
+                write_item(f, person, first=idx == 0)
+            f.write("\n  ]" if new_people else "]")
+            for key, value in rest.items():
+                text = json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                f.write(f',\n  "{key}": {text}')
+            f.write("\n}")
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_file, output_file)
 
     print(f"\n=== DONE ===")
+    print(f"Results:     {total_results}")
     print(f"New people:  {len(new_people)}")
     print(f"Matches:     {len(matches)}")
     print(f"Oops:        {len(oops)}")
+    print(f"IDs:         {regenerated} regenerated, {len(id_collisions)} shared by several new people, "
+          f"{len(db_collisions)} already in the people table, {suffixed} given a _N suffix")
+    print(f"Role rows:   {len(report['missing_rows'])} missing, {len(unclaimed)} unclaimed, "
+          f"{report['duplicate_rows']} duplicates skipped, "
+          f"{report['multi_role_keys']} people listed more than once in a book")
     print(f"Saved to:    {output_file}")
 
 
@@ -1,11 +1,26 @@
+import sys
 import json
 import re
 from pathlib import Path
+from token_sharder import json_tokens, pack_shards, write_manifest, describe_shards
+import people_splitter
 
 # File paths
 people_file = Path("database/in_progress/collect_people.json")
 batch_output_dir = Path("database/in_progress/pass1_batches")
+pass1_results_dir = Path("database/in_progress/pass1_results")
+local_results_file = pass1_results_dir / "results_pass1_local.json"
 log_file = Path("database/in_progress/pass1_preparation.log")
+# Entries whose pass 1 request failed, written by people_pass2_batches
+failed_file = Path("database/in_progress/pass1_failed.json")
+
+# Pass 1 sends one request per entry (max_tokens=4000 in submit_pass1_batch),
+# so files are sized by total predicted tokens rather than entry count
+PASS1_MAX_TOKENS = 4000
+PASS1_FILE_INPUT_BUDGET = 6000
+# A split entry comes back as several people, each echoing the input fields
+PASS1_OUTPUT_FACTOR = 3
+
 
 def identify_multi_person_entries(entries):
     """
@@ -41,60 +56,127 @@ def identify_multi_person_entries(entries):
     return multi_person_entries
 
 
-def create_batches(entries, batch_size=25):
+def split_locally(entries):
+    """
+    Split the entries people_splitter is sure about and save them as a
+    pass 1 result file.
+
+    Returns:
+        list: Entries left for the API
+    """
+    results = []
+    remaining = []
+    for entry in entries:
+        split = people_splitter.split_entry(entry)
+        if split is None:
+            remaining.append(entry)
+            continue
+        for person in split:
+            # Same marker the API results carry, so merge_pass1_results
+            # drops the original entry
+            person["_source_custom_id"] = entry["composite_id"]
+        results.extend(split)
+
+    pass1_results_dir.mkdir(parents=True, exist_ok=True)
+    with open(local_results_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"Split locally: {len(entries) - len(remaining)} entries -> {len(results)} people")
+    print(f"Saved to {local_results_file}")
+    return remaining
+
+
+def predicted_output_tokens(entry):
+    return json_tokens(entry) * PASS1_OUTPUT_FACTOR
+
+
+def create_batches(entries, input_budget=PASS1_FILE_INPUT_BUDGET):
     """
-    Split entries into batches of specified size.
+    Split entries into files of roughly equal predicted token load.
 
     Returns:
-        list: List of batches, each batch is a list of entries
+        list: List of shards (see token_sharder.pack_shards)
     """
-    batches = []
+    groups = [(entry["composite_id"], [entry]) for entry in entries]
+    return pack_shards(
+        groups,
+        input_tokens=json_tokens,
+        output_tokens=predicted_output_tokens,
+        input_budget=input_budget,
+    )
 
-    for i in range(0, len(entries), batch_size):
-        batch = entries[i:i+batch_size]
-        batches.append(batch)
 
-    return batches
+def retry_prefix():
+    """batch_split_retryNN_ for the next retry round; earlier rounds stay tracked."""
+    rounds = len(list(batch_output_dir.glob("batch_split_retry*_01.json")))
+    return f"batch_split_retry{rounds + 1:02d}_"
 
 
 def main():
+    retry = "--retry" in sys.argv
+    source_file = failed_file if retry else people_file
+
     # Load all people entries
-    print(f"Loading people data from {people_file}...")
-    with open(people_file, "r", encoding="utf-8") as f:
+    print(f"Loading people data from {source_file}...")
+    if retry and not source_file.exists():
+        print("No failed Pass 1 requests listed; run people_pass2_batches.py first. Exiting.")
+        return
+    with open(source_file, "r", encoding="utf-8") as f:
         all_entries = json.load(f)
 
     print(f"Total entries loaded: {len(all_entries)}")
 
-    # Identify entries that need splitting
-    multi_person_entries = identify_multi_person_entries(all_entries)
+    # Identify entries that need splitting (a retry resends the failed ones as they are)
+    multi_person_entries = all_entries if retry else identify_multi_person_entries(all_entries)
 
     print(f"Entries needing split: {len(multi_person_entries)}")
 
+    needing_split = len(multi_person_entries)
+    if not retry and "--no-local-split" not in sys.argv:
+        multi_person_entries = split_locally(multi_person_entries)
+        print(f"Entries left for the API: {len(multi_person_entries)}")
+
     if len(multi_person_entries) == 0:
-        print("No entries found that need splitting. Exiting.")
+        print("No entries left for the API. Exiting.")
         return
 
     # Create batches
-    batches = create_batches(multi_person_entries, batch_size=25)
+    shards = create_batches(multi_person_entries)
+    batches = [shard["entries"] for shard in shards]
 
-    print(f"Created {len(batches)} batches")
+    print(f"Created {len(batches)} batches ({describe_shards(shards)})")
+
+    oversized = [e for e in multi_person_entries if predicted_output_tokens(e) > PASS1_MAX_TOKENS]
+    if oversized:
+        print(f"Warning: {len(oversized)} entries may exceed max_tokens={PASS1_MAX_TOKENS}")
 
     # Create output directory if it doesn't exist
     batch_output_dir.mkdir(parents=True, exist_ok=True)
 
     # Save batches
+    file_names = []
+    prefix = retry_prefix() if retry else "batch_split_"
     for idx, batch in enumerate(batches, start=1):
-        batch_file = batch_output_dir / f"batch_split_{idx:02d}.json"
+        batch_file = batch_output_dir / f"{prefix}{idx:02d}.json"
         with open(batch_file, "w", encoding="utf-8") as f:
             json.dump(batch, f, ensure_ascii=False, indent=2)
+        file_names.append(batch_file.name)
         print(f"Saved {batch_file} ({len(batch)} entries)")
 
+    manifest_path = write_manifest(
+        batch_output_dir, file_names, shards,
+        budgets={"file_input_tokens": PASS1_FILE_INPUT_BUDGET},
+    )
+    print(f"Shard manifest saved to {manifest_path}")
+
     # Create summary log
     summary = {
+        "retry": retry,
         "total_entries_scanned": len(all_entries),
-        "entries_needing_split": len(multi_person_entries),
+        "entries_needing_split": needing_split,
+        "entries_split_locally": needing_split - len(multi_person_entries),
         "batches_created": len(batches),
-        "batch_size": 25,
+        "file_input_budget": PASS1_FILE_INPUT_BUDGET,
         "output_directory": str(batch_output_dir)
     }
 
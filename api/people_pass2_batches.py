@@ -1,14 +1,25 @@
+import sys
 import json
 import re
 from pathlib import Path
 from collections import defaultdict
+from token_sharder import json_tokens, output_budget, pack_shards, write_manifest, describe_shards
+import people_blocking
+import people_pass1_batches
 
 # File paths
 people_file = Path("database/in_progress/collect_people.json")
 pass1_results_dir = Path("database/in_progress/pass1_results")
 batch_output_dir = Path("database/in_progress/pass2_batches")
+pass2_results_dir = Path("database/in_progress/pass2_results")
+local_results_file = pass2_results_dir / "results_pass2_local.json"
 log_file = Path("database/in_progress/pass2_preparation.log")
 
+# Each pass 2 file is one request (max_tokens=20000 in submit_pass2_batch)
+# that echoes every entry back with unified_id and variants added
+PASS2_MAX_TOKENS = 20000
+PASS2_ADDED_OUTPUT_TOKENS = 30
+
 
 def normalize_for_grouping(name):
     """
@@ -56,43 +67,30 @@ def group_people_by_surname(entries):
     return groups
 
 
-def create_batches(surname_groups, batch_size=75):
+def predicted_output_tokens(entry):
+    return json_tokens(entry) + PASS2_ADDED_OUTPUT_TOKENS
+
+
+def create_batches(surname_groups, max_tokens=PASS2_MAX_TOKENS):
     """
-    Create batches from surname groups.
+    Create batches from surname groups, filled up to a predicted output
+    budget safely below max_tokens.
     Keep similar surnames together for efficient deduplication.
 
     Args:
         surname_groups: dict of {normalized_surname: [entries]}
-        batch_size: target batch size (can be larger for efficiency)
+        max_tokens: the request's max_tokens
 
     Returns:
-        list of batches, each batch is a list of entries
+        list of shards (see token_sharder.pack_shards)
     """
-    batches = []
-    current_batch = []
-
     # Sort groups by surname for consistency
-    for surname, entries in sorted(surname_groups.items()):
-        # If this group alone is too large, split it
-        if len(entries) > batch_size:
-            # Split large group into chunks
-            for i in range(0, len(entries), batch_size):
-                chunk = entries[i:i+batch_size]
-                batches.append(chunk)
-        elif len(current_batch) + len(entries) <= batch_size:
-            # Add to current batch
-            current_batch.extend(entries)
-        else:
-            # Current batch is full, start new batch
-            if current_batch:
-                batches.append(current_batch)
-            current_batch = entries.copy()
-
-    # Add final batch
-    if current_batch:
-        batches.append(current_batch)
-
-    return batches
+    return pack_shards(
+        sorted(surname_groups.items()),
+        input_tokens=json_tokens,
+        output_tokens=predicted_output_tokens,
+        out_budget=output_budget(max_tokens),
+    )
 
 
 def merge_pass1_results():
@@ -120,27 +118,47 @@ def merge_pass1_results():
 
     print(f"Found {len(pass1_files)} Pass 1 result files")
 
+    # A request that failed (truncated, undecodable, API error) comes back
+    # as one "_error" record; its original entry stays in and is listed
+    # for resubmission. A retry's results file sorts after the first run's,
+    # so the last file with a usable answer wins.
+    by_source = defaultdict(dict)
     pass1_entries = []
-    pass1_source_ids = set()
 
-    for result_file in pass1_files:
+    for result_file in sorted(pass1_files):
         with open(result_file, "r", encoding="utf-8") as f:
             results = json.load(f)
 
             for entry in results:
-                # Track which composite_ids came from Pass 1
-                if "_source_custom_id" in entry:
-                    pass1_source_ids.add(entry["_source_custom_id"])
-                    # Remove internal tracking fields before adding
-                    entry.pop("_source_custom_id", None)
-                    entry.pop("_error", None)
-                    entry.pop("_raw_content", None)
+                if "_source_custom_id" not in entry:
+                    pass1_entries.append(entry)
+                    continue
+                by_source[entry["_source_custom_id"]].setdefault(result_file.name, []).append(entry)
 
-                pass1_entries.append(entry)
+    pass1_source_ids = set()
+    failed_ids = set()
+    for source_id, files in by_source.items():
+        answered = [entries for entries in files.values() if not any(e.get("_error") for e in entries)]
+        if not answered:
+            failed_ids.add(source_id)
+            continue
+        pass1_source_ids.add(source_id)
+        for entry in answered[-1]:
+            # Remove internal tracking fields before adding
+            entry.pop("_source_custom_id", None)
+            entry.pop("_raw_content", None)
+            pass1_entries.append(entry)
 
     print(f"Loaded {len(pass1_entries)} split entries from Pass 1")
     print(f"These came from {len(pass1_source_ids)} original multi-person entries")
 
+    failed_entries = [entry for entry in original_entries if entry["composite_id"] in failed_ids]
+    with open(people_pass1_batches.failed_file, "w", encoding="utf-8") as f:
+        json.dump(failed_entries, f, ensure_ascii=False, indent=2)
+    if failed_ids:
+        print(f"⚠️  {len(failed_ids)} Pass 1 requests failed; their original entries are kept unsplit")
+        print(f"   Listed in {people_pass1_batches.failed_file}; resubmit with: python people_pass1_batches.py --retry")
+
     # Filter out original entries that were split in Pass 1
     filtered_original = [
         entry for entry in original_entries
@@ -166,29 +184,63 @@ def main():
     # Merge Pass 1 results with original entries
     all_entries = merge_pass1_results()
 
-    # Group by surname for efficient batching
-    print("\nGrouping entries by surname...")
-    surname_groups = group_people_by_surname(all_entries)
+    if "--no-blocking" in sys.argv:
+        # Old behaviour: every exact-surname group goes to the API
+        print("\nGrouping entries by surname...")
+        surname_groups = group_people_by_surname(all_entries)
+        blocking = None
+    else:
+        # Clear matches are resolved here; only ambiguous clusters are sent
+        print("\nBlocking candidate pairs...")
+        local, ambiguous, blocking = people_blocking.resolve(all_entries)
+        print(f"  Candidate pairs: {blocking['candidate_pairs']} "
+              f"(exact-surname groups: {blocking['surname_group_pairs']})")
+        print(f"  Pairs: {blocking['matches']} match, {blocking['ambiguous_pairs']} ambiguous, "
+              f"{blocking['conflicts']} conflicting")
+        print(f"  Resolved locally: {blocking['local_entries']} entries in {blocking['local_clusters']} clusters")
+        print(f"  Sent to API: {blocking['ambiguous_entries']} entries in {blocking['ambiguous_clusters']} clusters")
+
+        pass2_results_dir.mkdir(parents=True, exist_ok=True)
+        with open(local_results_file, "w", encoding="utf-8") as f:
+            json.dump(people_blocking.local_results(local), f, ensure_ascii=False, indent=2)
+        print(f"✓ Local results saved to {local_results_file}")
+
+        # Each ambiguous cluster is one group, kept whole in a single request;
+        # keyed by folded surname so neighbouring spellings share batches
+        surname_groups = {
+            f"{people_blocking.fold(people_blocking.surname_of(cluster[0]))}_{idx:05d}": cluster
+            for idx, cluster in enumerate(ambiguous)
+        }
 
     print(f"Created {len(surname_groups)} surname groups")
 
     # Create batches
     print("\nCreating batches...")
-    batches = create_batches(surname_groups, batch_size=75)
+    shards = create_batches(surname_groups)
+    batches = [shard["entries"] for shard in shards]
 
-    print(f"Created {len(batches)} batches")
+    print(f"Created {len(batches)} batches ({describe_shards(shards)})")
 
     # Create output directory
     batch_output_dir.mkdir(parents=True, exist_ok=True)
 
     # Save batches
     print("\nSaving batches...")
+    file_names = []
     for idx, batch in enumerate(batches, start=1):
         batch_file = batch_output_dir / f"batch_dedup_{idx:03d}.json"
         with open(batch_file, "w", encoding="utf-8") as f:
             json.dump(batch, f, ensure_ascii=False, indent=2)
+        file_names.append(batch_file.name)
         print(f"  Saved {batch_file.name} ({len(batch)} entries)")
 
+    manifest_path = write_manifest(
+        batch_output_dir, file_names, shards,
+        budgets={"output_tokens": output_budget(PASS2_MAX_TOKENS)},
+        max_tokens=PASS2_MAX_TOKENS,
+    )
+    print(f"✓ Shard manifest saved to {manifest_path}")
+
     # Create summary log
     summary = {
         "total_entries": len(all_entries),
@@ -197,6 +249,8 @@ def main():
         "avg_batch_size": sum(len(b) for b in batches) / len(batches) if batches else 0,
         "output_directory": str(batch_output_dir)
     }
+    if blocking:
+        summary["blocking"] = blocking
 
     with open(log_file, "w", encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,171 @@
+import re
+
+# ============================================================
+# Rule-based splitting of multi-person entries (pass 1)
+# ============================================================
+#
+# The common shapes are split here, in the pass 1 output schema:
+#   "Klaus Berger und Christiane Nord"         given-first names
+#   "ABEL, Otto u. Wattenbach, W."             surname-first names
+#   "Hans Müller, Karl Meier und Otto Abel"    given-first list
+#   "Beethoven, Ludwig van u. Weber, Carl von" surname-first with particles
+# Every part has to be a plain personal name (capitalised words,
+# initials, known particles). Anything else returns None and goes to
+# the model as before: titles, "Hrsg.", organisations, articles
+# ("Ernst Jünger u. Das Reich"), other lowercase words, a shared
+# surname ("Jacob und Wilhelm Grimm"), lone surnames ("Goethe und
+# Schiller"), and given-first names of more than two words, where
+# middle name and compound surname look alike ("Gabriel García
+# Márquez", "Ludwig van Beethoven").
+
+CONJUNCTION = re.compile(r"\s+(?:und|u\.)\s+", re.IGNORECASE)
+
+PARTICLES = {
+    "von", "van", "de", "del", "della", "di", "du", "da", "dos", "der", "den",
+    "des", "la", "le", "zu", "zur", "zum", "ten", "ter", "af", "av",
+}
+
+ARTICLES = {
+    "der", "die", "das", "dem", "den", "des", "ein", "eine", "einem", "einen", "einer",
+    "the", "a", "an",
+}
+
+# Titles, roles, firm words and articles: an entry holding one goes to the model
+NOT_NAMES = {
+    "dr.", "prof.", "hrsg.", "hg.", "bearb.", "übers.", "mitarb.", "ders.", "dies.",
+    "verlag", "verl.", "co.", "söhne", "gebr.", "gebrüder", "gesellschaft", "institut",
+    "museum", "akademie", "universität", "bibliothek", "stiftung", "verein",
+} | ARTICLES
+
+# Capitalised word, optionally hyphenated or with an apostrophe (O'Brien)
+NAME_WORD = re.compile(r"[^\W\d_]+(?:[-'’][^\W\d_]+)*")
+# W.  J.W.  Chr.  H.-G.
+INITIALS = re.compile(r"(?:[^\W\d_]{1,4}\.-?)+")
+
+MAX_GIVEN_TOKENS = 3
+MAX_SURNAME_TOKENS = 2
+# "Given Surname" only; a third word could be a middle name or half a surname
+MAX_DIRECT_TOKENS = 2
+
+
+def is_word(token):
+    return token[0].isupper() and token.lower() not in NOT_NAMES and NAME_WORD.fullmatch(token) is not None
+
+
+def is_initial(token):
+    return token[0].isupper() and token.lower() not in NOT_NAMES and INITIALS.fullmatch(token) is not None
+
+
+def has_stray_word(part):
+    """An article or a lowercase word, other than a name particle ("van der")."""
+    return any(
+        token not in PARTICLES and (token.lower() in ARTICLES or token[0].islower())
+        for token in part.replace(",", " ").split()
+    )
+
+
+def fix_case(token):
+    """ABEL -> Abel, MÜLLER-LÜDENSCHEIDT -> Müller-Lüdenscheidt; initials untouched."""
+    if len(token) > 1 and token.isupper() and not token.endswith("."):
+        return "-".join(part.capitalize() for part in token.split("-"))
+    return token
+
+
+def split_particles(tokens, leading):
+    """(particles, rest) with particles taken from the front or the back."""
+    if leading:
+        idx = 0
+        while idx < len(tokens) and tokens[idx] in PARTICLES:
+            idx += 1
+        return tokens[:idx], tokens[idx:]
+    idx = len(tokens)
+    while idx > 0 and tokens[idx - 1] in PARTICLES:
+        idx -= 1
+    return tokens[idx:], tokens[:idx]
+
+
+def valid_given(tokens):
+    return 0 < len(tokens) <= MAX_GIVEN_TOKENS and all(is_word(t) or is_initial(t) for t in tokens)
+
+
+def valid_surname(tokens):
+    return 0 < len(tokens) <= MAX_SURNAME_TOKENS and all(is_word(t) for t in tokens)
+
+
+def person(family, given, particles):
+    family = " ".join(fix_case(t) for t in family)
+    given = " ".join(fix_case(t) for t in given)
+    particles = " ".join(particles) or None
+    display_name = f"{family}, {given} {particles}" if particles else f"{family}, {given}"
+    return {
+        "display_name": display_name,
+        "family_name": family,
+        "given_names": given,
+        "name_particles": particles,
+    }
+
+
+def parse_inverted(part):
+    """ "Surname, Given" (particles before the surname or after the given names)."""
+    surname_text, given_text = (s.strip() for s in part.split(",", 1))
+    leading, surname = split_particles(surname_text.split(), leading=True)
+    trailing, given = split_particles(given_text.split(), leading=False)
+    if leading and trailing or not valid_surname(surname) or not valid_given(given):
+        return None
+    return person(surname, given, leading or trailing)
+
+
+def parse_direct(part):
+    """ "Given Surname": exactly two words."""
+    tokens = part.split()
+    if len(tokens) != MAX_DIRECT_TOKENS:
+        return None
+    given, surname = tokens[:1], tokens[1:]
+    if not valid_surname(surname) or not valid_given(given):
+        return None
+    return person(surname, given, [])
+
+
+def split_names(text):
+    """
+    The people named in `text`, left to right, or None unless every part
+    parses as one plain name.
+    """
+    parts = [p.strip() for p in CONJUNCTION.split(text.strip())]
+    if len(parts) < 2 or not all(parts) or any(has_stray_word(p) for p in parts):
+        return None
+
+    comma_counts = [p.count(",") for p in parts]
+    if all(count == 1 for count in comma_counts):
+        parsed = [parse_inverted(p) for p in parts]
+    elif comma_counts[-1] == 0 and any(comma_counts):
+        # "A B, C D und E F": commas only separate given-first names
+        parsed = [parse_direct(p.strip()) for part in parts for p in part.split(",")]
+    elif not any(comma_counts):
+        parsed = [parse_direct(p) for p in parts]
+    else:
+        return None
+
+    if not all(parsed):
+        return None
+    return parsed
+
+
+def split_entry(entry):
+    """
+    Pass 1 output records for one multi-person entry, or None when it
+    should go to the model. Book fields and is_* flags are kept as they
+    are; sort_order counts from 1, left to right.
+    """
+    text = entry.get("display_name") or ""
+    if not CONJUNCTION.search(text):
+        text = entry.get("single_name") or ""
+
+    names = split_names(text)
+    if not names:
+        return None
+
+    return [
+        {**entry, **name, "single_name": None, "sort_order": sort_order}
+        for sort_order, name in enumerate(names, start=1)
+    ]
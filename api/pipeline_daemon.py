@@ -0,0 +1,654 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from abc import ABC, abstractmethod
+import argparse
+from pathlib import Path
+from datetime import datetime
+import anthropic
+from dotenv import load_dotenv
+from batch_journal import BatchJournal
+
+import batch_processor
+import check_status
+import check_people_status
+import people_batch_processor
+import people_clean_processor
+import people_clean_dedup
+import people_clean_prep
+import people_collect
+import people_nopes_prep
+import people_pass1_batches
+import people_pass2_batches
+import validate_parsed
+from parse_single_batch import submit_batch_async
+from pipeline_metrics import init_metrics, set_in_flight, count_entries, count_api_errors, stage_timer
+
+load_dotenv()
+async_client = anthropic.AsyncAnthropic()
+
+project_root = Path(__file__).parent.parent
+
+# ============================================================
+# Unattended submit → poll → retrieve → next stage
+# ============================================================
+#
+# One asyncio loop replaces rerunning batch_processor / check_status /
+# people_*_processor / check_people_status by hand. It keeps up to
+# --max-in-flight batches open across all selected stages, polls each
+# batch with exponential backoff, retrieves results the moment a batch
+# ends, and runs a stage's prepare hook once everything it depends on
+# has been retrieved:
+#   book_parse -> validate            parsed files checked one by one
+#   validate   -> pass1               people_collect + people_pass1_batches
+#   pass1      -> pass2               people_pass2_batches
+#   clean      (prepare)              people_clean_prep
+#   clean      -> nopes               people_clean_dedup fan-out + people_nopes_prep
+#
+# A prepare hook that raises is retried with backoff; after
+# PREPARE_ATTEMPTS failures its stage is marked failed, the stages
+# after it are skipped, and the daemon exits with status 1.
+#
+# Progress is kept in the same journals the standalone scripts use, so
+# the daemon can be stopped at any point and the scripts (or a new
+# daemon) carry on from there. The scripts use paths relative to the
+# project root, so the daemon changes into it before starting:
+#   python api/pipeline_daemon.py book_parse
+#   python api/pipeline_daemon.py pass1 pass2 --max-in-flight 20
+
+POLL_MIN_SECONDS = 30
+POLL_MAX_SECONDS = 600
+MAX_IN_FLIGHT = 10
+PREPARE_ATTEMPTS = 3
+
+
+# ============================================================
+# Stages
+# ============================================================
+
+class Stage(ABC):
+    """
+    A batch file folder plus the journal that tracks it. Subclasses
+    know how to submit a file, tell whether its results are in, and
+    retrieve them.
+    """
+
+    def __init__(self, name, batch_dir, batch_pattern, tracking_file, layout, depends_on=(), prepare=None):
+        self.name = name
+        self.batch_dir = Path(batch_dir)
+        self.batch_pattern = batch_pattern
+        self.tracking_file = Path(tracking_file)
+        self.layout = layout
+        self.depends_on = tuple(depends_on)
+        self.prepare = prepare
+        self.prepared = False
+        self.prepare_failures = 0
+        self.next_prepare = 0.0
+        self.failed = False
+        self.failed_files = set()
+        self.journal = None
+
+    def open(self):
+        self.journal = BatchJournal(self.tracking_file, layout=self.layout)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def batch_files(self):
+        if not self.batch_dir.exists():
+            return []
+        return sorted(self.batch_dir.glob(self.batch_pattern))
+
+    def pending_files(self):
+        """Batch files with no submission record yet."""
+        return [
+            f for f in self.batch_files()
+            if str(f) not in self.journal.records and str(f) not in self.failed_files
+        ]
+
+    def open_batches(self):
+        """(file_key, record) for every submitted batch still without results."""
+        return [
+            (key, record) for key, record in self.journal.records.items()
+            if not self.is_retrieved(key, record)
+        ]
+
+    def is_done(self):
+        if self.prepare is not None and not self.prepared:
+            return False
+        return not self.pending_files() and not self.open_batches()
+
+    @abstractmethod
+    async def submit(self, file_path):
+        """Submit one batch file; returns its journal record (batch_id None: nothing to poll)."""
+
+    @abstractmethod
+    def is_retrieved(self, key, record):
+        """Whether a submitted batch's results are in."""
+
+    @abstractmethod
+    async def retrieve(self, key, record):
+        """Fetch and save a batch's results; False while it is not ready."""
+
+
+class BookParseStage(Stage):
+    """data_reload/reparse_missing: parse_single_batch + check_status."""
+
+    def __init__(self, pack_size=None, use_cache=True, preparse_threshold=None, **kwargs):
+        super().__init__(
+            name="book_parse",
+            batch_dir="data_reload/reparse_missing/batched",
+            batch_pattern="*.json",
+            tracking_file=batch_processor.LOG_FILE,
+            layout="log",
+            **kwargs,
+        )
+        self.pack_size = pack_size
+        self.use_cache = use_cache
+        self.preparse_threshold = preparse_threshold
+
+    async def submit(self, file_path):
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M")
+        result = await submit_batch_async(
+            file_path,
+            batch_processor.pack_size_for(file_path, self.pack_size),
+            self.use_cache,
+            self.preparse_threshold,
+        )
+        record = batch_processor.submission_record(result, file_path, timestamp, self.preparse_threshold)
+        self.journal.put(file_path, record)
+        batch_processor.count_submission(result)
+        return record
+
+    def is_retrieved(self, key, record):
+        # Filesystem truth, as in check_status.categorise_batches
+        return check_status.parsed_file_for(key).exists()
+
+    async def retrieve(self, key, record):
+        outcome = await asyncio.to_thread(
+            check_status.retrieve_batch,
+            record["batch_id"], key, record.get("pack_size"), record.get("preparse_threshold"),
+            packs=record.get("packs"),
+        )
+        if outcome["status"] != "completed":
+            return False
+        if record["batch_id"]:
+            self.journal.append_meta("completed", record["batch_id"])
+        # A retry file lands in the batched folder and is picked up by fill()
+        check_status.record_retry(self.journal, key, outcome["retry"])
+        check_status.record_telemetry(self.journal, key, record, outcome["telemetry"])
+        check_status.count_retrieval(record, outcome["retry"])
+        note = check_status.describe_retry(outcome["retry"])
+        if note:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {self.name}: {Path(key).name}: {note}")
+        return True
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ValidateStage(Stage):
+    """
+    validate_parsed, one parsed file at a time, no API call: a file is
+    registered with batch_id None and checked at once in retrieve().
+    The passing records go to VALIDATED_DIR, the per-rule failure
+    counts into the journal.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            name="validate",
+            batch_dir=validate_parsed.PARSED_DIR,
+            batch_pattern="*.json",
+            tracking_file="database/in_progress/validate_tracking.json",
+            layout="tracking",
+            **kwargs,
+        )
+        self.input_texts = None
+
+    async def submit(self, file_path):
+        record = {"batch_id": None, "file_path": str(file_path), "submitted_at": datetime.now().isoformat()}
+        self.journal.put(str(file_path), record)
+        return record
+
+    def is_retrieved(self, key, record):
+        return bool(record.get("validated"))
+
+    async def retrieve(self, key, record):
+        if self.input_texts is None:
+            self.input_texts = await asyncio.to_thread(validate_parsed.load_input_texts, validate_parsed.BATCH_DIR)
+        records = await asyncio.to_thread(read_json, key)
+        loaded = [(Path(key), records)]
+        failures = validate_parsed.validate_records(records, self.input_texts)
+        failed_indexes = set().union(*failures.values()) if failures else set()
+        await asyncio.to_thread(validate_parsed.write_validated, loaded, failed_indexes)
+
+        count_entries(self.name, "valid", len(records) - len(failed_indexes))
+        count_entries(self.name, "invalid", len(failed_indexes))
+        self.journal.update(
+            key,
+            validated=True,
+            validated_at=datetime.now().isoformat(),
+            record_count=len(records),
+            valid_count=len(records) - len(failed_indexes),
+            rule_counts={rule: len(indexes) for rule, indexes in failures.items()},
+        )
+        return True
+
+
+class PeopleStage(Stage):
+    """The people passes: people_*_processor + check_people_status."""
+
+    def __init__(self, submit_func, results_dir, results_prefix, batch_prefix, **kwargs):
+        super().__init__(layout="tracking", **kwargs)
+        self.submit_func = submit_func
+        self.results_dir = Path(results_dir)
+        self.results_prefix = results_prefix
+        self.batch_prefix = batch_prefix
+
+    async def submit(self, file_path):
+        result = await asyncio.to_thread(self.submit_func, file_path)
+        result["submitted_at"] = datetime.now().isoformat()
+        self.journal.put(result["file_path"], result)
+        count_entries(self.name, "submitted", result["entry_count"])
+        return result
+
+    def is_retrieved(self, key, record):
+        return bool(record.get("results_retrieved"))
+
+    async def retrieve(self, key, record):
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        batch_file = Path(record["file_path"]).name
+        output_file = self.results_dir / batch_file.replace(self.batch_prefix, self.results_prefix)
+
+        result = await asyncio.to_thread(check_people_status.retrieve_results, record["batch_id"], output_file)
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        count_entries(self.name, "retrieved", result["entry_count"])
+        for kind, n in result["errors"].items():
+            count_api_errors(self.name, kind, n)
+
+        self.journal.update(
+            key,
+            last_checked=datetime.now().isoformat(),
+            processing_status="ended",
+            results_retrieved=True,
+            results_path=result["output_path"],
+            result_count=result["entry_count"],
+            error_counts=result["errors"],
+        )
+        return True
+
+
+def prepare_pass1():
+    people_collect.main()
+    people_pass1_batches.main()
+
+
+def prepare_nopes():
+    # Fan the clean results out to repeated names before nopes reads the people
+    people_clean_dedup.main()
+    people_nopes_prep.main()
+
+
+def build_stages(pack_size=None, use_cache=True, preparse_threshold=None):
+    """All known stages, in pipeline order."""
+    # Journal keys are batch file paths, written in the form each
+    # standalone script uses (relative for batch_processor and
+    # people_batch_processor, under project_root for people_clean_processor),
+    # so the daemon and the scripts see the same submissions. main()
+    # changes into project_root, so both forms point at the same files.
+    in_progress = Path("database/in_progress")
+    return {
+        "book_parse": BookParseStage(
+            pack_size=pack_size,
+            use_cache=use_cache,
+            preparse_threshold=preparse_threshold,
+        ),
+        "validate": ValidateStage(depends_on=("book_parse",)),
+        "pass1": PeopleStage(
+            name="pass1",
+            batch_dir=in_progress / "pass1_batches",
+            batch_pattern="batch_split_*.json",
+            tracking_file=in_progress / "pass1_batch_tracking.json",
+            submit_func=people_batch_processor.submit_pass1_batch,
+            results_dir=in_progress / "pass1_results",
+            results_prefix="results_pass1_",
+            batch_prefix="batch_split_",
+            depends_on=("validate",),
+            prepare=prepare_pass1,
+        ),
+        "pass2": PeopleStage(
+            name="pass2",
+            batch_dir=in_progress / "pass2_batches",
+            batch_pattern="batch_dedup_*.json",
+            tracking_file=in_progress / "pass2_batch_tracking.json",
+            submit_func=people_batch_processor.submit_pass2_batch,
+            results_dir=in_progress / "pass2_results",
+            results_prefix="results_pass2_",
+            batch_prefix="batch_dedup_",
+            depends_on=("pass1",),
+            prepare=people_pass2_batches.main,
+        ),
+        "clean": PeopleStage(
+            name="clean",
+            batch_dir=project_root / in_progress / "clean_batches",
+            batch_pattern="batch_clean_*.json",
+            tracking_file=project_root / in_progress / "clean_batch_tracking.json",
+            submit_func=people_clean_processor.submit_clean_batch,
+            results_dir=in_progress / "clean_results",
+            results_prefix="results_clean_",
+            batch_prefix="batch_clean_",
+            prepare=people_clean_prep.main,
+        ),
+        "nopes": PeopleStage(
+            name="nopes",
+            batch_dir=project_root / in_progress / "nopes_batches",
+            batch_pattern="batch_nopes_*.json",
+            tracking_file=project_root / in_progress / "nopes_batch_tracking.json",
+            submit_func=people_clean_processor.submit_nopes_batch,
+            results_dir=in_progress / "nopes_results",
+            results_prefix="results_nopes_",
+            batch_prefix="batch_nopes_",
+            depends_on=("clean",),
+            prepare=prepare_nopes,
+        ),
+    }
+
+
+# ============================================================
+# Daemon
+# ============================================================
+
+class PipelineDaemon:
+    """Keeps the selected stages moving until all of them are done."""
+
+    def __init__(self, stages, max_in_flight=MAX_IN_FLIGHT, poll_min=POLL_MIN_SECONDS,
+                 poll_max=POLL_MAX_SECONDS, watch=False):
+        self.stages = stages
+        self.max_in_flight = max_in_flight
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.watch = watch
+
+        # batch_id -> {"stage", "key", "next_check", "delay"}
+        self.in_flight = {}
+        self.counts = {"submitted": 0, "retrieved": 0, "failed": 0}
+
+    def log(self, message):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+
+    # ---------- stage readiness ----------
+
+    def upstream_done(self, stage):
+        return all(
+            self.stages[name].is_done() for name in stage.depends_on if name in self.stages
+        )
+
+    def blocked(self, stage):
+        """Whether a stage failed, or waits on one that did."""
+        return stage.failed or any(
+            self.blocked(self.stages[name]) for name in stage.depends_on if name in self.stages
+        )
+
+    def failed_stages(self):
+        return [name for name, stage in self.stages.items() if stage.failed]
+
+    async def prepare_if_ready(self, stage):
+        """Run a stage's prepare hook once its upstream stages are done."""
+        if stage.prepare is None or stage.prepared or stage.failed or not self.upstream_done(stage):
+            return
+        if stage.batch_files() or stage.journal.records:
+            # Already prepared by an earlier run
+            stage.prepared = True
+            return
+        if time.monotonic() < stage.next_prepare:
+            return
+
+        self.log(f"{stage.name}: upstream finished, preparing batches")
+        try:
+            await asyncio.to_thread(stage.prepare)
+        except Exception as e:
+            stage.prepare_failures += 1
+            count_api_errors(stage.name, "prepare_failed")
+            if stage.prepare_failures >= PREPARE_ATTEMPTS:
+                stage.failed = True
+                self.log(f"{stage.name}: ✗ prepare failed {stage.prepare_failures} times, giving up: {e}")
+                return
+            delay = self.poll_min * 2 ** (stage.prepare_failures - 1)
+            stage.next_prepare = time.monotonic() + delay
+            self.log(f"{stage.name}: prepare failed ({e}), retrying in {delay:.0f}s")
+            return
+        stage.prepared = True
+
+    def ready_for_submission(self, stage):
+        return self.upstream_done(stage) and (stage.prepare is None or stage.prepared)
+
+    # ---------- in-flight bookkeeping ----------
+
+    def track(self, stage, key, batch_id, now):
+        self.in_flight[batch_id] = {
+            "stage": stage,
+            "key": key,
+            "next_check": now + self.poll_min,
+            "delay": self.poll_min,
+        }
+
+    async def adopt_open_batches(self):
+        """Pick up batches submitted by an earlier run (or by the scripts)."""
+        now = time.monotonic()
+        for stage in self.stages.values():
+            for key, record in stage.open_batches():
+                batch_id = record.get("batch_id")
+                if batch_id is None:
+                    # Handled locally at submission but never written out
+                    await self.retrieve(stage, key, record)
+                elif batch_id not in self.in_flight:
+                    self.track(stage, key, batch_id, now)
+                    # Check these straight away
+                    self.in_flight[batch_id]["next_check"] = now
+
+    # ---------- submit ----------
+
+    async def fill(self):
+        """Submit pending files until max_in_flight batches are open."""
+        slots = self.max_in_flight - len(self.in_flight)
+        if slots <= 0:
+            return
+
+        jobs = []
+        for stage in self.stages.values():
+            await self.prepare_if_ready(stage)
+            if not self.ready_for_submission(stage):
+                continue
+            for file_path in stage.pending_files()[:slots - len(jobs)]:
+                jobs.append((stage, file_path))
+            if len(jobs) >= slots:
+                break
+
+        results = await asyncio.gather(
+            *(stage.submit(file_path) for stage, file_path in jobs),
+            return_exceptions=True,
+        )
+
+        now = time.monotonic()
+        for (stage, file_path), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                stage.failed_files.add(str(file_path))
+                self.counts["failed"] += 1
+                count_api_errors(stage.name, "submit_failed")
+                self.log(f"{stage.name}: ✗ failed to submit {file_path.name}: {result}")
+                continue
+
+            self.counts["submitted"] += 1
+            batch_id = result.get("batch_id")
+            if batch_id is None:
+                # Everything handled locally: nothing to poll, retrieve now
+                self.log(f"{stage.name}: {file_path.name} needs no API call")
+                await self.retrieve(stage, str(file_path), result)
+            else:
+                self.log(f"{stage.name}: ✓ submitted {file_path.name} -> {batch_id}")
+                self.track(stage, str(file_path), batch_id, now)
+
+    # ---------- poll + retrieve ----------
+
+    async def retrieve(self, stage, key, record):
+        try:
+            if await stage.retrieve(key, stage.journal.records.get(key, record)):
+                self.counts["retrieved"] += 1
+                self.log(f"{stage.name}: ✓ retrieved {Path(key).name}")
+                return True
+        except Exception as e:
+            self.log(f"{stage.name}: ✗ retrieval failed for {Path(key).name}: {e}")
+            count_api_errors(stage.name, "retrieve_failed")
+        return False
+
+    async def check(self, batch_id, info):
+        """Poll one batch; retrieve if ended, otherwise back off."""
+        try:
+            batch = await async_client.messages.batches.retrieve(batch_id)
+            status = batch.processing_status
+        except Exception as e:
+            self.log(f"{info['stage'].name}: status check failed for {batch_id}: {e}")
+            status = None
+
+        if status == "ended" and await self.retrieve(info["stage"], info["key"], {}):
+            del self.in_flight[batch_id]
+            return
+
+        info["delay"] = min(info["delay"] * 2, self.poll_max)
+        info["next_check"] = time.monotonic() + info["delay"]
+
+    async def poll_due(self):
+        now = time.monotonic()
+        due = [(bid, info) for bid, info in self.in_flight.items() if info["next_check"] <= now]
+        if due:
+            await asyncio.gather(*(self.check(bid, info) for bid, info in due))
+
+    # ---------- main loop ----------
+
+    def report_in_flight(self):
+        for name in self.stages:
+            set_in_flight(name, sum(1 for info in self.in_flight.values() if info["stage"].name == name))
+
+    def finished(self):
+        if self.in_flight:
+            return False
+        return all(
+            self.blocked(stage) or (not stage.pending_files() and (stage.prepare is None or stage.prepared))
+            for stage in self.stages.values()
+        )
+
+    async def run(self):
+        for stage in self.stages.values():
+            stage.open()
+
+        try:
+            await self.adopt_open_batches()
+            if self.in_flight:
+                self.log(f"Resuming {len(self.in_flight)} open batches")
+
+            while True:
+                await self.fill()
+                await self.poll_due()
+                self.report_in_flight()
+
+                if self.finished() and not self.watch:
+                    break
+
+                if self.in_flight:
+                    next_check = min(info["next_check"] for info in self.in_flight.values())
+                    wait = max(0.0, next_check - time.monotonic())
+                else:
+                    wait = self.poll_min
+                await asyncio.sleep(min(wait, self.poll_min))
+        finally:
+            for stage in self.stages.values():
+                stage.close()
+
+        self.log(
+            f"Done: {self.counts['submitted']} submitted, "
+            f"{self.counts['retrieved']} retrieved, {self.counts['failed']} failed"
+        )
+        if self.failed_stages():
+            blocked = [name for name, stage in self.stages.items() if self.blocked(stage) and not stage.failed]
+            self.log(f"Stopped: prepare failed for {', '.join(self.failed_stages())}"
+                     + (f"; not run: {', '.join(blocked)}" if blocked else ""))
+
+
+# ============================================================
+# Main
+# ============================================================
+
+def main():
+    all_stage_names = ["book_parse", "validate", "pass1", "pass2", "clean", "nopes"]
+
+    parser = argparse.ArgumentParser(
+        description="Submit, poll and retrieve batches for one or more pipeline stages"
+    )
+    parser.add_argument(
+        "stages",
+        nargs="+",
+        choices=all_stage_names,
+        help="Stages to run; dependencies apply between the selected stages (pass2 waits for pass1, nopes for clean)",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=MAX_IN_FLIGHT,
+        help=f"Open batches across all stages (default: {MAX_IN_FLIGHT})",
+    )
+    parser.add_argument(
+        "--poll-min",
+        type=float,
+        default=POLL_MIN_SECONDS,
+        help=f"First poll delay in seconds, doubled while a batch is still processing (default: {POLL_MIN_SECONDS})",
+    )
+    parser.add_argument(
+        "--poll-max",
+        type=float,
+        default=POLL_MAX_SECONDS,
+        help=f"Longest poll delay in seconds (default: {POLL_MAX_SECONDS})",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running after everything is done and pick up new batch files",
+    )
+    parser.add_argument("--pack", type=int, default=None, metavar="N", help="book_parse: entries per request")
+    parser.add_argument("--no-cache", action="store_true", help="book_parse: ignore the parse cache")
+    parser.add_argument(
+        "--preparse",
+        type=float,
+        default=None,
+        metavar="THRESHOLD",
+        help="book_parse: parse plain entries locally at this confidence",
+    )
+    args = parser.parse_args()
+
+    known = build_stages(args.pack, not args.no_cache, args.preparse)
+    stages = {name: known[name] for name in all_stage_names if name in args.stages}
+
+    # The stage scripts read and write paths relative to the project root
+    os.chdir(project_root)
+
+    print(f"Pipeline daemon — stages: {', '.join(stages)}, max in flight: {args.max_in_flight}")
+    daemon = PipelineDaemon(stages, args.max_in_flight, args.poll_min, args.poll_max, args.watch)
+    init_metrics()
+    try:
+        with stage_timer("daemon"):
+            asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        print("\nStopped — progress is saved; rerun to resume.")
+        return
+    if daemon.failed_stages():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import time
+import atexit
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server, write_to_textfile
+except ImportError:  # metrics are optional; everything below turns into a no-op
+    CollectorRegistry = None
+
+# ============================================================
+# Optional Prometheus metrics for the pipeline and DB loaders
+# ============================================================
+#
+# Off unless one of these is set:
+#   PIPELINE_METRICS_PORT=9108
+#       serve /metrics over HTTP for as long as the process runs
+#       (the pipeline daemon, long reloads)
+#   PIPELINE_METRICS_TEXTFILE=/var/lib/node_exporter/bibliopa.prom
+#       write the metrics to a file for node_exporter's textfile
+#       collector, at exit (for the short submit/check scripts)
+# Without prometheus_client installed, every call is a no-op.
+#
+# Metrics (all prefixed bibliopa_):
+#   batches_in_flight{stage}                submitted, not yet retrieved
+#   entries_processed_total{stage,outcome}  submitted / retrieved / cached / preparsed
+#   api_errors_total{stage,kind}            errored / expired / canceled / undecodable / truncated /
+#                                           submit_failed / retrieve_failed / prepare_failed
+#   rows_inserted_total{table}              rows inserted (conflicts not counted)
+#   rows_inserted_per_second{table}         rate of the last load
+#   insert_conflicts_total{table}           rows that already existed
+#   stage_duration_seconds{stage}           wall time of each script run
+
+PORT_VARIABLE = "PIPELINE_METRICS_PORT"
+TEXTFILE_VARIABLE = "PIPELINE_METRICS_TEXTFILE"
+
+_metrics = None
+
+
+def init_metrics():
+    """Create the metrics and start the exporter chosen by the environment (idempotent)."""
+    global _metrics
+    if _metrics is not None or CollectorRegistry is None:
+        return
+    port = os.getenv(PORT_VARIABLE)
+    textfile = os.getenv(TEXTFILE_VARIABLE)
+    if not port and not textfile:
+        return
+
+    registry = CollectorRegistry()
+    _metrics = {
+        "in_flight": Gauge(
+            "bibliopa_batches_in_flight", "Batches submitted but not yet retrieved",
+            ["stage"], registry=registry,
+        ),
+        "entries": Counter(
+            "bibliopa_entries_processed", "Entries handled, by outcome",
+            ["stage", "outcome"], registry=registry,
+        ),
+        "api_errors": Counter(
+            "bibliopa_api_errors", "Failed API requests and responses",
+            ["stage", "kind"], registry=registry,
+        ),
+        "rows": Counter(
+            "bibliopa_rows_inserted", "Rows inserted (conflicts not counted)",
+            ["table"], registry=registry,
+        ),
+        "rows_rate": Gauge(
+            "bibliopa_rows_inserted_per_second", "Insert rate of the last load",
+            ["table"], registry=registry,
+        ),
+        "conflicts": Counter(
+            "bibliopa_insert_conflicts", "Rows that already existed",
+            ["table"], registry=registry,
+        ),
+        "duration": Histogram(
+            "bibliopa_stage_duration_seconds", "Wall time of a stage run",
+            ["stage"], registry=registry,
+            buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600),
+        ),
+    }
+
+    if port:
+        start_http_server(int(port), registry=registry)
+    if textfile:
+        atexit.register(write_to_textfile, textfile, registry)
+
+
+def set_in_flight(stage, count):
+    if _metrics:
+        _metrics["in_flight"].labels(stage).set(count)
+
+
+def count_entries(stage, outcome, count=1):
+    if _metrics and count:
+        _metrics["entries"].labels(stage, outcome).inc(count)
+
+
+def count_api_errors(stage, kind, count=1):
+    if _metrics and count:
+        _metrics["api_errors"].labels(stage, kind).inc(count)
+
+
+def record_load(table, rows, seconds, conflicts=0):
+    """One finished database load: rows inserted, time taken, pre-existing rows skipped."""
+    if not _metrics:
+        return
+    _metrics["rows"].labels(table).inc(rows)
+    _metrics["conflicts"].labels(table).inc(conflicts)
+    if seconds > 0:
+        _metrics["rows_rate"].labels(table).set(rows / seconds)
+
+
+def record_duration(stage, seconds):
+    if _metrics:
+        _metrics["duration"].labels(stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block as one run of `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_duration(stage, time.perf_counter() - started)
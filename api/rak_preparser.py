@@ -0,0 +1,375 @@
+import re
+from datetime import datetime
+
+# ============================================================
+# Deterministic pre-parser for plain RAK entries
+# ============================================================
+#
+# Handles the common single-author shape
+#   SURNAME, Given || Title. Subtitle. Place Publisher Year. N S. Format. Condition.
+# and emits the same schema as the parse_single_batch system prompt,
+# together with a confidence score between 0 and 1. Anything with
+# editors, translators, volumes, extra editions or unusual structure
+# scores low and is left to the Batches API.
+
+PREPARSE_THRESHOLD = 0.9
+
+YEAR_MIN = 1450
+YEAR_MAX = datetime.now().year
+
+# Entry text that needs world knowledge or a person/role split
+RISKY_PATTERNS = re.compile(
+    r"\b(?:hrsg|hg\.|red\.|herausgegeben|herausgeber|übers|übertr|übersetzt|deutsch von|a\.\s?d\.|aus dem|"
+    r"nachdichtung|bearb|eingeleitet|einleitung|vorwort|nachwort|geleitwort|dazu|ferner|"
+    r"bd\.|band|bände|bänden|teil|vol\.|jahrgang|heft|ausgewählt|zusammengestellt|mitarbeit)",
+    re.IGNORECASE,
+)
+PERSON_ROLE_PATTERN = re.compile(r"\bvon\s+[A-ZÄÖÜ]")
+
+AUTHOR_HEAD = re.compile(r"^[A-ZÄÖÜ][A-ZÄÖÜß'\- ]+, [A-ZÄÖÜa-zäöüß][\w.\- ]*$")
+REFERENCE = re.compile(r"^(?P<name>.+?)[.,]?\s+Siehe\s+\S", re.IGNORECASE)
+
+IMPRINT_END = re.compile(r"(?P<year>\d{4})\.\s*(?P<pages>\d+)\s*S\.")
+COPIES = re.compile(r"(?<!\w)(?P<n>\d+)\.?\s*Ex(?:\.|emplare)(?!\w)")
+EDITION = re.compile(r"^(?:EA|Erstausgabe.*|\d+\.\s*(?:Aufl(?:\.|age)|Tausend).*|\d+\.-\d+\.\s*Tausend.*)$")
+ILLUSTRATION = re.compile(
+    r"^mit\b.*\b(?:abb|abbildung|tafel|illustr|holzschn|zeichnung|foto|photo|karte|bild)",
+    re.IGNORECASE,
+)
+
+# Genre word left at the end of a title when the period before it is missing
+GENRE_WORDS = (
+    "Roman", "Romane", "Erzählung", "Erzählungen", "Novelle", "Novellen", "Gedichte",
+    "Essay", "Essays", "Hörspiel", "Schauspiel", "Komödie", "Tragödie", "Stück", "Stücke",
+)
+GENRE_SUFFIX = re.compile(r"^(?P<title>\S+\s.*?(?<!Gesammelte)(?<!Ausgewählte)(?<!Sämtliche)(?<!Neue))\s+(?P<genre>" + "|".join(GENRE_WORDS) + r")$")
+
+# Lowercase words allowed inside a publisher name ('Hoffmann und Campe')
+PUBLISHER_LOWERCASE = {"und", "&", "u.", "bei", "im", "am", "an", "der", "des", "für", "von", "zu"}
+
+MULTIWORD_PLACES = ("Frankfurt am Main", "Freiburg im Breisgau", "Halle an der Saale", "St. Pölten", "St. Gallen")
+
+BINDINGS = {
+    "OLn": "Originalleinen",
+    "OHLn": "Originalhalbleinen",
+    "OBrosch": "Originalbroschur",
+    "OPbd": "Originalpappband",
+    "OKart": "Originalkartoniert",
+    "OLdr": "Originalleder",
+    "OHLdr": "Originalhalbleder",
+    "HLn": "Halbleinen",
+    "HLdr": "Halbleder",
+    "Ln": "Leinen",
+    "Ldr": "Leder",
+    "Pbd": "Pappband",
+    "Pp": "Pappband",
+    "Brosch": "Broschur",
+    "Kart": "Kartoniert",
+}
+SIZES = {
+    "Fol.": "Folio",
+    "Gr.-4°": "Großquart",
+    "Kl.-4°": "Kleinquart",
+    "4°": "Quart",
+    "Gr.-8°": "Großoktav",
+    "Kl.-8°": "Kleinoktav",
+    "8°": "Oktav",
+}
+ADDITIONS = {
+    "OU": "Originalumschlag",
+    "Schutzumschlag": "Schutzumschlag",
+}
+
+FORMAT_TOKEN = re.compile(
+    r"(?<![\wÄÖÜäöü])(?:" + "|".join(sorted(map(re.escape, BINDINGS), key=len, reverse=True)) + r")\b"
+    r"|(?:Gr\.-|Kl\.-)?[48]°|\bFol\."
+)
+ADDITION_TOKEN = re.compile(r"\bm(?:it)?\.?\s?(OU|Schutzumschlag)\b")
+
+# A run of format notations at the start of the tail: 'OLn.m.OU', 'Gr.-8°. OBrosch.'
+FORMAT_PREFIX = re.compile(
+    r"(?<!\S)(?:(?:" + FORMAT_TOKEN.pattern + r")\.?\s?(?:m(?:it)?\.?\s?(?:OU|Schutzumschlag)\.?)?\s*)+"
+)
+TAIL_ILLUSTRATION = re.compile(
+    r"^Mit\b.*?(?=\s(?:" + FORMAT_TOKEN.pattern + r")|$)"
+)
+
+# Splits on ". " — one-letter/abbreviated tokens are glued back on below
+SENTENCE_SPLIT = re.compile(r"(?<=\.)\s+")
+
+
+def empty_record(original_entry):
+    """A schema-complete record with every field null or false."""
+    return {
+        "title": None,
+        "subtitle": None,
+        "authors": [],
+        "editors": [],
+        "contributors": [],
+        "publisher": None,
+        "place_of_publication": None,
+        "publication_year": None,
+        "edition": None,
+        "pages": None,
+        "format_original": None,
+        "format_expanded": None,
+        "condition": None,
+        "copies": None,
+        "illustrations": None,
+        "packaging": None,
+        "is_translation": False,
+        "original_language": None,
+        "translator": None,
+        "is_multivolume": False,
+        "series_title": None,
+        "total_volumes": None,
+        "volumes": [],
+        "administrative": {
+            "original_entry": original_entry,
+            "is_reference": False,
+            "corrected_by_api": False,
+            "missing_person": False,
+            "multiple_editions": False,
+            "api_concerned": False,
+            "problematic_multi_volume": False,
+            "verification_notes": None,
+        },
+    }
+
+
+def replace_german_quotes(text):
+    return text.replace("„", "<<").replace("“", ">>").replace("”", ">>")
+
+
+def split_sentences(text):
+    """
+    Split on '. ' and glue short abbreviations ('S.', 'Dr.', 'St.')
+    onto the following piece, so 'S. Fischer' stays together.
+    """
+    pieces = [p.strip() for p in SENTENCE_SPLIT.split(text) if p.strip()]
+    merged = []
+    carry = ""
+    for piece in pieces:
+        if re.fullmatch(r"[A-ZÄÖÜ][a-zäöü]?\.", piece):
+            carry += piece + " "
+            continue
+        merged.append(carry + piece)
+        carry = ""
+    if carry:
+        merged.append(carry.strip())
+    return merged
+
+
+def strip_period(text):
+    return text.rstrip(" .") or None
+
+
+def expand_format(format_original):
+    """German expansion of every format notation found, in order."""
+    parts = []
+    for token in FORMAT_TOKEN.findall(format_original):
+        token = token.strip()
+        parts.append(BINDINGS.get(token) or SIZES.get(token) or token)
+    expanded = ", ".join(parts)
+    for addition in ADDITION_TOKEN.findall(format_original):
+        expanded += f" mit {ADDITIONS[addition]}"
+    return expanded or None
+
+
+def split_place_publisher(imprint, previous_sentence):
+    """
+    'Wien Löcker' -> ('Wien', 'Löcker'). A one-word sentence directly
+    before an imprint that starts with an abbreviation is the place:
+    'Frankfurt. S. Fischer' -> ('Frankfurt', 'S. Fischer').
+    """
+    for place in MULTIWORD_PLACES:
+        if imprint.startswith(place + " "):
+            return place, imprint[len(place):].strip() or None
+
+    words = imprint.split()
+    if previous_sentence and len(previous_sentence.split()) == 1 and words[0].endswith("."):
+        return strip_period(previous_sentence), imprint
+
+    if len(words) == 1:
+        return words[0], None
+    return words[0], " ".join(words[1:])
+
+
+def parse_reference(text):
+    match = REFERENCE.match(text)
+    record = empty_record(text)
+    record["administrative"]["is_reference"] = True
+    # The schema asks for everything but the flag to stay null
+    record["authors"] = None
+    record["editors"] = None
+    record["contributors"] = None
+    record["volumes"] = None
+    record["is_translation"] = None
+    record["is_multivolume"] = None
+    return record, 0.95 if match else 0.0
+
+
+def preparse_entry(text):
+    """
+    Parse one entry text. Returns (record, confidence); the record
+    follows the parse_single_batch schema even when confidence is low.
+    """
+    if " Siehe " in text or text.startswith("Siehe "):
+        return parse_reference(text)
+
+    record = empty_record(text)
+    confidence = 1.0
+    clean = replace_german_quotes(text).strip()
+
+    parts = [p.strip() for p in clean.split("||")]
+    if len(parts) != 2:
+        # No author line, or several lines (volumes, second editions)
+        confidence -= 0.4
+        head, body = (parts[0], " ".join(parts[1:])) if len(parts) > 1 else (None, parts[0])
+    else:
+        head, body = parts
+
+    if head:
+        record["authors"] = [{"display_name": head}]
+        if not AUTHOR_HEAD.match(head) or re.search(r"\s(?:und|u\.|hg\.?|hrsg\.?)(?:\s|$)|/", head, re.IGNORECASE):
+            confidence -= 0.3
+    else:
+        confidence -= 0.3
+
+    if RISKY_PATTERNS.search(body) or PERSON_ROLE_PATTERN.search(body):
+        confidence -= 0.5
+
+    imprint_end = IMPRINT_END.search(body)
+    if not imprint_end:
+        return record, max(0.0, round(confidence - 0.5, 2))
+
+    year = int(imprint_end.group("year"))
+    if YEAR_MIN <= year <= YEAR_MAX:
+        record["publication_year"] = year
+    else:
+        confidence -= 0.3
+    record["pages"] = int(imprint_end.group("pages"))
+
+    # Before the year: title, subtitle, edition, illustrations, imprint
+    before = split_sentences(body[:imprint_end.start()].strip())
+    if not before:
+        return record, max(0.0, round(confidence - 0.5, 2))
+
+    imprint = before.pop().strip()
+    previous = before[-1] if before else None
+    place, publisher = split_place_publisher(imprint, previous)
+    if place in GENRE_WORDS and publisher:
+        # 'Fürsorgliche Belagerung. Roman Köln KiWi'
+        before.append(place)
+        place, publisher = split_place_publisher(publisher, None)
+    if previous and publisher == imprint:
+        before.pop()
+    record["place_of_publication"] = place
+    record["publisher"] = publisher
+    if publisher is None:
+        confidence -= 0.15
+    else:
+        words = publisher.split()
+        if len(words) > 3 or any(w[0].islower() and w not in PUBLISHER_LOWERCASE for w in words):
+            # Title text ran into the imprint because a period is missing
+            confidence -= 0.3
+
+    title_parts = []
+    illustrations = []
+    for sentence in before:
+        bare = strip_period(sentence)
+        if EDITION.match(bare):
+            record["edition"] = "Erstausgabe" if bare == "EA" else bare
+        elif ILLUSTRATION.match(bare):
+            illustrations.append(bare)
+        else:
+            title_parts.append(bare)
+
+    if not title_parts:
+        confidence -= 0.5
+    elif any(mark in title_parts[0] for mark in (":", "[", "(")):
+        # 'Jan Assmann: Thomas Mann und Ägypten' — a work about the head person
+        confidence -= 0.3
+    else:
+        genre = GENRE_SUFFIX.match(title_parts[0])
+        if genre and len(title_parts) == 1:
+            title_parts = [genre.group("title"), genre.group("genre")]
+        record["title"] = title_parts[0]
+        if len(title_parts) > 1:
+            record["subtitle"] = ". ".join(title_parts[1:])
+        if len(title_parts) > 2:
+            confidence -= 0.2
+
+    # After the page count: illustrations, format, copies, condition
+    tail = body[imprint_end.end():].strip()
+    copies = list(COPIES.finditer(tail))
+    if copies:
+        record["copies"] = int(copies[0].group("n"))
+        if len(copies) > 1:
+            confidence -= 0.3
+        tail = COPIES.sub(" ", tail)
+        tail = re.sub(r"\s+", " ", tail).strip()
+
+    tail_illustrations = TAIL_ILLUSTRATION.match(tail)
+    if tail_illustrations:
+        illustrations.append(strip_period(tail_illustrations.group(0)))
+        tail = tail[tail_illustrations.end():].strip()
+
+    format_match = FORMAT_PREFIX.search(tail)
+    leading = []
+    if format_match:
+        leading = split_sentences(tail[:format_match.start()].strip())
+        record["format_original"] = format_match.group(0).strip()
+        record["format_expanded"] = expand_format(record["format_original"])
+        tail = tail[format_match.end():].strip()
+        bindings = [t for t in FORMAT_TOKEN.findall(record["format_original"]) if t in BINDINGS]
+        if len(bindings) > 1:
+            # Usually copies in different bindings
+            confidence -= 0.3
+    else:
+        # Series notes or an unusual binding take the place of the format
+        confidence -= 0.2
+
+    condition = []
+    for sentence in leading:
+        bare = strip_period(sentence)
+        if bare and EDITION.match(bare):
+            record["edition"] = "Erstausgabe" if bare == "EA" else bare
+        elif bare:
+            # Series numbers and the like sit between pages and format
+            condition.append(bare)
+            confidence -= 0.3
+    for sentence in split_sentences(tail):
+        bare = strip_period(sentence)
+        if bare and EDITION.match(bare):
+            record["edition"] = "Erstausgabe" if bare == "EA" else bare
+        elif bare:
+            condition.append(bare)
+    record["condition"] = ". ".join(condition) or None
+
+    record["illustrations"] = ", ".join(illustrations) or None
+
+    return record, max(0.0, round(confidence, 2))
+
+
+def preparse_batch(batch_data, threshold=PREPARSE_THRESHOLD):
+    """
+    Split a batch file's entries into locally parsed results and the
+    entries that still need the API. Returns (results, remaining);
+    results use the same shape as check_status output records.
+    """
+    results = []
+    remaining = []
+    for entry in batch_data:
+        record, confidence = preparse_entry(entry["text"])
+        if confidence >= threshold:
+            results.append({
+                "custom_id": entry["composite_id"],
+                "price": entry.get("price"),
+                "parsed_entry": record,
+                "preparsed": True,
+                "confidence": confidence,
+            })
+        else:
+            remaining.append(entry)
+    return results, remaining
@@ -0,0 +1,215 @@
+import json
+import math
+from pathlib import Path
+from datetime import datetime
+
+# ============================================================
+# Token-aware sharding for batch preparation
+# ============================================================
+#
+# The prep scripts used to cut batches by entry count (25 / 75 / 30),
+# so request sizes varied wildly: a nopes batch with a big
+# existing_people_context could approach max_tokens while others were
+# tiny. Here every entry (and any shared context) is estimated in
+# tokens and shards are filled up to an input and an output budget.
+#
+# Estimates are character based — the Batches API has no offline
+# tokenizer — and deliberately pessimistic for German text in indented
+# JSON. Output budgets keep a safety margin below max_tokens.
+
+# Characters per token for indented JSON with German names and umlauts
+CHARS_PER_TOKEN = 3.0
+
+# Keep predicted output this far below the request's max_tokens
+OUTPUT_SAFETY = 0.75
+
+MANIFEST_NAME = "shard_manifest.json"
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def json_tokens(obj):
+    """Tokens for obj as the submitters serialise it (indent=2)."""
+    return estimate_tokens(json.dumps(obj, ensure_ascii=False, indent=2))
+
+
+def output_budget(max_tokens):
+    return int(max_tokens * OUTPUT_SAFETY)
+
+
+def new_shard():
+    # keys is a dict used as an ordered set while packing
+    return {"entries": [], "keys": {}, "input_tokens": 0, "output_tokens": 0}
+
+
+def pack_shards(groups, input_tokens, output_tokens, input_budget=None, out_budget=None,
+                shared_tokens=None, max_entries=None):
+    """
+    Fill shards in order up to the token budgets.
+
+    Args:
+        groups: list of (key, entries); a group stays in one shard when it
+            fits, otherwise it is split across shards of its own
+        input_tokens / output_tokens: callables, entry -> predicted tokens
+        input_budget / out_budget: per-shard limits (None = unlimited)
+        shared_tokens: optional callable, key -> input tokens paid once
+            per shard that holds the key (e.g. nopes context people)
+        max_entries: optional hard cap on entries per shard
+
+    Returns:
+        list of shards: {"entries", "keys", "input_tokens", "output_tokens"}
+    """
+    input_budget = input_budget or math.inf
+    out_budget = out_budget or math.inf
+    max_entries = max_entries or math.inf
+
+    def fits(shard, extra_in, extra_out, extra_entries):
+        return (
+            shard["input_tokens"] + extra_in <= input_budget
+            and shard["output_tokens"] + extra_out <= out_budget
+            and len(shard["entries"]) + extra_entries <= max_entries
+        )
+
+    def add(shard, key, entries, in_tokens, out_tokens):
+        shard["entries"].extend(entries)
+        shard["keys"][key] = None
+        shard["input_tokens"] += in_tokens
+        shard["output_tokens"] += out_tokens
+
+    shards = []
+    current = new_shard()
+
+    for key, entries in groups:
+        shared = shared_tokens(key) if shared_tokens else 0
+        entry_in = [input_tokens(e) for e in entries]
+        entry_out = [output_tokens(e) for e in entries]
+        group_in = shared + sum(entry_in)
+        group_out = sum(entry_out)
+
+        if fits(current, group_in, group_out, len(entries)):
+            add(current, key, entries, group_in, group_out)
+            continue
+
+        if current["entries"]:
+            shards.append(current)
+            current = new_shard()
+
+        if fits(current, group_in, group_out, len(entries)):
+            add(current, key, entries, group_in, group_out)
+            continue
+
+        # Group too big for any shard: split it, each piece repeats the shared part
+        for entry, e_in, e_out in zip(entries, entry_in, entry_out):
+            extra_in = e_in + (shared if key not in current["keys"] else 0)
+            if current["entries"] and not fits(current, extra_in, e_out, 1):
+                shards.append(current)
+                current = new_shard()
+                extra_in = e_in + shared
+            add(current, key, [entry], extra_in, e_out)
+
+    if current["entries"]:
+        shards.append(current)
+
+    for shard in shards:
+        shard["keys"] = list(shard["keys"])
+    return shards
+
+
+def pack_shards_ffd(groups, input_tokens, output_tokens, input_budget=None, out_budget=None,
+                    shared_tokens=None, max_entries=None):
+    """
+    First-fit-decreasing variant of pack_shards: groups are placed
+    largest first, each into the first shard with room, instead of
+    filling shards in order. Fewer, fuller shards; a group is still only
+    split (repeating its shared part) when it is bigger than a shard.
+
+    Same arguments and return value as pack_shards. Shard order follows
+    creation, not the order of `groups`.
+    """
+    limits = (input_budget or math.inf, out_budget or math.inf, max_entries or math.inf)
+
+    def fits(shard, extra_in, extra_out, extra_entries):
+        return (
+            shard["input_tokens"] + extra_in <= limits[0]
+            and shard["output_tokens"] + extra_out <= limits[1]
+            and len(shard["entries"]) + extra_entries <= limits[2]
+        )
+
+    sized = []
+    for key, entries in groups:
+        shared = shared_tokens(key) if shared_tokens else 0
+        group_in = shared + sum(input_tokens(e) for e in entries)
+        group_out = sum(output_tokens(e) for e in entries)
+        # Size is the fullest dimension, as a share of its budget
+        weight = max(group_in / limits[0], group_out / limits[1], len(entries) / limits[2])
+        sized.append((weight, key, entries, group_in, group_out))
+    sized.sort(key=lambda item: item[0], reverse=True)
+
+    shards = []
+    for _, key, entries, group_in, group_out in sized:
+        target = next((s for s in shards if fits(s, group_in, group_out, len(entries))), None)
+        if target is None and fits(new_shard(), group_in, group_out, len(entries)):
+            target = new_shard()
+            shards.append(target)
+        if target is None:
+            # Too big for any shard: pack_shards splits it into shards of its own
+            pieces = pack_shards([(key, entries)], input_tokens, output_tokens, input_budget,
+                                 out_budget, shared_tokens, max_entries)
+            for piece in pieces:
+                piece["keys"] = dict.fromkeys(piece["keys"])
+            shards.extend(pieces)
+            continue
+        target["entries"].extend(entries)
+        target["keys"][key] = None
+        target["input_tokens"] += group_in
+        target["output_tokens"] += group_out
+
+    for shard in shards:
+        shard["keys"] = list(shard["keys"])
+    return shards
+
+
+def write_manifest(output_dir, file_names, shards, budgets, max_tokens=None):
+    """
+    Save predicted sizes next to the batch files. Shards whose predicted
+    output goes over max_tokens (only possible for single oversized
+    entries) are flagged so they can be checked before submitting.
+    """
+    manifest = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "chars_per_token": CHARS_PER_TOKEN,
+        "budgets": budgets,
+        "max_tokens": max_tokens,
+        "total_entries": sum(len(s["entries"]) for s in shards),
+        "total_input_tokens": sum(s["input_tokens"] for s in shards),
+        "total_output_tokens": sum(s["output_tokens"] for s in shards),
+        "shards": [
+            {
+                "file": name,
+                "entries": len(shard["entries"]),
+                "predicted_input_tokens": shard["input_tokens"],
+                "predicted_output_tokens": shard["output_tokens"],
+                "over_max_tokens": bool(max_tokens and shard["output_tokens"] > max_tokens),
+            }
+            for name, shard in zip(file_names, shards)
+        ],
+    }
+
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+
+def describe_shards(shards):
+    """One-line size summary for the prep scripts' console output."""
+    if not shards:
+        return "no shards"
+    outputs = [s["output_tokens"] for s in shards]
+    inputs = [s["input_tokens"] for s in shards]
+    return (
+        f"{len(shards)} shards, predicted input {min(inputs)}–{max(inputs)} tokens, "
+        f"output {min(outputs)}–{max(outputs)} tokens"
+    )
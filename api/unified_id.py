@@ -0,0 +1,207 @@
+import re
+import sys
+import json
+import time
+import argparse
+import unicodedata
+from pathlib import Path
+from functools import lru_cache
+from collections import defaultdict
+
+# ============================================================
+# Deterministic unified_id generation
+# ============================================================
+#
+# The rules of NOPES_SYSTEM_PROMPT (people_clean_processor) and the
+# pass 2 prompt (people_batch_processor), in code:
+#   - lowercase, no diacritics (ä -> a, ö -> o, ü -> u, ß -> ss, é -> e)
+#   - family_name + given_names: "{family}_{given}", where given is the
+#     first given name in full plus the initial of every further one
+#       "Johann Sebastian" -> bach_johann_s
+#       "Theodor W."       -> adorno_theodor_w
+#       "J.W."             -> goethe_j_w
+#     a hyphenated name is one token ("Marie-Henri" -> mariehenri)
+#   - single_name and organisations: words joined by "_"
+#       "Österreichischer Bundesverlag" -> osterreichischer_bundesverlag
+#   - nothing usable: "oops"
+# The frontend's generateUnifiedId (formatters.ts) uses different rules
+# and marks its IDs with "_FE"; frontend_unified_id reproduces it so
+# those rows can be checked too.
+#
+# Run as a script to check a people export against the rules:
+#   python unified_id.py "data/from db/people.json"
+
+OOPS = "oops"
+FRONTEND_SUFFIX = "_FE"
+
+FOLD_TABLE = str.maketrans({"ß": "ss", "ẞ": "SS"})
+
+NON_ALNUM = re.compile(r"[^a-z0-9]")
+# "J.W." is two initials; "Marie-Henri" stays one token
+GIVEN_SPLIT = re.compile(r"\s+|(?<=\.)(?=\w)")
+
+
+def fold(text):
+    """Lowercase, ß -> ss, diacritics dropped (ä -> a, as the frontend does)."""
+    text = unicodedata.normalize("NFD", (text or "").translate(FOLD_TABLE))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def present(value):
+    return value if value and value != "null" else None
+
+
+def word(text):
+    """One folded token: hyphens and punctuation dropped."""
+    return NON_ALNUM.sub("", fold(text))
+
+
+# Names repeat a lot across the people table; both parts are cached
+@lru_cache(maxsize=None)
+def words_part(text):
+    """Folded words joined by "_" (family names, single names)."""
+    return "_".join(w for w in (word(part) for part in text.split()) if w)
+
+
+@lru_cache(maxsize=None)
+def given_part(given_names):
+    """First given name in full, initials of the rest."""
+    tokens = [word(t) for t in GIVEN_SPLIT.split(given_names.strip())]
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return ""
+    return "_".join([tokens[0]] + [t[0] for t in tokens[1:]])
+
+
+def generate(person):
+    """unified_id for one person dict (family_name/given_names/single_name/is_organisation)."""
+    family_name = present(person.get("family_name"))
+    single_name = present(person.get("single_name"))
+
+    if person.get("is_organisation") or not family_name:
+        return words_part(single_name or family_name or "") or OOPS
+
+    family = words_part(family_name)
+    if not family:
+        return OOPS
+    given = given_part(present(person.get("given_names")) or "")
+    return f"{family}_{given}" if given else family
+
+
+def frontend_unified_id(person):
+    """Python port of the frontend's generateUnifiedId."""
+    def clean(text):
+        return re.sub(r"[^a-z-]", "", re.sub(r"\s+", "-", fold(text)))
+
+    single_name = person.get("single_name")
+    if single_name:
+        base = re.sub(r"[^a-z_]", "", re.sub(r"\s+", "_", fold(single_name)))
+    else:
+        family = clean(person.get("family_name") or "")
+        given = clean(person.get("given_names") or "")
+        base = f"{family}_{given}" if given else family
+    return f"{base}{FRONTEND_SUFFIX}"
+
+
+# ============================================================
+# Bulk mode
+# ============================================================
+
+def generate_all(people):
+    """unified_ids for a list of people, in order."""
+    return [generate(person) for person in people]
+
+
+def find_collisions(people, ids=None, key="person_id"):
+    """
+    {unified_id: [person keys]} for IDs shared by more than one person.
+    Without a person_id (or `key`) field, list positions are used.
+    """
+    ids = ids if ids is not None else generate_all(people)
+    owners = defaultdict(list)
+    for idx, unified_id in enumerate(ids):
+        if unified_id != OOPS:
+            owners[unified_id].append(people[idx].get(key, idx))
+    return {unified_id: keys for unified_id, keys in owners.items() if len(keys) > 1}
+
+
+def assign_unique(people, taken=(), ids=None):
+    """
+    Generated IDs (or `ids`) made unique: the second person with an ID
+    gets "_2", the third "_3", and so on, also counting IDs already in
+    `taken` (e.g. the people table).
+    """
+    used = set(taken)
+    assigned = []
+    for unified_id in ids if ids is not None else generate_all(people):
+        if unified_id == OOPS or unified_id not in used:
+            used.add(unified_id)
+            assigned.append(unified_id)
+            continue
+        n = 2
+        while f"{unified_id}_{n}" in used:
+            n += 1
+        used.add(f"{unified_id}_{n}")
+        assigned.append(f"{unified_id}_{n}")
+    return assigned
+
+
+def check_people(people):
+    """
+    Compare stored unified_ids with the rules.
+
+    Returns dict with:
+        mismatches: [(person_id, stored, generated)]
+        collisions: {generated_id: [person_id, ...]}
+        duplicates: {stored_id: [person_id, ...]}
+    """
+    mismatches = []
+    generated = []
+    for person in people:
+        stored = person.get("unified_id")
+        if stored and stored.endswith(FRONTEND_SUFFIX):
+            expected = frontend_unified_id(person)
+        else:
+            expected = generate(person)
+        generated.append(expected)
+        # A numbered suffix is how collisions are resolved, not a mismatch
+        if stored != expected and not re.fullmatch(re.escape(expected) + r"_\d+", stored or ""):
+            mismatches.append((person.get("person_id"), stored, expected))
+
+    stored_ids = [person.get("unified_id") for person in people]
+    return {
+        "mismatches": mismatches,
+        "collisions": find_collisions(people, generated),
+        "duplicates": find_collisions(people, stored_ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check stored unified_ids against the generation rules"
+    )
+    parser.add_argument("people_file", type=Path, help="JSON list of people (e.g. the people table export)")
+    parser.add_argument("--show", type=int, default=20, help="Mismatches to print (default: 20)")
+    args = parser.parse_args()
+
+    with open(args.people_file, "r", encoding="utf-8") as f:
+        people = json.load(f)
+
+    started = time.perf_counter()
+    report = check_people(people)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    print(f"People:      {len(people)} (checked in {elapsed_ms:.0f} ms)")
+    print(f"Mismatches:  {len(report['mismatches'])}")
+    print(f"Collisions:  {len(report['collisions'])} generated IDs shared by several people")
+    print(f"Duplicates:  {len(report['duplicates'])} stored IDs shared by several people")
+
+    for person_id, stored, expected in report["mismatches"][:args.show]:
+        print(f"  {person_id}: {stored} -> {expected}")
+
+    if report["duplicates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
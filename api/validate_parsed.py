@@ -0,0 +1,262 @@
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.constants import VALIDATED_DIR, VALIDATION_LOG
+from rak_preparser import replace_german_quotes
+
+# ============================================================
+# Bulk schema validation of parsed entries
+# ============================================================
+#
+# Every parsed_entry of every output file is checked in one pydantic
+# pass (a compiled TypeAdapter over the whole list), against the schema
+# in parse_single_batch.SYSTEM_PROMPT:
+#   - field types (lax: "192" is accepted as 192, "XII, 320" is not)
+#   - ranges for publication_year, pages, copies and volumes
+#   - administrative.original_entry equal to the entry text that was sent
+#
+# Failures are grouped per rule ("pages:int_parsing",
+# "publication_year:less_than_equal", "original_entry:mismatch", ...)
+# into one index of custom_ids per rule in VALIDATION_LOG. Files are
+# copied to VALIDATED_DIR with only their passing records.
+
+PARSED_DIR = Path("data_reload/reparse_missing/reparsed")
+BATCH_DIR = Path("data_reload/reparse_missing/batched")
+
+MIN_YEAR = 1450
+MAX_YEAR = datetime.now().year + 1
+MAX_PAGES = 10000
+MAX_COPIES = 50
+MAX_VOLUMES = 200
+
+Year = Annotated[int, Field(ge=MIN_YEAR, le=MAX_YEAR)]
+Pages = Annotated[int, Field(ge=1, le=MAX_PAGES)]
+
+
+class Person(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    display_name: Optional[str] = None
+
+
+class Volume(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    volume_number: Optional[Annotated[int, Field(ge=0, le=MAX_VOLUMES)]] = None
+    volume_title: Optional[str] = None
+    pages: Optional[Pages] = None
+    notes: Optional[str] = None
+
+
+class Administrative(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    original_entry: str
+    is_reference: Optional[bool] = None
+    corrected_by_api: Optional[bool] = None
+    missing_person: Optional[bool] = None
+    multiple_editions: Optional[bool] = None
+    api_concerned: Optional[bool] = None
+    problematic_multi_volume: Optional[bool] = None
+    verification_notes: Optional[str] = None
+
+
+class ParsedEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    authors: Optional[list[Person]] = None
+    editors: Optional[list[Person]] = None
+    contributors: Optional[list[Person]] = None
+    publisher: Optional[str] = None
+    place_of_publication: Optional[str] = None
+    publication_year: Optional[Year] = None
+    edition: Optional[str] = None
+    pages: Optional[Pages] = None
+    format_original: Optional[str] = None
+    format_expanded: Optional[str] = None
+    condition: Optional[str] = None
+    copies: Optional[Annotated[int, Field(ge=1, le=MAX_COPIES)]] = None
+    illustrations: Optional[str] = None
+    packaging: Optional[str] = None
+    is_translation: Optional[bool] = None
+    original_language: Optional[str] = None
+    translator: Optional[Person] = None
+    is_multivolume: Optional[bool] = None
+    series_title: Optional[str] = None
+    total_volumes: Optional[Annotated[int, Field(ge=1, le=MAX_VOLUMES)]] = None
+    volumes: Optional[list[Volume]] = None
+    administrative: Administrative
+
+
+# Built once; validating the whole corpus is a single call into pydantic-core
+ENTRIES_ADAPTER = TypeAdapter(list[ParsedEntry])
+
+
+def normalise_text(text):
+    """original_entry comparison ignores whitespace and the <<>> quote rewrite."""
+    return re.sub(r"\s+", " ", replace_german_quotes(text or "")).strip()
+
+
+def rule_name(error):
+    field = ".".join(str(part) for part in error["loc"][1:] if not isinstance(part, int))
+    return f"{field or 'entry'}:{error['type']}"
+
+
+def load_parsed_files(parsed_dirs):
+    """[(path, records)] for every output file, in name order."""
+    loaded = []
+    for parsed_dir in parsed_dirs:
+        for path in sorted(Path(parsed_dir).glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                loaded.append((path, json.load(f)))
+    return loaded
+
+
+def load_input_texts(batch_dir):
+    """{composite_id: entry text} from the batch files that were submitted."""
+    texts = {}
+    for path in Path(batch_dir).glob("*.json"):
+        with open(path, "r", encoding="utf-8") as f:
+            for entry in json.load(f):
+                texts[entry["composite_id"]] = entry.get("text")
+    return texts
+
+
+def validate_records(records, input_texts):
+    """
+    Validate a flat list of output records.
+    Returns {rule: [record index, ...]}; indexes not in any list passed.
+    """
+    failures = {}
+
+    entries = []
+    positions = []
+    for idx, record in enumerate(records):
+        parsed_entry = record.get("parsed_entry")
+        if isinstance(parsed_entry, dict):
+            entries.append(parsed_entry)
+            positions.append(idx)
+        else:
+            failures.setdefault("response:undecodable", []).append(idx)
+
+    try:
+        ENTRIES_ADAPTER.validate_python(entries)
+    except ValidationError as e:
+        for error in e.errors(include_url=False, include_input=False):
+            idx = positions[error["loc"][0]]
+            failures.setdefault(rule_name(error), []).append(idx)
+
+    for idx in positions:
+        record = records[idx]
+        expected = input_texts.get(record.get("custom_id"))
+        if expected is None:
+            continue
+        original = (record["parsed_entry"].get("administrative") or {}).get("original_entry")
+        if normalise_text(original) != normalise_text(expected):
+            failures.setdefault("original_entry:mismatch", []).append(idx)
+
+    # A record with several errors under one rule is listed once
+    return {rule: sorted(set(indexes)) for rule, indexes in failures.items()}
+
+
+def write_validated(loaded, failed_indexes):
+    """Copy each file to VALIDATED_DIR with its failing records left out."""
+    VALIDATED_DIR.mkdir(parents=True, exist_ok=True)
+    offset = 0
+    written = 0
+    for path, records in loaded:
+        passing = [r for i, r in enumerate(records, start=offset) if i not in failed_indexes]
+        offset += len(records)
+        with open(VALIDATED_DIR / path.name, "w", encoding="utf-8") as f:
+            json.dump(passing, f, ensure_ascii=False, indent=2)
+        written += len(passing)
+    return written
+
+
+def write_validation_log(records, failures, total, valid):
+    index = {
+        rule: [records[i].get("custom_id") for i in indexes]
+        for rule, indexes in sorted(failures.items(), key=lambda item: -len(item[1]))
+    }
+    log = {
+        "validated_at": datetime.now().isoformat(timespec="seconds"),
+        "total_records": total,
+        "valid_records": valid,
+        "rule_counts": {rule: len(ids) for rule, ids in index.items()},
+        "rules": index,
+    }
+    VALIDATION_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(VALIDATION_LOG, "w", encoding="utf-8") as f:
+        json.dump(log, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate parsed entries against the parse schema and write per-rule failure indexes"
+    )
+    parser.add_argument(
+        "parsed_dirs",
+        nargs="*",
+        default=[PARSED_DIR],
+        help=f"Folders of parsed output files (default: {PARSED_DIR})",
+    )
+    parser.add_argument(
+        "--batches",
+        type=Path,
+        default=BATCH_DIR,
+        help=f"Batch files holding the input texts (default: {BATCH_DIR})",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report only; write nothing",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    loaded = load_parsed_files(args.parsed_dirs)
+    records = [record for _, records_in_file in loaded for record in records_in_file]
+    if not records:
+        print("No parsed records found.")
+        return
+    input_texts = load_input_texts(args.batches)
+    loaded_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    failures = validate_records(records, input_texts)
+    validate_s = time.perf_counter() - started
+
+    failed_indexes = set().union(*failures.values()) if failures else set()
+    valid = len(records) - len(failed_indexes)
+
+    print(f"Records:    {len(records)} in {len(loaded)} files (loaded in {loaded_s:.2f}s)")
+    print(f"Validated:  {validate_s:.2f}s ({len(records) / validate_s:,.0f} records/s)")
+    print(f"Valid:      {valid} ({valid / len(records) * 100:.1f}%)")
+    if failures:
+        print("\nFailures by rule:")
+        for rule, indexes in sorted(failures.items(), key=lambda item: -len(item[1])):
+            print(f"  {rule:<45}{len(indexes):>7}")
+
+    if args.dry_run:
+        return
+
+    write_validated(loaded, failed_indexes)
+    write_validation_log(records, failures, len(records), valid)
+    print(f"\nValid records written to {VALIDATED_DIR}")
+    print(f"Failure index written to {VALIDATION_LOG}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 from rich import print
 import json
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from database.connection import get_db_connection
+from api.pipeline_metrics import init_metrics, record_load
 
 # original load, missing rows
 # b2p_file = Path("data_reload/db_files/books2people.json")
@@ -21,6 +23,7 @@ def load_b2p_to_db():
     with open(b2p_file, "r") as f:
        b2p = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -78,9 +81,17 @@ def load_b2p_to_db():
     #         entry.get("is_translator"),
     #     ) for entry in b2p]
 
+    # books2people has no single key to look conflicts up by beforehand, so
+    # rows are inserted one at a time and ON CONFLICT skips counted from rowcount
+    inserted = 0
+    started = time.perf_counter()
     with conn.cursor() as cur:
-        cur.executemany(insert_sql, rows)
+        for row in rows:
+            cur.execute(insert_sql, row)
+            inserted += cur.rowcount
         conn.commit()
+    skipped = len(rows) - inserted
+    record_load("books2people", inserted, time.perf_counter() - started, skipped)
 
     with conn.cursor() as cur:
         cur.execute("""
@@ -91,7 +102,7 @@ def load_b2p_to_db():
         """)
         conn.commit()
 
-    print(f"Done: loaded {len(rows)} rows")
+    print(f"Done: inserted {inserted} of {len(rows)} rows ({skipped} already there)")
     conn.close()
 if __name__ == "__main__":
     load_b2p_to_db()
@@ -1,11 +1,13 @@
 from rich import print as rprint
 import json
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from database.connection import get_db_connection
+from api.pipeline_metrics import init_metrics, record_load
 
 books_file = Path("data_reload/db_files/books.json")
 
@@ -13,6 +15,7 @@ def load_books_to_db():
     with open(books_file, "r") as f:
        books = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -61,9 +64,11 @@ def load_books_to_db():
         for uid in existing:
             print(f"  {uid}")
 
+    started = time.perf_counter()
     with conn.cursor() as cur:
         cur.executemany(insert_sql, rows)
         conn.commit()
+    record_load("books", len(rows) - len(existing), time.perf_counter() - started, len(existing))
 
     with conn.cursor() as cur:
         cur.execute("""
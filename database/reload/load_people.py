@@ -1,11 +1,13 @@
 from rich import print
 import json
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from database.connection import get_db_connection
+from api.pipeline_metrics import init_metrics, record_load
 
 people_file = Path("data_reload/db_files/people.json")
 
@@ -13,6 +15,7 @@ def load_people_to_db():
     with open(people_file, "r") as f:
         people = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -47,9 +50,11 @@ def load_people_to_db():
         for uid in existing:
             print(f"  {uid}")
 
+    started = time.perf_counter()
     with conn.cursor() as cur:
         cur.executemany(insert_sql, rows)
         conn.commit()
+    record_load("people", len(rows) - len(existing), time.perf_counter() - started, len(existing))
 
     with conn.cursor() as cur:
         cur.execute("""
@@ -1,11 +1,13 @@
 from rich import print as rprint
 import json
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from database.connection import get_db_connection
+from api.pipeline_metrics import init_metrics, record_load
 
 admin_file = Path("data_reload/db_files/book_admin.json")
 prices_file = Path("data_reload/db_files/prices.json")
@@ -16,6 +18,7 @@ def load_book_admin():
     with open(admin_file, "r") as f:
         entries = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -52,9 +55,11 @@ def load_book_admin():
         for uid in existing:
             print(f"  {uid}")
 
+    started = time.perf_counter()
     with conn.cursor() as cur:
         cur.executemany(insert_sql, rows)
         conn.commit()
+    record_load("book_admin", len(rows) - len(existing), time.perf_counter() - started, len(existing))
 
     with conn.cursor() as cur:
         cur.execute("""
@@ -74,6 +79,7 @@ def load_prices():
     with open(prices_file, "r") as f:
         entries = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -93,9 +99,11 @@ def load_prices():
         for entry in entries
     ]
 
+    started = time.perf_counter()
     with conn.cursor() as cur:
         cur.executemany(insert_sql, rows)
         conn.commit()
+    record_load("prices", len(rows), time.perf_counter() - started)
 
     with conn.cursor() as cur:
         cur.execute("""
@@ -114,6 +122,7 @@ def load_volumes():
     with open(volumes_file, "r") as f:
         entries = json.load(f)
 
+    init_metrics()
     conn = get_db_connection()
     if conn is None:
         print("Connection failed")
@@ -135,9 +144,11 @@ def load_volumes():
         for entry in entries
     ]
 
+    started = time.perf_counter()
     with conn.cursor() as cur:
         cur.executemany(insert_sql, rows)
         conn.commit()
+    record_load("books2volumes", len(rows), time.perf_counter() - started)
 
     with conn.cursor() as cur:
         cur.execute("""
@@ -0,0 +1,340 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+from splink import Linker, DuckDBAPI, SettingsCreator, block_on
+import splink.comparison_library as cl
+import splink.comparison_level_library as cll
+import splink.internals.estimate_u as splink_estimate_u
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.unified_id import fold
+from scripts.text_matching import normalise_text
+
+# ============================================================
+# Probabilistic linkage of new people against the people table
+# ============================================================
+#
+# The notebook 16_lets_splink_this as a command:
+#   python scripts/people_linkage.py train     estimate m/u parameters, save the model
+#   python scripts/people_linkage.py predict   score pairs with the saved model
+#   python scripts/people_linkage.py link      train if there is no model yet, then predict
+#
+# "new" records are book entries without a person (new_people_flat.json:
+# display_norm, last, first, composite_id); "base" records are the known
+# spellings of existing people, either variants_prepped.json or, with
+# --from-db, every (person, display_name) pair in books2people.
+# Both sides are reduced to the same columns (splink links tables with
+# identical columns): folded last and first names, the first initial
+# and a 4-letter surname prefix for blocking.
+#
+# Blocking rules are given as column lists ("last_fold",
+# "first_initial+last_prefix") or as SQL ("l.last_fold = r.last_fold").
+# DuckDB runs in-process on all cores unless --threads says otherwise.
+# Written against splink 4 (pinned in requirements.txt); splink 5 changed
+# the Linker constructor.
+
+NEW_FILE = project_root / "scripts/notebooks/new_people_flat.json"
+BASE_FILE = project_root / "scripts/notebooks/variants_prepped.json"
+MODEL_FILE = project_root / "data/people/splink_model.json"
+OUTPUT_FILE = project_root / "data/people/linkage_predictions.json"
+
+DEFAULT_BLOCKING = ["last_fold", "first_initial+last_prefix"]
+
+# Pairs certain enough to fix the prior, and the blocks EM trains on
+# (each block leaves its own columns' parameters untrained, so two)
+DETERMINISTIC_RULES = ["last_fold+first_fold"]
+TRAINING_BLOCKS = ["last_fold", "first_fold"]
+DETERMINISTIC_RECALL = 0.8
+U_MAX_PAIRS = 2_000_000
+
+MATCH_THRESHOLD = 0.5
+
+# Columns carried through to the output; absent on one side, so null there
+REFERENCE_COLUMNS = ["display_norm", "composite_id", "person_id", "unified_id"]
+LINK_COLUMNS = ["last_fold", "first_fold", "first_initial", "last_prefix"]
+
+
+# ============================================================
+# Input
+# ============================================================
+
+def present(value):
+    """A usable name string; the notebook prep left a few unsplit lists, which count as missing."""
+    return value if isinstance(value, str) and value not in ("", "null") else None
+
+
+def link_fields(last, first):
+    """Folded name columns; a single name (no first) sits in last."""
+    last_fold = re.sub(r"\s+", " ", fold(present(last) or "")).strip() or None
+    first_fold = re.sub(r"\s+", " ", fold(present(first) or "")).strip() or None
+    return {
+        "last_fold": last_fold,
+        "first_fold": first_fold,
+        "first_initial": first_fold[0] if first_fold else None,
+        "last_prefix": last_fold[:4] if last_fold else None,
+    }
+
+
+def prepare(records):
+    """DataFrame with unique_id, REFERENCE_COLUMNS and LINK_COLUMNS."""
+    rows = []
+    for idx, record in enumerate(records):
+        last = present(record.get("last")) or present(record.get("family_name")) or present(record.get("single_name"))
+        first = present(record.get("first")) or present(record.get("given_names"))
+        if not last:
+            last = present(record.get("display_norm"))
+        rows.append({
+            "unique_id": idx,
+            **{column: record.get(column) for column in REFERENCE_COLUMNS},
+            **link_fields(last, first),
+        })
+    frame = pd.DataFrame(rows, columns=["unique_id", *REFERENCE_COLUMNS, *LINK_COLUMNS])
+    # person_id is null on the new side; keep one integer type for both tables
+    frame["person_id"] = frame["person_id"].astype("Int64")
+    return frame
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_base_from_db():
+    """Every spelling a person appears under in books2people, plus the people row itself."""
+    # Only --from-db needs the database driver
+    from database.connection import get_db_connection
+
+    conn = get_db_connection()
+    if conn is None:
+        sys.exit("Connection failed")
+    query = """
+        SELECT DISTINCT p.person_id, p.unified_id, b.display_name,
+               COALESCE(b.family_name, p.family_name) AS family_name,
+               COALESCE(b.given_names, p.given_names) AS given_names,
+               COALESCE(b.single_name, p.single_name) AS single_name
+        FROM people p
+        LEFT JOIN books2people b ON b.person_id = p.person_id
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute(query)
+        columns = [c.name for c in cur.description]
+        records = [dict(zip(columns, row)) for row in cur.fetchall()]
+    for record in records:
+        # People without a books2people row are listed under their own name
+        display_name = record.pop("display_name") or record["single_name"] or ", ".join(
+            part for part in (record["family_name"], record["given_names"]) if part
+        )
+        record["display_norm"] = normalise_text(display_name)
+    return records
+
+
+# ============================================================
+# Model
+# ============================================================
+
+def blocking_rule(spec):
+    """ "a+b" -> block_on("a", "b"); SQL (anything mentioning l. / r.) is used as is."""
+    if re.search(r"\b[lr]\.", spec):
+        return spec
+    return block_on(*spec.split("+"))
+
+
+def first_name_comparison():
+    """Exact, one side an initial of the other (K. / Karl), close spelling, else."""
+    return cl.CustomComparison(
+        output_column_name="first_fold",
+        comparison_description="First name with initials",
+        comparison_levels=[
+            cll.NullLevel("first_fold"),
+            cll.ExactMatchLevel("first_fold"),
+            cll.CustomLevel(
+                sql_condition=(
+                    "first_initial_l = first_initial_r "
+                    "AND (length(regexp_replace(first_fold_l, '[^a-z]', '', 'g')) = 1 "
+                    "OR length(regexp_replace(first_fold_r, '[^a-z]', '', 'g')) = 1)"
+                ),
+                label_for_charts="Initial matches name",
+            ),
+            cll.JaroWinklerLevel("first_fold", 0.9),
+            cll.ElseLevel(),
+        ],
+    )
+
+
+def settings(blocking):
+    return SettingsCreator(
+        link_type="link_only",
+        blocking_rules_to_generate_predictions=[blocking_rule(spec) for spec in blocking],
+        comparisons=[
+            cl.JaroWinklerAtThresholds("last_fold", [0.95, 0.88]),
+            first_name_comparison(),
+        ],
+        additional_columns_to_retain=REFERENCE_COLUMNS,
+    )
+
+
+def duckdb_api(threads):
+    con = duckdb.connect()
+    con.execute(f"SET threads TO {threads}")
+    return DuckDBAPI(connection=con)
+
+
+def make_linker(new_df, base_df, model_settings, threads):
+    return Linker(
+        [new_df, base_df],
+        model_settings,
+        db_api=duckdb_api(threads),
+        input_table_aliases=["new", "base"],
+    )
+
+
+@contextmanager
+def salting_partitions(minimum=2):
+    """
+    splink 4.0.x splits the random-sampling u estimate on DuckDB into one
+    salting partition per CPU and refuses fewer than two, so a single-CPU
+    host reports two while it runs. The partitions only divide the
+    sampled pairs between them; the estimate is the same.
+    """
+    mp = splink_estimate_u.multiprocessing
+    cpu_count = mp.cpu_count
+    if cpu_count() < minimum:
+        mp.cpu_count = lambda: minimum
+    try:
+        yield
+    finally:
+        mp.cpu_count = cpu_count
+
+
+def train(new_df, base_df, blocking, threads, model_file):
+    linker = make_linker(new_df, base_df, settings(blocking), threads)
+    linker.training.estimate_probability_two_random_records_match(
+        [blocking_rule(spec) for spec in DETERMINISTIC_RULES], recall=DETERMINISTIC_RECALL
+    )
+    with salting_partitions():
+        linker.training.estimate_u_using_random_sampling(max_pairs=U_MAX_PAIRS)
+    for spec in TRAINING_BLOCKS:
+        linker.training.estimate_parameters_using_expectation_maximisation(blocking_rule(spec))
+
+    model_file.parent.mkdir(parents=True, exist_ok=True)
+    linker.misc.save_model_to_json(str(model_file), overwrite=True)
+    return linker
+
+
+def saved_settings(model_file, blocking=None):
+    """The trained model; blocking rules given on the command line replace the saved ones."""
+    model = load_json(model_file)
+    if blocking:
+        model["blocking_rules_to_generate_predictions"] = [blocking_rule(spec) for spec in blocking]
+    return model
+
+
+# ============================================================
+# Output
+# ============================================================
+
+def predictions(linker, threshold):
+    """
+    One row per scored pair at or above `threshold`, new record first,
+    best candidate per new record ranked 1.
+    """
+    frame = linker.inference.predict(threshold_match_probability=threshold).as_pandas_dataframe()
+    if frame.empty:
+        return frame
+
+    # link_only pairs come out in either order; put the new record on the left
+    swapped = frame["source_dataset_l"] != "new"
+    for column in ["unique_id", "source_dataset", *REFERENCE_COLUMNS]:
+        left, right = f"{column}_l", f"{column}_r"
+        # Column by column: the two sides can differ in dtype (person_id is all null on "new")
+        new_side = frame[left].where(~swapped, frame[right])
+        frame[right] = frame[right].where(~swapped, frame[left])
+        frame[left] = new_side
+
+    frame = frame.rename(columns={
+        "unique_id_l": "new_id",
+        "unique_id_r": "base_id",
+        "display_norm_l": "display_norm",
+        "composite_id_l": "composite_id",
+        "display_norm_r": "matched_display_norm",
+        "person_id_r": "matched_person_id",
+        "unified_id_r": "matched_unified_id",
+    })
+    frame = frame.sort_values(["new_id", "match_probability"], ascending=[True, False])
+    frame["rank"] = frame.groupby("new_id").cumcount() + 1
+    return frame[[
+        "new_id", "display_norm", "composite_id", "rank", "match_probability", "match_weight",
+        "base_id", "matched_display_norm", "matched_person_id", "matched_unified_id",
+    ]]
+
+
+def write_table(frame, output):
+    """.csv and .parquet by suffix, JSON (list of rows) otherwise."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if output.suffix == ".csv":
+        frame.to_csv(output, index=False)
+    elif output.suffix == ".parquet":
+        frame.to_parquet(output, index=False)
+    else:
+        rows = json.loads(frame.to_json(orient="records", force_ascii=False))
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link new people to existing people with splink")
+    parser.add_argument("command", choices=["train", "predict", "link"],
+                        help="train: save a model; predict: use it; link: train if needed, then predict")
+    parser.add_argument("--new", type=Path, default=NEW_FILE, help=f"New records (default: {NEW_FILE.name})")
+    parser.add_argument("--base", type=Path, default=BASE_FILE, help=f"Known spellings (default: {BASE_FILE.name})")
+    parser.add_argument("--from-db", action="store_true", help="Read known spellings from people + books2people")
+    parser.add_argument("--model", type=Path, default=MODEL_FILE, help=f"Model file (default: {MODEL_FILE})")
+    parser.add_argument("--output", type=Path, default=OUTPUT_FILE,
+                        help=f"Predictions, .json/.csv/.parquet (default: {OUTPUT_FILE})")
+    parser.add_argument("--block", action="append", metavar="RULE",
+                        help=f"Blocking rule, repeatable (default: {' '.join(DEFAULT_BLOCKING)})")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD,
+                        help=f"Lowest match probability kept (default: {MATCH_THRESHOLD})")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="DuckDB threads (default: all cores)")
+    parser.add_argument("--retrain", action="store_true", help="With link: train even if a model exists")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    new_df = prepare(load_json(args.new))
+    base_df = prepare(load_base_from_db() if args.from_db else load_json(args.base))
+    print(f"Loaded {len(new_df)} new, {len(base_df)} known spellings in {time.perf_counter() - started:.1f}s")
+
+    train_first = args.command == "train" or (args.command == "link" and (args.retrain or not args.model.exists()))
+    if train_first:
+        step = time.perf_counter()
+        linker = train(new_df, base_df, args.block or DEFAULT_BLOCKING, args.threads, args.model)
+        print(f"Trained in {time.perf_counter() - step:.1f}s, model saved to {args.model}")
+        if args.command == "train":
+            return
+    else:
+        if not args.model.exists():
+            sys.exit(f"No model at {args.model}; run train (or link) first")
+        linker = make_linker(new_df, base_df, saved_settings(args.model, args.block), args.threads)
+
+    step = time.perf_counter()
+    table = predictions(linker, args.threshold)
+    write_table(table, args.output)
+
+    linked = table.loc[table["rank"] == 1, "new_id"].nunique() if not table.empty else 0
+    print(f"Scored {len(table)} pairs >= {args.threshold} in {time.perf_counter() - step:.1f}s")
+    print(f"New records with a candidate: {linked}/{len(new_df)}")
+    print(f"Saved to {args.output} (total {time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()